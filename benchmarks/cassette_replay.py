@@ -0,0 +1,101 @@
+"""
+Records one run of the search agent or of the global graph in a cassette (every Gemini call, DuckDuckGo result
+and downloaded page), then replays it offline, with the original timings or none, to compare optimizations of
+the graph overhead, parsing and state handling on identical inputs. Each replay reports the wall time per node.
+
+Run from the repository root:
+    python -m benchmarks.cassette_replay record --agent global [--cassette PATH] [--offline]
+    python -m benchmarks.cassette_replay replay --agent global [--cassette PATH] [--time-scale 0] [--runs 3]
+
+--offline records the fake model and the local stand-ins of benchmarks.offline_graphs instead of Gemini and the network.
+"""
+import argparse
+import os
+import time
+
+from langchain_core.messages import HumanMessage
+
+from benchmarks import concurrent_search_agent
+from benchmarks.node_timing import NodeTimer
+from benchmarks.offline_graphs import SEARCH_QUERY, offline_search_pool, research_responder
+from src.agents import search_agent
+from src.agents.GDPR_agent import GDPR_agent
+from src.agents.search_agent import SearchAgent
+from src.constants import DIR_CACHE
+from src.global_workflow import Global_graph
+from src.inputs import INPUT_ARCHI
+from src.utils.cassette import RECORD, REPLAY, Cassette
+from src.utils.fake_chat_model import FakeChatModel, lognormal_latency
+from src.utils.model_registry import get_chat_model
+from src.utils.model_routing import ROUTE_RESEARCHER, ROUTE_SECURITY, ROUTE_SUMMARY, route_profile
+
+AGENTS = ("search", "global")
+
+
+def run_agent(agent_name: str, model, summary_model, timer: NodeTimer) -> None:
+    # The search and answer caches are left out: a cache hit would skip traffic the cassette has to see.
+    config = {"callbacks": [timer]}
+    if agent_name == "search":
+        SearchAgent(model, search_cache=None, answer_cache=None).run(SEARCH_QUERY, config=config)
+    elif agent_name == "global":
+        global_graph = Global_graph(model, summary_model=summary_model)
+        global_graph.gdpr_agent = GDPR_agent(model, search_agent_pool=offline_search_pool(model))
+        global_graph.graph.invoke(
+            {"messages": [HumanMessage(content=INPUT_ARCHI)], "iteration": 0, "iteration_max": 4, "note_max": 90, "diff_notes_max": 5},
+            config=config
+        )
+    else:
+        raise ValueError(f"Unknown agent: {agent_name}")
+
+
+def recorded_models(agent_name: str, offline: bool):
+    if offline:
+        model = FakeChatModel(responder=research_responder, latency=lognormal_latency(0.2, 0.3, seed=0))
+        return model, model
+    # The profiles the agents are routed to, on plain clients: no response cache or hedging in front of the cassette.
+    _, profile = route_profile(ROUTE_SECURITY if agent_name == "global" else ROUTE_RESEARCHER)
+    _, summary_profile = route_profile(ROUTE_SUMMARY)
+    return (get_chat_model(profile.model, profile.temperature, profile.max_output_tokens),
+            get_chat_model(summary_profile.model, summary_profile.temperature, summary_profile.max_output_tokens))
+
+
+def timed_run(agent_name: str, cassette: Cassette, model=None, summary_model=None) -> None:
+    timer = NodeTimer()
+    with search_agent.use_cassette(cassette):
+        start = time.perf_counter()
+        run_agent(agent_name, cassette.chat_model(model), cassette.chat_model(summary_model, namespace="summary"), timer)
+        wall = time.perf_counter() - start
+    totals = timer.totals()
+    print(f"\n== {cassette.mode} {agent_name} (time scale {cassette.time_scale}) ==")
+    print(f"wall {wall:.3f}s | model calls {totals['llm_calls']} | wall minus model wait {wall - totals['llm_wait_s']:.3f}s"
+          f" | cassette {cassette.stats()}")
+    print(timer.report())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mode", choices=(RECORD, REPLAY))
+    parser.add_argument("--agent", choices=AGENTS, default="global")
+    parser.add_argument("--cassette", help="Cassette file, by default .cache/cassettes/<agent>.cassette")
+    parser.add_argument("--offline", action="store_true", help="Record the fake model and local stand-ins")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Replay delay as a fraction of the recorded latency")
+    parser.add_argument("--runs", type=int, default=1, help="Number of replays")
+    args = parser.parse_args()
+    path = args.cassette or os.path.join(DIR_CACHE, "cassettes", f"{args.agent}.cassette")
+
+    if args.mode == RECORD:
+        if args.offline:
+            concurrent_search_agent.install_stand_ins(0.05)
+        model, summary_model = recorded_models(args.agent, args.offline)
+        timed_run(args.agent, Cassette(path, RECORD), model, summary_model)
+        print(f"Cassette saved to {path} ({os.path.getsize(path)} bytes)")
+    else:
+        for _ in range(args.runs):
+            cassette = Cassette(path, REPLAY, time_scale=args.time_scale)
+            timed_run(args.agent, cassette)
+            if cassette.misses:
+                print(f"Warning: {cassette.misses} request(s) were not in the cassette; the run diverged from the recording.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Stress test of one compiled SearchAgent serving many concurrent queries, with local stand-ins
+for the chat model, the DuckDuckGo search and the HTTP fetches (no network, no API key).
+
+Every query asks for more scrapes than its budget allows (in every sub-question with --parallel-sub-questions,
+where the budget is shared by the sub-questions); the run fails if any query gets a budget other than its own,
+which is what happens when per-run state leaks between runs.
+
+Run from the repository root:
+    python -m benchmarks.concurrent_search_agent [--queries 50] [--latency 0.02] [--parallel-sub-questions]
+"""
+import argparse
+import asyncio
+import re
+import sys
+import tempfile
+import time
+import uuid
+from typing import Any
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import AIMessage, SystemMessage, ToolMessage
+from langchain_core.tools import BaseTool
+
+from src.agents import search_agent
+from src.agents.search_agent import MAX_WEB_SCRAPER_CALLS, SearchAgent, SubQuestions
+from src.utils.disk_cache import DiskCache
+from src.utils.web_fetch import FetchedPage
+
+SCRAPE_REQUESTS_PER_QUERY = MAX_WEB_SCRAPER_CALLS + 2
+
+
+class ScriptedResearchModel:
+    """Stand-in chat model that decomposes, scrapes more than allowed, then reports how many scrapes went through."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def bind_tools(self, tools):
+        return self
+
+    def with_structured_output(self, schema):
+        model = self
+
+        class StructuredModel:
+            def invoke(self, messages):
+                time.sleep(model.latency)
+                return SubQuestions(sub_questions=["First sub-question", "Second sub-question"])
+
+            async def ainvoke(self, messages):
+                await asyncio.sleep(model.latency)
+                return SubQuestions(sub_questions=["First sub-question", "Second sub-question"])
+        return StructuredModel()
+
+    def invoke(self, messages):
+        time.sleep(self.latency)
+        return self._respond(messages)
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(self.latency)
+        return self._respond(messages)
+
+    def _respond(self, messages):
+        if isinstance(messages[0], SystemMessage) and messages[0].content == search_agent.prompt_query_decomposer:
+            return AIMessage(content="# Sub-questions:\n1. First sub-question\n2. Second sub-question")
+
+        query_id = re.search(r"query-(\w+)", messages[1].content).group(1)
+        if messages[0].content == search_agent.prompt_synthesis:
+            allowed = sum(int(count) for count in re.findall(r"scrapes allowed: (\d+)", messages[1].content))
+            return AIMessage(content=f"query-{query_id} scrapes allowed: {allowed}")
+        scrape_requests = sum(
+            1 for message in messages if isinstance(message, AIMessage)
+            for tool_call in message.tool_calls if tool_call["name"] == search_agent.web_scraper_tool.name
+        )
+        if scrape_requests < SCRAPE_REQUESTS_PER_QUERY:
+            url = f"https://docs.example.com/{query_id}/{uuid.uuid4().hex}"
+            return AIMessage(content="", tool_calls=[
+                {"name": search_agent.web_scraper_tool.name, "args": {"urls_tuple": [url]}, "id": uuid.uuid4().hex},
+                {"name": search_agent.duckduckgo_tool.name, "args": {"query": f"query {query_id}"}, "id": uuid.uuid4().hex},
+            ])
+
+        allowed = sum(1 for message in messages if isinstance(message, ToolMessage) and "Content from" in message.content)
+        return AIMessage(content=f"query-{query_id} scrapes allowed: {allowed}")
+
+
+class FakeSearchTool(BaseTool):
+    """Stand-in DuckDuckGo tool; a real tool, so that chat models can bind it."""
+    name: str = search_agent.duckduckgo_tool.name
+    description: str = search_agent.duckduckgo_tool.description
+    args_schema: Any = search_agent.duckduckgo_tool.args_schema
+    latency: float = 0.0
+
+    def _run(self, query: str) -> str:
+        time.sleep(self.latency)
+        return f"snippet: result for {query}, title: Result for {query}, link: https://docs.example.com/{uuid.uuid4().hex}"
+
+    async def _arun(self, query: str) -> str:
+        await asyncio.sleep(self.latency)
+        return f"snippet: result for {query}, title: Result for {query}, link: https://docs.example.com/{uuid.uuid4().hex}"
+
+
+def install_stand_ins(latency: float) -> None:
+    search_agent.duckduckgo_tool = FakeSearchTool(latency=latency)
+    search_agent.scrape_cache = DiskCache(f"{tempfile.mkdtemp()}/scrape.sqlite", namespace="stress")
+
+    def fake_pages(urls):
+        return {url: FetchedPage(url, "", f"Page {url}\nUnique paragraph of {url}, long enough to be fingerprinted "
+                                         f"by the near-duplicate filter of the run.", False) for url in urls}
+
+    def fake_fetch_pages(urls, **kwargs):
+        time.sleep(latency)
+        return fake_pages(urls)
+
+    async def fake_afetch_pages(urls, **kwargs):
+        await asyncio.sleep(latency)
+        return fake_pages(urls)
+    search_agent.fetch_pages = fake_fetch_pages
+    search_agent.afetch_pages = fake_afetch_pages
+
+
+def check(responses) -> int:
+    """Counts the responses whose query did not get exactly its own scraper budget."""
+    failures = 0
+    for i, response in enumerate(responses):
+        allowed = re.findall(r"query-(\w+) scrapes allowed: (\d+)", response)
+        if not allowed or any(query_id != f"{i}" or int(count) != MAX_WEB_SCRAPER_CALLS for query_id, count in allowed):
+            print(f"FAIL query {i}: {response!r}")
+            failures += 1
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.02, help="Latency of every stand-in call, in seconds")
+    parser.add_argument("--parallel-sub-questions", action="store_true")
+    args = parser.parse_args()
+
+    install_stand_ins(args.latency)
+    agent = SearchAgent(ScriptedResearchModel(args.latency), parallel_sub_questions=args.parallel_sub_questions,
+                        search_cache=None, answer_cache=None)
+    queries = [f"query-{i}" for i in range(args.queries)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.queries) as executor:
+        responses = list(executor.map(agent.run, queries))
+    threaded = time.perf_counter() - start
+    failures = check(responses)
+
+    async def run_all():
+        return await asyncio.gather(*(agent.arun(query) for query in queries))
+
+    start = time.perf_counter()
+    responses = asyncio.run(run_all())
+    asynchronous = time.perf_counter() - start
+    failures += check(responses)
+
+    print(f"{args.queries} concurrent queries on one agent: threads {threaded:.2f}s, asyncio {asynchronous:.2f}s")
+    print("OK" if not failures else f"{failures} query(ies) got a wrong scraper budget")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Tail latency of model calls with and without hedging, on FakeChatModel with lognormal latencies and
+occasional stragglers (a request stuck for many times the median, like an overloaded replica).
+
+Each run makes --calls-per-run sequential calls, like the nodes of a workflow, so that a single straggler
+delays the whole run. The report gives the latency percentiles of the calls and of the runs, and the extra
+requests paid for hedging; with --deadline, every run also gets a deadline and the runs which missed it are counted.
+
+Run from the repository root:
+    python -m benchmarks.hedged_requests [--runs 100] [--calls-per-run 8] [--median 0.05] [--deadline 1.0]
+"""
+import argparse
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from langchain_core.messages import HumanMessage
+
+from src.utils.fake_chat_model import FakeChatModel
+from src.utils.hedging import MIN_LATENCY_SAMPLES, DeadlineExceeded, HedgedChatModel, HedgePolicy, with_deadline
+
+
+def straggler_latency(median: float, sigma: float, straggler_rate: float, straggler_factor: float,
+                      seed: int) -> Callable[[], float]:
+    rng = random.Random(seed)
+    lock = threading.Lock()
+    mu = math.log(median)
+
+    def latency() -> float:
+        with lock:
+            value = rng.lognormvariate(mu, sigma)
+            return value * straggler_factor if rng.random() < straggler_rate else value
+    return latency
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(len(ordered) * p / 100) - 1)]
+
+
+def summary(values: List[float]) -> str:
+    if not values:
+        return "-"
+    return " | ".join(f"{name} {percentile(values, p):.3f}s" for name, p in (("p50", 50), ("p95", 95), ("p99", 99))) \
+        + f" | max {max(values):.3f}s"
+
+
+def run_variant(name: str, model, runs: int, calls_per_run: int, concurrency: int,
+                deadline: Optional[float]) -> None:
+    call_latencies: List[float] = []
+    run_latencies: List[float] = []
+    missed = 0
+    lock = threading.Lock()
+    messages = [HumanMessage(content="Review the architecture manifest.")]
+
+    def one_run(_):
+        nonlocal missed
+        config = with_deadline(deadline) if deadline is not None else None
+        start = time.perf_counter()
+        try:
+            for _ in range(calls_per_run):
+                call_start = time.perf_counter()
+                model.invoke(messages, config)
+                with lock:
+                    call_latencies.append(time.perf_counter() - call_start)
+        except DeadlineExceeded:
+            with lock:
+                missed += 1
+        with lock:
+            run_latencies.append(time.perf_counter() - start)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one_run, range(runs)))
+    print(f"\n== {name} ==")
+    print(f"calls: {summary(call_latencies)}")
+    print(f"runs:  {summary(run_latencies)}")
+    if deadline is not None:
+        print(f"runs past the {deadline}s deadline: {missed}/{runs} (failed fast)")
+    if isinstance(model, HedgedChatModel):
+        print(f"hedging: {model.policy.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=100)
+    parser.add_argument("--calls-per-run", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=16, help="Runs in parallel")
+    parser.add_argument("--median", type=float, default=0.05, help="Median model latency in seconds")
+    parser.add_argument("--sigma", type=float, default=0.3, help="Sigma of the lognormal latency")
+    parser.add_argument("--straggler-rate", type=float, default=0.03, help="Fraction of the calls which straggle")
+    parser.add_argument("--straggler-factor", type=float, default=20.0, help="Latency multiplier of a straggler")
+    parser.add_argument("--percentile", type=float, default=95, help="Hedge after this percentile of the latencies")
+    parser.add_argument("--max-hedge-ratio", type=float, default=0.1, help="Budget of duplicated requests")
+    parser.add_argument("--deadline", type=float, help="Deadline of each run in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    def fake_model():
+        latency = straggler_latency(args.median, args.sigma, args.straggler_rate, args.straggler_factor, args.seed)
+        return FakeChatModel(latency=latency, output_tokens=20)
+
+    run_variant("plain", fake_model(), args.runs, args.calls_per_run, args.concurrency, None)
+    if args.deadline is not None:
+        # Deadlines only: no credit for duplicates.
+        deadline_only = HedgedChatModel(fake_model(), HedgePolicy(max_hedge_ratio=0.0))
+        run_variant("deadline, no hedging", deadline_only, args.runs, args.calls_per_run, args.concurrency, args.deadline)
+    hedged = HedgedChatModel(fake_model(), HedgePolicy(percentile=args.percentile, max_hedge_ratio=args.max_hedge_ratio))
+    # Warm-up, so that the hedge delay is a percentile of measured latencies rather than the initial delay.
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(lambda _: hedged.invoke([HumanMessage(content="warm-up")]), range(MIN_LATENCY_SAMPLES)))
+    run_variant(f"hedged at p{args.percentile:g}", hedged, args.runs, args.calls_per_run, args.concurrency,
+                args.deadline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Micro-benchmark of the HTML extraction backends on the saved pages of benchmarks/fixtures/html.
+
+Run from the repository root:
+    python -m benchmarks.html_extraction [--repeat 20] [--scale 50] [--fixtures DIR]
+
+`--scale` repeats the body of every fixture to simulate the multi-megabyte pages met while scraping.
+"""
+import argparse
+import glob
+import os
+import re
+import statistics
+import time
+
+from src.utils.html_extraction import available_parsers, extract_many, extract_text
+
+DIR_FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "html")
+
+
+def load_fixtures(directory: str, scale: int) -> dict:
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            html_content = f.read()
+        if scale > 1:
+            html_content = re.sub(r"(<body[^>]*>)(.*)(</body>)", lambda m: m.group(1) + m.group(2) * scale + m.group(3),
+                                  html_content, count=1, flags=re.DOTALL)
+        pages[os.path.basename(path)] = html_content
+    return pages
+
+
+def time_it(function, repeat: int) -> list:
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", default=DIR_FIXTURES, help="Directory of saved .html pages")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--scale", type=int, default=1)
+    args = parser.parse_args()
+
+    pages = load_fixtures(args.fixtures, args.scale)
+    if not pages:
+        print(f"No .html fixture found in {args.fixtures}")
+        return
+    total_kb = sum(len(html_content) for html_content in pages.values()) / 1024
+    print(f"{len(pages)} page(s), {total_kb:.0f} KB, {args.repeat} repetition(s)")
+    print(f"Available parsers: {', '.join(available_parsers())}")
+
+    reference = None
+    for parser_name in available_parsers():
+        texts = {name: extract_text(html_content, parser_name) for name, html_content in pages.items()}
+        reference = reference or texts
+        same_length = all(abs(len(texts[name]) - len(reference[name])) <= 0.05 * max(1, len(reference[name])) for name in pages)
+
+        serial = time_it(lambda: [extract_text(html_content, parser_name) for html_content in pages.values()], args.repeat)
+        pooled = time_it(lambda: extract_many(pages, parser_name), args.repeat)
+        print(f"{parser_name:12} serial median {statistics.median(serial) * 1000:8.2f} ms"
+              f" | extract_many median {statistics.median(pooled) * 1000:8.2f} ms"
+              f" | output matches first backend: {'yes' if same_length else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import threading
+import time
+from collections import defaultdict
+from typing import Dict
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from src.utils.streaming import node_path
+
+
+class NodeTimer(BaseCallbackHandler):
+    """
+    Callback handler measuring, for every graph node, its wall time and the time spent waiting for chat models.
+    Pass it in the run config: graph.invoke(state, config={"callbacks": [timer]}).
+    """
+
+    def __init__(self):
+        self.nodes: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {"runs": 0, "wall_s": 0.0, "llm_calls": 0, "llm_wait_s": 0.0}
+        )
+        self._starts = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id, path: str, kind: str) -> None:
+        with self._lock:
+            self._starts[run_id] = (path, kind, time.perf_counter())
+
+    def _end(self, run_id) -> None:
+        end = time.perf_counter()
+        with self._lock:
+            started = self._starts.pop(run_id, None)
+            if started is None:
+                return
+            path, kind, start = started
+            if kind == "node":
+                self.nodes[path]["runs"] += 1
+                self.nodes[path]["wall_s"] += end - start
+            else:
+                self.nodes[path]["llm_calls"] += 1
+                self.nodes[path]["llm_wait_s"] += end - start
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        name = kwargs.get("name")
+        # A node runs as a chain named after it; the chains it calls inside carry its metadata too.
+        if metadata and name == metadata.get("langgraph_node") and not name.startswith("__"):
+            self._start(run_id, node_path(metadata), "node")
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        self._start(run_id, node_path(metadata), "llm")
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def report(self) -> str:
+        """Formats a table of the nodes: runs, wall time, model calls, model wait and the rest (framework and tools)."""
+        lines = [f"  {'node':<44}{'runs':>6}{'wall_s':>10}{'llm_calls':>11}{'llm_wait_s':>12}{'other_s':>10}"]
+        with self._lock:
+            nodes = sorted(self.nodes.items())
+        for path, node in nodes:
+            other = node["wall_s"] - node["llm_wait_s"] if node["runs"] else float("nan")
+            lines.append(f"  {path or '(root)':<44}{node['runs']:>6}{node['wall_s']:>10.3f}{node['llm_calls']:>11}"
+                         f"{node['llm_wait_s']:>12.3f}{other:>10.3f}")
+        return "\n".join(lines)
+
+    def totals(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "llm_calls": sum(node["llm_calls"] for node in self.nodes.values()),
+                "llm_wait_s": sum(node["llm_wait_s"] for node in self.nodes.values()),
+            }
@@ -0,0 +1,121 @@
+"""
+Whole-graph benchmark of the agents, fully offline: every chat model call goes to a FakeChatModel with
+simulated latency, and the DuckDuckGo search and the HTTP fetches to the local stand-ins of
+benchmarks.concurrent_search_agent. For each agent it reports the wall time, the time spent waiting
+for the model, and per node the wall time, the model wait and the rest (framework overhead and tools).
+
+Run from the repository root:
+    python -m benchmarks.offline_graphs [--agents architect,gdpr,search,search-parallel,global]
+        [--latency 0.2] [--latency-sigma 0.3] [--output-tokens 200] [--seconds-per-token 0] [--tool-latency 0]
+"""
+import argparse
+import time
+import uuid
+from typing import List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+from benchmarks import concurrent_search_agent
+from benchmarks.node_timing import NodeTimer
+from src.agents import search_agent
+from src.agents.architect_agent import Architect_agent
+from src.agents.GDPR_agent import GDPR_agent
+from src.agents.search_agent import SearchAgent, SearchAgentPool, extract_urls
+from src.global_workflow import Global_graph
+from src.inputs import INPUT_ARCHI, INPUT_GDPR
+from src.utils.fake_chat_model import FakeChatModel, lognormal_latency
+
+AGENTS = ("architect", "gdpr", "search", "search-parallel", "global")
+SEARCH_QUERY = "What are the GDPR requirements for storing user recommendations and profile pictures?"
+
+
+def research_responder(messages: List[BaseMessage], tools: List[dict], tool_choice) -> Optional[AIMessage]:
+    """
+    Scripts the tool calls of the agents: the search agent's researcher searches, then scrapes the first
+    results, then answers; the GDPR agent asks the search agent once. Everything else gets the default response.
+    """
+    tool_names = {tool["function"]["name"] for tool in tools}
+    requested = [tool_call["name"] for message in messages if isinstance(message, AIMessage) for tool_call in message.tool_calls]
+
+    if search_agent.duckduckgo_tool.name in tool_names:
+        if not requested:
+            query = next(str(message.content) for message in messages if isinstance(message, HumanMessage))
+            return AIMessage(content="", tool_calls=[
+                {"name": search_agent.duckduckgo_tool.name, "args": {"query": query[:200]}, "id": uuid.uuid4().hex}
+            ])
+        if search_agent.web_scraper_tool.name not in requested:
+            urls = [url for message in messages if isinstance(message, ToolMessage) for url in extract_urls(message.content)]
+            return AIMessage(content="", tool_calls=[
+                {"name": search_agent.web_scraper_tool.name, "args": {"urls_tuple": urls[:3]}, "id": uuid.uuid4().hex}
+            ])
+    elif "get_search_agent_response" in tool_names and not requested:
+        return AIMessage(content="", tool_calls=[
+            {"name": "get_search_agent_response", "args": {"query": SEARCH_QUERY}, "id": uuid.uuid4().hex}
+        ])
+    return None
+
+
+def offline_search_pool(model) -> SearchAgentPool:
+    # No search or answer cache, so every run does the same work and nothing offline reaches the shared caches.
+    return SearchAgentPool(model, search_cache=None, answer_cache=None)
+
+
+def run_agent(agent_name: str, model: FakeChatModel, timer: NodeTimer) -> None:
+    config = {"callbacks": [timer]}
+    if agent_name == "architect":
+        Architect_agent(model).graph.invoke(
+            {"messages": [HumanMessage(content=INPUT_ARCHI)], "iteration": 0, "iteration_max": 4, "note_max": 90, "diff_notes_max": 5},
+            config=config
+        )
+    elif agent_name == "gdpr":
+        GDPR_agent(model, search_agent_pool=offline_search_pool(model)).graph.invoke(
+            {"messages": [HumanMessage(content=INPUT_GDPR)], "iteration": 0, "iteration_max": 4, "note_max": 85, "diff_notes_max": 5},
+            config=config
+        )
+    elif agent_name in ("search", "search-parallel"):
+        agent = SearchAgent(model, parallel_sub_questions=agent_name == "search-parallel", search_cache=None, answer_cache=None)
+        agent.run(SEARCH_QUERY, config=config)
+    elif agent_name == "global":
+        global_graph = Global_graph(model, summary_model=model)
+        global_graph.gdpr_agent = GDPR_agent(model, search_agent_pool=offline_search_pool(model))
+        global_graph.graph.invoke(
+            {"messages": [HumanMessage(content=INPUT_ARCHI)], "iteration": 0, "iteration_max": 4, "note_max": 90, "diff_notes_max": 5},
+            config=config
+        )
+    else:
+        raise ValueError(f"Unknown agent: {agent_name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", default=",".join(AGENTS), help=f"Comma-separated subset of {', '.join(AGENTS)}")
+    parser.add_argument("--latency", type=float, default=0.2, help="Median latency of a model call, in seconds")
+    parser.add_argument("--latency-sigma", type=float, default=0.3, help="Spread of the lognormal model latency")
+    parser.add_argument("--output-tokens", type=int, default=200, help="Words of the default model responses")
+    parser.add_argument("--seconds-per-token", type=float, default=0.0, help="Extra model latency per output token")
+    parser.add_argument("--tool-latency", type=float, default=0.0, help="Latency of the search and fetch stand-ins")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    concurrent_search_agent.install_stand_ins(args.tool_latency)
+    for agent_name in args.agents.split(","):
+        model = FakeChatModel(
+            responder=research_responder,
+            latency=lognormal_latency(args.latency, args.latency_sigma, seed=args.seed),
+            output_tokens=args.output_tokens,
+            seconds_per_output_token=args.seconds_per_token,
+        )
+        timer = NodeTimer()
+        start = time.perf_counter()
+        run_agent(agent_name, model, timer)
+        wall = time.perf_counter() - start
+        totals = timer.totals()
+
+        print(f"\n== {agent_name} ==")
+        print(f"wall {wall:.3f}s | model calls {totals['llm_calls']} | model wait {totals['llm_wait_s']:.3f}s "
+              f"(simulated {model.stats()['wait_seconds']:.3f}s) | wall minus model wait {wall - totals['llm_wait_s']:.3f}s")
+        print(timer.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -3,23 +3,26 @@ from langgraph.graph.message import add_messages
 from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage, BaseMessage, AIMessage
 from langchain_core.tools import tool
 
-from typing import Annotated, List, Tuple, Dict
+from typing import Annotated, List, Optional, Tuple, Dict
 from typing_extensions import TypedDict
 import os
 from pydantic import BaseModel, Field
 from src.constants import DIR_MD_OUTPUT, RED, BLUE, YELLOW, GREEN, RESET
 from src.inputs import INPUT_GDPR
 from src.agents.prompts import PROMPT_GDPR_AGENT, PROMPT_GDPR_REVIEWER_AGENT
-from src.agents.search_agent import SearchAgent
+from src.agents.search_agent import SearchAgentPool, get_search_agent_pool
 from src.utils.utils_agent import add_note, check_reviewing_process
 from src.utils.custom_messages import GDPRMessage, ReviewerMessage
+from src.utils.model_routing import ROUTE_GDPR, ROUTE_REVIEWER, get_routed_model, route_stats
+from src.utils.streaming import TokenPrinter, stream_graph
 
-@tool
-def get_search_agent_response(query: str) -> str:
-    """Use this tool to get the response from the search agent."""
-    search_agent = SearchAgent(model)
-    response = search_agent.run(query)
-    return response
+def make_search_agent_tool(search_agent_pool: SearchAgentPool):
+    """Builds the search tool of the GDPR agent, answered by the warm agent of `search_agent_pool`."""
+    @tool
+    def get_search_agent_response(query: str) -> str:
+        """Use this tool to get the response from the search agent."""
+        return search_agent_pool.run(query)
+    return get_search_agent_response
 
 
 class GDPR_state(TypedDict):
@@ -38,14 +41,27 @@ class reviewer_response(BaseModel):
     comment_architecture : str = Field(description="The comments and critiques about the architecture manifest")
 
 class GDPR_agent:
-    def __init__(self, model):
+    def __init__(self, model=None, search_agent_pool: Optional[SearchAgentPool] = None, reviewer_model=None):
+        """
+        Args:
+            model: Chat model of the GDPR node, by default the one of the GDPR route; if given, also the default
+                of the reviewer node and of the search agent.
+            search_agent_pool: Search agent answering the search tool, by default the shared one of `model`,
+                or of the decomposer and researcher routes.
+            reviewer_model: Chat model of the reviewer node, by default `model` or the one of the reviewer route.
+        """
+        if search_agent_pool is None:
+            search_agent_pool = get_search_agent_pool(model)
+        if reviewer_model is None:
+            reviewer_model = model if model is not None else get_routed_model(ROUTE_REVIEWER)
+        if model is None:
+            model = get_routed_model(ROUTE_GDPR)
         graph = StateGraph(GDPR_state)
         graph.add_node("GDPR_node", self.GDPR_node)
         graph.add_node("review_node", self.review_node)
         graph.add_node("search_node", self.search_node)
 
         graph.set_entry_point("GDPR_node")
-        graph.add_edge("GDPR_node", "review_node")
         graph.add_conditional_edges(
             "review_node",
             self.check_reviewing_process,
@@ -59,23 +75,31 @@ class GDPR_agent:
         graph.add_edge("search_node", "GDPR_node")
 
         self.model = model
+        self.reviewer_model = reviewer_model
+        self.search_agent_pool = search_agent_pool
+        self.search_tool = make_search_agent_tool(self.search_agent_pool)
+        self.model_GDPR = model.bind_tools([self.search_tool])
         self.system_prompt_GDPR = PROMPT_GDPR_AGENT
         self.system_prompt_GDPR_reviewer = PROMPT_GDPR_REVIEWER_AGENT
         self.graph = graph.compile()
 
 
     def GDPR_node(self, state: GDPR_state):
-        response = self.model.bind_tools([get_search_agent_response]).invoke(
+        response = self.model_GDPR.invoke(
             [SystemMessage(content=self.system_prompt_GDPR)] + state["messages"]
         )
         print("=========== GDPR RESPONSE ===========")
         print(f"Iteration {state['iteration']} : {response.content}")
         print("=========================================")
-        return {"messages": [GDPRMessage(content=response.content)], "manifest": response.content}
+        update = {"messages": [GDPRMessage(content=response.content, tool_calls=response.tool_calls)]}
+        if not response.tool_calls:
+            # A tool call turn has no manifest; the previous one is kept.
+            update["manifest"] = response.content
+        return update
 
 
     def review_node(self, state: GDPR_state):
-        structured_response = self.model.with_structured_output(reviewer_response).invoke(
+        structured_response = self.reviewer_model.with_structured_output(reviewer_response).invoke(
             [SystemMessage(content=self.system_prompt_GDPR_reviewer)] + state["messages"]
         )
         print(f"=========== REVIEWER RESPONSE ==========={RED}")
@@ -110,7 +134,7 @@ class GDPR_agent:
         results_messages = []
         if len(tool_calls) != 1:
             return {"messages": []}
-        elif tool_calls[0]['name'] != "search_agent":
+        elif tool_calls[0]['name'] != self.search_tool.name:
             print(f"Error: Tool call {tool_calls[0]['name']} not found.")
             return {"messages": []}
         else:
@@ -121,7 +145,7 @@ class GDPR_agent:
             result_content = ""
             
             try:
-                result_content = get_search_agent_response(args['query'])
+                result_content = self.search_tool.invoke(args)
             except Exception as e:
                 print(f"Error during execution of search agent: {e}")
                 result_content = f"Internal error during tool call {tool_name}: {str(e)}"
@@ -134,18 +158,12 @@ class GDPR_agent:
 
 
 if __name__ == "__main__":
-    from langchain_google_genai import ChatGoogleGenerativeAI
-    import os
-    from dotenv import load_dotenv
-
-    load_dotenv()
-
-    model = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0, google_api_key=os.getenv("GOOGLE_API_KEY"))
-    gdpr_agent_instance = GDPR_agent(model)
+    gdpr_agent_instance = GDPR_agent()
     print("===== INPUT======")
     print(INPUT_GDPR)
     print("===========")
-    result = gdpr_agent_instance.graph.invoke({"messages": [HumanMessage(content=INPUT_GDPR)], "iteration": 0, "iteration_max": 4, "note_max": 85, "diff_notes_max": 5})
+    result = stream_graph(gdpr_agent_instance.graph, {"messages": [HumanMessage(content=INPUT_GDPR)], "iteration": 0, "iteration_max": 4, "note_max": 85, "diff_notes_max": 5}, TokenPrinter())
+    print(f"--- Model routes: {route_stats()} ---")
     md = result["manifest"]
     filename = "gdpr_manifest.md"
     dir = DIR_MD_OUTPUT
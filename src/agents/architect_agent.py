@@ -12,6 +12,8 @@ from src.inputs import INPUT_ARCHI
 from src.agents.prompts import PROMPT_ARCHITECT_AGENT, PROMPT_ARCHITECT_REVIEWER_AGENT
 from src.utils.utils_agent import add_note, check_reviewing_process
 from src.utils.custom_messages import ArchitectMessage, ReviewerMessage
+from src.utils.model_routing import ROUTE_ARCHITECT, ROUTE_REVIEWER, get_routed_model, route_stats
+from src.utils.streaming import TokenPrinter, stream_graph
 
 class Architect_state(TypedDict):
     messages: Annotated[List[BaseMessage], add_messages]
@@ -29,7 +31,17 @@ class reviewer_response(BaseModel):
 
 
 class Architect_agent:
-    def __init__(self, model):
+    def __init__(self, model=None, reviewer_model=None):
+        """
+        Args:
+            model: Chat model of the architect node, by default the one of the architect route; if given,
+                also the default of the reviewer node.
+            reviewer_model: Chat model of the reviewer node, by default `model` or the one of the reviewer route.
+        """
+        if reviewer_model is None:
+            reviewer_model = model if model is not None else get_routed_model(ROUTE_REVIEWER)
+        if model is None:
+            model = get_routed_model(ROUTE_ARCHITECT)
         graph = StateGraph(Architect_state)
         graph.add_node("architect_node", self.architect_node)
         graph.add_node("review_node", self.review_node)
@@ -43,6 +55,7 @@ class Architect_agent:
         )
         
         self.model = model
+        self.reviewer_model = reviewer_model
         self.system_prompt_architect = PROMPT_ARCHITECT_AGENT
         self.system_prompt_reviewer = PROMPT_ARCHITECT_REVIEWER_AGENT
         self.graph = graph.compile()
@@ -59,7 +72,7 @@ class Architect_agent:
 
 
     def review_node(self, state: Architect_state):
-        structured_response = self.model.with_structured_output(reviewer_response).invoke(
+        structured_response = self.reviewer_model.with_structured_output(reviewer_response).invoke(
             [SystemMessage(content=self.system_prompt_reviewer)] + state["messages"]
         )
         print(f"=========== REVIEWER RESPONSE ==========={RED}")
@@ -74,18 +87,12 @@ class Architect_agent:
 
 
 if __name__ == "__main__":
-    from langchain_google_genai import ChatGoogleGenerativeAI
-    import os
-    from dotenv import load_dotenv
-
-    load_dotenv()
-
-    model = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0, google_api_key=os.getenv("GOOGLE_API_KEY"))
-    architect_agent_instance = Architect_agent(model)
+    architect_agent_instance = Architect_agent()
     print("===== INPUT======")
     print(INPUT_ARCHI)
     print("===========")
-    result = architect_agent_instance.graph.invoke({"messages": [HumanMessage(content=INPUT_ARCHI)], "iteration": 0, "iteration_max": 4, "note_max": 90, "diff_notes_max": 5})
+    result = stream_graph(architect_agent_instance.graph, {"messages": [HumanMessage(content=INPUT_ARCHI)], "iteration": 0, "iteration_max": 4, "note_max": 90, "diff_notes_max": 5}, TokenPrinter())
+    print(f"--- Model routes: {route_stats()} ---")
     md = result["manifest"]
     filename = "architecture_manifest.md"
     dir = DIR_MD_OUTPUT
@@ -9,6 +9,8 @@ import os
 from src.utils.utils_UI import get_files_and_context
 from src.utils.markdown_viewer import MarkdownViewerApp
 from src.constants import DIR_MD_OUTPUT
+from src.utils.model_registry import get_chat_model
+from src.utils.streaming import chunk_text
 
 prompt_functional_insight_agent = """
 Role:
@@ -72,7 +74,13 @@ class Functional_insight_state(TypedDict):
     feedback: bool
 
 class Functional_insight_agent:
-    def __init__(self, model):
+    def __init__(self, model=None):
+        """
+        Args:
+            model: Chat model of the functional insight node, by default the shared one of get_chat_model().
+        """
+        if model is None:
+            model = get_chat_model()
         graph = StateGraph(Functional_insight_state)
         graph.add_node("load_files", self.load_files)
         graph.add_node("functional_insight_node", self.functional_insight_node)
@@ -94,9 +102,13 @@ class Functional_insight_agent:
         self.model = model
         self.system_prompt = prompt_functional_insight_agent
         self.graph = graph.compile()
+        # Viewer opened by functional_insight_node to show the insight while it is generated.
+        self.viewer = None
 
     def human_feedback_node(self, state: Functional_insight_state):
-        app = MarkdownViewerApp(state["messages"][-1].content, "Functional Insight Agent")
+        app = self.viewer or MarkdownViewerApp(state["messages"][-1].content, "Functional Insight Agent")
+        self.viewer = None
+        app.finish(state["messages"][-1].content)
         remark = app.get_remark()
         if remark is not None:
             return {"feedback": True, "messages": [HumanMessage(content=remark)]}
@@ -112,20 +124,18 @@ class Functional_insight_agent:
     def functional_insight_node(self, state: Functional_insight_state):
         markdown_files = ["# " + file["name"].split('.')[0] + " page :\n" + file["content"] for file in state["files"]]
         system_prompt_with_context = self.system_prompt.replace("{webapp_context}", state["webapp_context"]).replace("{architecture}", state["architecture"])
-        response = self.model.invoke(
+        self.viewer = MarkdownViewerApp("", "Functional Insight Agent", streaming=True)
+        response = None
+        for chunk in self.model.stream(
             [SystemMessage(content=system_prompt_with_context)] + [HumanMessage(content=markdown_files)] + state["messages"]
-        )
+        ):
+            response = chunk if response is None else response + chunk
+            self.viewer.append_text(chunk_text(chunk))
         return {"messages": [AIMessage(content=response.content)]}
     
 
 if __name__ == "__main__":
-    from langchain_google_genai import ChatGoogleGenerativeAI
-    import os
-    from dotenv import load_dotenv
-
-    load_dotenv()
-
-    model = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0, google_api_key=os.getenv("GOOGLE_API_KEY"))
+    model = get_chat_model()
     functional_insight_agent_instance = Functional_insight_agent(model)
     result = functional_insight_agent_instance.graph.invoke({"files": [], "error": False, "feedback": False})
     if result['error']:
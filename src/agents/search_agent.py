@@ -1,93 +1,384 @@
+from langgraph.config import get_stream_writer
 from langgraph.graph import StateGraph, END
 from langgraph.graph.message import add_messages
+from langgraph.types import Send
+from langchain_core.runnables import RunnableConfig, RunnableLambda, ensure_config
 from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage, BaseMessage, AIMessage
-from typing import Annotated, List, Tuple
+from typing import Annotated, AsyncIterator, Callable, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
 from typing_extensions import TypedDict
-from functools import lru_cache
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from pydantic import BaseModel, Field
+import asyncio
+import operator
+import os
+import queue
+import re
+import tempfile
+import threading
+import time
+import weakref
 
 from langchain_community.tools import DuckDuckGoSearchResults
-from langchain_core.tools import tool
-from langchain_community.document_loaders import AsyncHtmlLoader
-from bs4 import BeautifulSoup
+from langchain_core.tools import StructuredTool
+
+from src.constants import DIR_CACHE
+from src.utils.answer_cache import AnswerCache
+from src.utils.cassette import RECORD, Cassette, CassetteSearchTool, cassette_afetch_pages, cassette_fetch_pages
+from src.utils.disk_cache import DiskCache
+from src.utils.html_extraction import aextract_many, extract_many
+from src.utils.llm_cache import LLMResponseCache
+from src.utils.llm_scheduler import PRIORITY_INTERACTIVE, ScheduledChatModel
+from src.utils.model_registry import get_chat_model
+from src.utils.model_routing import ROUTE_DECOMPOSER, ROUTE_RESEARCHER, get_routed_model
+from src.utils.near_duplicates import NearDuplicateFilter
+from src.utils.passage_ranking import select_passages
+from src.utils.prefetch import Prefetcher
+from src.utils.search_cache import SearchResultCache
+from src.utils.search_results import SearchResult, format_search_results, parse_search_results
+from src.utils.snippet_coverage import snippet_coverage, split_snippets
+from src.utils.web_fetch import MAX_PAGE_BYTES, FetchedPage, afetch_pages, fetch_pages
+from src.utils.url_utils import canonicalize_url
 
 MAX_TOOL_MSG_LENGTH = 8000 
 MAX_SEARCH_MSG_LENGTH = 4000
+MAX_CONCURRENT_TOOL_CALLS = 4
+MAX_WEB_SCRAPER_CALLS = 3
+MAX_SUB_QUESTIONS = 3
+SCRAPE_CACHE_TTL_SECONDS = 24 * 3600
+SCRAPE_CACHE_MAX_BYTES = 200 * 1024 * 1024
+SCRAPE_TEXT_TARGET_CHARS = 4 * MAX_TOOL_MSG_LENGTH
+# A URL not scraped within this many seconds is reported as timed out instead of holding up the others.
+SCRAPE_URL_DEADLINE_SECONDS = 20
+SEARCH_CACHE_TTL_SECONDS = 3600
+SEARCH_CACHE_MAX_ENTRIES = 512
+SEARCH_CACHE_MAX_BYTES = 20 * 1024 * 1024
+# Minimum coverage of every sub-question by a single search snippet for the snippet fast path to answer directly.
+SNIPPET_COVERAGE_THRESHOLD = 0.75
+
+scrape_cache = DiskCache(
+    os.path.join(DIR_CACHE, "search_agent.sqlite"),
+    namespace="scraped_pages",
+    ttl_seconds=SCRAPE_CACHE_TTL_SECONDS,
+    max_bytes=SCRAPE_CACHE_MAX_BYTES
+)
 
 duckduckgo_tool = DuckDuckGoSearchResults(
     max_results=10
 )
 
-@tool
-def web_scraper_tool(urls_tuple: tuple[str, ...]) -> str:
+
+def make_search_cache(on_disk: bool = True, max_entries: int = SEARCH_CACHE_MAX_ENTRIES,
+                      ttl_seconds: float = SEARCH_CACHE_TTL_SECONDS) -> SearchResultCache:
+    """Builds a search result cache, backed by the search agent's SQLite file if `on_disk`."""
+    disk_cache = None
+    if on_disk:
+        disk_cache = DiskCache(
+            os.path.join(DIR_CACHE, "search_agent.sqlite"),
+            namespace="search_results",
+            ttl_seconds=ttl_seconds,
+            max_bytes=SEARCH_CACHE_MAX_BYTES
+        )
+    return SearchResultCache(max_entries=max_entries, ttl_seconds=ttl_seconds, disk_cache=disk_cache)
+
+
+search_cache = make_search_cache()
+answer_cache = AnswerCache()
+
+
+@contextmanager
+def use_cassette(cassette: Cassette):
     """
-    Scrape the content of provided URLs (as a tuple) and return the content as a single string.
-    Args:
-        urls_tuple: Tuple of URLs to scrape.
-    Returns:
-        str: Text content extracted from web pages, separated by markers.
+    Routes the DuckDuckGo searches and the page downloads of the search agents through `cassette`,
+    and saves it on exit when recording. The scrape cache is replaced by an empty one meanwhile, so that
+    every page goes through the cassette; build the agents inside the block, with search_cache=None
+    and answer_cache=None, for the same reason.
     """
-    urls = list(urls_tuple)
-    if not urls:
-        return "The provided URL list is empty."
+    global duckduckgo_tool, fetch_pages, afetch_pages, scrape_cache
+    saved = duckduckgo_tool, fetch_pages, afetch_pages, scrape_cache
+    # Scrapes left running in the background may still hold the SQLite file when the directory is removed.
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as scrape_cache_dir:
+        try:
+            duckduckgo_tool = CassetteSearchTool.wrap(duckduckgo_tool, cassette)
+            fetch_pages = cassette_fetch_pages(cassette, fetch_pages)
+            afetch_pages = cassette_afetch_pages(cassette, afetch_pages)
+            scrape_cache = DiskCache(os.path.join(scrape_cache_dir, "scrape.sqlite"), namespace="cassette")
+            yield cassette
+        finally:
+            duckduckgo_tool, fetch_pages, afetch_pages, scrape_cache = saved
+            if cassette.mode == RECORD:
+                cassette.save()
 
-    print(f"--- Scraping URLs: {urls} ---")
+
+def _extracted_contents(fetched_pages: Dict[str, FetchedPage], extracted_contents: Dict[str, str]) -> Dict[str, str]:
+    contents = {url: page.text for url, page in fetched_pages.items() if page.text is not None}
+    contents.update(extracted_contents)
+    for url in fetched_pages:
+        if not contents.get(url):
+            print(f"Warning: No useful text extracted from {url} after cleaning.")
+    return {url: text for url, text in contents.items() if text}
+
+
+def _fetch_and_extract(urls: List[str]) -> Dict[str, str]:
+    """Downloads `urls` and returns the extracted text of each page that yielded useful content."""
+    # Passage ranking needs more text than fits in the tool message, but not the whole page.
+    fetched_pages = fetch_pages(urls, max_bytes=MAX_PAGE_BYTES, min_text_chars=SCRAPE_TEXT_TARGET_CHARS)
+    extracted_contents = extract_many({url: page.html for url, page in fetched_pages.items() if page.text is None})
+    return _extracted_contents(fetched_pages, extracted_contents)
+
+
+async def _afetch_and_extract(urls: List[str]) -> Dict[str, str]:
+    """Async version of _fetch_and_extract()."""
+    fetched_pages = await afetch_pages(urls, max_bytes=MAX_PAGE_BYTES, min_text_chars=SCRAPE_TEXT_TARGET_CHARS)
+    extracted_contents = await aextract_many({url: page.html for url, page in fetched_pages.items() if page.text is None})
+    return _extracted_contents(fetched_pages, extracted_contents)
+
+
+def _lookup_scrape_cache(urls: List[str]) -> Tuple[Dict[str, str], Dict[str, str], List[str]]:
+    """Returns the canonical URL of each of `urls`, the cached texts (by canonical URL) and the URLs to fetch."""
+    canonical_urls = {url: canonicalize_url(url) for url in urls}
+    cached_contents = scrape_cache.get_many(canonical_urls.values())
+    missing_urls = [url for url in urls if canonical_urls[url] not in cached_contents]
+    print(f"--- Scrape cache: {len(urls) - len(missing_urls)} hit(s), {len(missing_urls)} miss(es) ---")
+    return canonical_urls, cached_contents, missing_urls
+
+
+def _store_scraped_contents(urls: List[str], canonical_urls: Dict[str, str], cached_contents: Dict[str, str],
+                            fetched_contents: Dict[str, str]) -> Dict[str, str]:
+    """Caches the fetched texts and returns the text of each of `urls` that has one, in order."""
+    scrape_cache.set_many({canonical_urls[url]: text for url, text in fetched_contents.items()})
+
+    contents = {}
+    for url in urls:
+        cleaned_text = cached_contents.get(canonical_urls[url]) or fetched_contents.get(url)
+        if cleaned_text:
+            contents[url] = cleaned_text
+    return contents
+
+
+def scrape_urls(urls: List[str]) -> Dict[str, str]:
+    """Returns the text of each of `urls` that yielded useful content, from the scrape cache or the web."""
+    canonical_urls, cached_contents, missing_urls = _lookup_scrape_cache(urls)
+    fetched_contents = _fetch_and_extract(missing_urls) if missing_urls else {}
+    return _store_scraped_contents(urls, canonical_urls, cached_contents, fetched_contents)
+
+
+async def ascrape_urls(urls: List[str]) -> Dict[str, str]:
+    """Async version of scrape_urls()."""
+    canonical_urls, cached_contents, missing_urls = _lookup_scrape_cache(urls)
+    fetched_contents = await _afetch_and_extract(missing_urls) if missing_urls else {}
+    return _store_scraped_contents(urls, canonical_urls, cached_contents, fetched_contents)
+
+
+class ScrapedUrl(NamedTuple):
+    url: str
+    text: Optional[str]
+    # "cached", "scraped", "empty" (no useful text, or the download failed) or "timed_out".
+    status: str
+    elapsed_s: float
+
+
+def _scrape_one(url: str, canonical_url: str) -> Optional[str]:
+    text = _fetch_and_extract([url]).get(url)
+    if text:
+        scrape_cache.set(canonical_url, text)
+    return text
+
+
+async def _ascrape_one(url: str, canonical_url: str) -> Optional[str]:
+    text = (await _afetch_and_extract([url])).get(url)
+    if text:
+        scrape_cache.set(canonical_url, text)
+    return text
+
+
+def _scraped_url(url: str, task, start: float) -> ScrapedUrl:
     try:
-        loader = AsyncHtmlLoader(urls)
-        docs = loader.load()
+        text = task.result()
+    except Exception as e:
+        print(f"Warning: Unable to scrape {url}: {e}")
+        text = None
+    return ScrapedUrl(url, text, "scraped" if text else "empty", round(time.perf_counter() - start, 4))
 
-        all_contents = []
-        scraped_urls = []
 
-        for i, doc in enumerate(docs):
-            html_content = doc.page_content
-            source_url = doc.metadata.get('source', urls[i])
+def _timed_out(url: str, deadline_seconds: float) -> ScrapedUrl:
+    print(f"Warning: Scraping {url} timed out after {deadline_seconds}s")
+    return ScrapedUrl(url, None, "timed_out", float(deadline_seconds))
 
-            if not html_content:
-                print(f"Warning: No HTML content for URL {source_url}")
-                continue
 
-            soup = BeautifulSoup(html_content, "html.parser")
+def iter_scrape_urls(urls: List[str], deadline_seconds: float = SCRAPE_URL_DEADLINE_SECONDS,
+                     start: Optional[float] = None) -> Iterator[ScrapedUrl]:
+    """
+    Yields the result of each of `urls` as soon as it is known: the scrape cache hits first, then the
+    downloads in the order they finish. The URLs still downloading after `deadline_seconds` are reported
+    as timed out; their downloads go on in the background and fill the scrape cache for a later call.
+    The deadline counts from `start` (a time.perf_counter() value), by default the call; once it has
+    passed, the URLs missing from the cache are reported as timed out without being downloaded.
+    """
+    start = time.perf_counter() if start is None else start
+    canonical_urls, cached_contents, missing_urls = _lookup_scrape_cache(urls)
+    for url in urls:
+        if canonical_urls[url] in cached_contents:
+            yield ScrapedUrl(url, cached_contents[canonical_urls[url]], "cached", 0.0)
+    if not missing_urls:
+        return
+    if time.perf_counter() - start >= deadline_seconds:
+        for url in missing_urls:
+            yield _timed_out(url, deadline_seconds)
+        return
+
+    executor = ThreadPoolExecutor(max_workers=len(missing_urls))
+    try:
+        futures = {executor.submit(_scrape_one, url, canonical_urls[url]): url for url in missing_urls}
+        pending = set(futures)
+        while pending:
+            remaining = deadline_seconds - (time.perf_counter() - start)
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield _scraped_url(futures[future], future, start)
+        for future in pending:
+            yield _timed_out(futures[future], deadline_seconds)
+    finally:
+        executor.shutdown(wait=False)
+
+
+async def aiter_scrape_urls(urls: List[str], deadline_seconds: float = SCRAPE_URL_DEADLINE_SECONDS,
+                            start: Optional[float] = None) -> AsyncIterator[ScrapedUrl]:
+    """Async version of iter_scrape_urls(); the downloads that miss their deadline are cancelled."""
+    start = time.perf_counter() if start is None else start
+    canonical_urls, cached_contents, missing_urls = _lookup_scrape_cache(urls)
+    for url in urls:
+        if canonical_urls[url] in cached_contents:
+            yield ScrapedUrl(url, cached_contents[canonical_urls[url]], "cached", 0.0)
+    if not missing_urls:
+        return
+    if time.perf_counter() - start >= deadline_seconds:
+        for url in missing_urls:
+            yield _timed_out(url, deadline_seconds)
+        return
+
+    tasks = {asyncio.ensure_future(_ascrape_one(url, canonical_urls[url])): url for url in missing_urls}
+    pending = set(tasks)
+    try:
+        while pending:
+            remaining = deadline_seconds - (time.perf_counter() - start)
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield _scraped_url(tasks[task], task, start)
+        for task in pending:
+            yield _timed_out(tasks[task], deadline_seconds)
+    finally:
+        for task in pending:
+            task.cancel()
 
-            article = soup.find("article") or soup.find("main") or soup.body
 
-            if not article:
-                print(f"Warning: Unable to find main content tag for URL {source_url}")
-                continue
+def collect_scraped_urls(urls: List[str], results: List[ScrapedUrl]) -> Tuple[Dict[str, str], List[str]]:
+    """Returns the text of each of `urls` that has one, in request order, and the URLs that timed out."""
+    by_url = {result.url: result for result in results}
+    contents = {url: by_url[url].text for url in urls if url in by_url and by_url[url].text}
+    timed_out = [url for url in urls if url in by_url and by_url[url].status == "timed_out"]
+    return contents, timed_out
 
-            for tag in article.find_all(["script", "style", "header", "footer", "nav",
-                                       "aside", "form", "noscript", "iframe", "img", "button"]):
-                tag.decompose()
 
-            content_tags = article.find_all(["h1", "h2", "h3", "h4", "h5", "h6", "p",
-                                           "ul", "ol", "li", "blockquote", "td", "th"])
-            cleaned_text = "".join([tag.get_text(separator=' ', strip=True) for tag in content_tags])
-            cleaned_text = "".join(line for line in cleaned_text.splitlines() if line.strip())
+def timed_out_note(urls: List[str], deadline_seconds: float = SCRAPE_URL_DEADLINE_SECONDS) -> str:
+    return f"\n\n[Not scraped, timed out after {deadline_seconds}s: {', '.join(urls)}]" if urls else ""
 
 
-            if cleaned_text.strip():
-                all_contents.append(f"--- Content from {source_url} ---\n{cleaned_text}")
-                scraped_urls.append(source_url)
-            else:
-                print(f"Warning: No useful text extracted from {source_url} after cleaning.")
+def prefetch_url(url: str) -> None:
+    """Scrapes `url` into the scrape cache, ahead of a web_scraper_tool call that may ask for it."""
+    scrape_urls([url])
+
+
+async def aprefetch_url(url: str) -> None:
+    """Async version of prefetch_url()."""
+    await ascrape_urls([url])
+
+
+def deduplicate_contents(contents: Dict[str, str], duplicate_filter: NearDuplicateFilter,
+                         remember: bool = True) -> Tuple[Dict[str, str], int]:
+    """
+    Removes from the scraped pages the paragraphs `duplicate_filter` has already seen, or that an earlier page
+    of `contents` repeats. Returns the pages that still have content and the number of characters saved.
+    With `remember` False, the filter does not remember the kept paragraphs: the caller remembers those it emits.
+    """
+    deduplicated = {}
+    saved_chars = 0
+    batch = []
+    for url, text in contents.items():
+        text, removed_chars = duplicate_filter.check(text, batch)
+        if remember:
+            duplicate_filter.remember(text)
+        saved_chars += removed_chars
+        if text.strip():
+            deduplicated[url] = text
+        else:
+            print(f"--- Content from {url} only duplicates already scraped content ---")
+    return deduplicated, saved_chars
+
+
+def duplicates_note(saved_chars: int) -> str:
+    return f"\n\n[Near-duplicate paragraphs removed: {saved_chars} characters saved]" if saved_chars else ""
+
+
+def content_header(url: str) -> str:
+    return f"--- Content from {url} ---\n"
+
+
+def format_scraped_contents(contents: Dict[str, str]) -> str:
+    """Joins the text of the scraped pages into a single string, separated by markers."""
+    return "---\n".join(content_header(url) + text for url, text in contents.items())
+
+
+def _web_scraper_output(contents: Dict[str, str], timed_out: List[str]) -> str:
+    contents, saved_chars = deduplicate_contents(contents, NearDuplicateFilter())
+    if not contents:
+        return "No valid content could be extracted from the provided URLs." + timed_out_note(timed_out)
+
+    print(f"--- Scraping successful for {len(contents)} URLs ---")
+    return format_scraped_contents(contents) + duplicates_note(saved_chars) + timed_out_note(timed_out)
+
+
+def web_scraper(urls_tuple: tuple[str, ...]) -> str:
+    """
+    Scrape the content of provided URLs (as a tuple) and return the content as a single string.
+    Args:
+        urls_tuple: Tuple of URLs to scrape.
+    Returns:
+        str: Text content extracted from web pages, separated by markers.
+    """
+    urls = list(dict.fromkeys(urls_tuple))
+    if not urls:
+        return "The provided URL list is empty."
 
+    print(f"--- Scraping URLs: {urls} ---")
+    try:
+        return _web_scraper_output(*collect_scraped_urls(urls, list(iter_scrape_urls(urls))))
+    except Exception as e:
+        print(f"Error while scraping URLs: {urls}. Error: {e}")
+        return f"Error while scraping URLs: {str(e)}"
 
-        if not all_contents:
-            return "No valid content could be extracted from the provided URLs."
 
-        print(f"--- Scraping successful for {len(scraped_urls)} URLs ---")
-        return "---\n".join(all_contents)
+async def aweb_scraper(urls_tuple: tuple[str, ...]) -> str:
+    """Async version of web_scraper()."""
+    urls = list(dict.fromkeys(urls_tuple))
+    if not urls:
+        return "The provided URL list is empty."
 
+    print(f"--- Scraping URLs: {urls} ---")
+    try:
+        results = [scraped async for scraped in aiter_scrape_urls(urls)]
+        return _web_scraper_output(*collect_scraped_urls(urls, results))
     except Exception as e:
         print(f"Error while scraping URLs: {urls}. Error: {e}")
         return f"Error while scraping URLs: {str(e)}"
 
 
-@lru_cache(maxsize=30)
-def cached_web_scraper(urls_tuple: tuple) -> str:
-    """
-    Cached version of the web scraper that uses a tuple of URLs as a key.
-    """
-    return web_scraper_tool.invoke({"urls_tuple": urls_tuple})
+web_scraper_tool = StructuredTool.from_function(func=web_scraper, coroutine=aweb_scraper, name="web_scraper_tool")
 
 
 prompt_search_agent_v3 = """
@@ -131,32 +422,278 @@ Example response format:
 
 """
 
+prompt_synthesis = """
+You are an agent specialized in synthesizing research results. You will receive the initial query of the user and, for each of its sub-questions, a partial answer written by a researcher together with the sources it used.
+
+Your mission is to:
+1. **Merge** the partial answers into a single complete, coherent and structured response to the initial query, in markdown format.
+2. **Remove redundancies** between the partial answers and reconcile them if they disagree, stating the disagreement when it cannot be resolved.
+3. **Cite the sources**: at the end of your response, list all the URLs used by the partial answers, without duplicates.
+
+Don't extrapolate an answer that isn't in the partial answers. If some sub-questions could not be answered, indicate it.
+"""
+
+prompt_snippet_answer = """
+You are an agent specialized in answering from web search results. You will receive the initial query of the user, its sub-questions and the results of web searches (snippets, titles and links).
+
+Your mission is to:
+1. **Answer** the initial query and its sub-questions using only the search results, in a complete, coherent and structured markdown response.
+2. **Cite the sources**: at the end of your response, list the links of the results you used, and mention that the answer is based on search snippets only, the pages were not scraped.
+
+Don't extrapolate an answer that isn't in the search results. If some points are not covered by the snippets, indicate it.
+"""
+
+
+class SubQuestions(BaseModel):
+    sub_questions : List[str] = Field(description=f"The targeted and autonomous sub-questions of the initial query (maximum {MAX_SUB_QUESTIONS})")
+
+
 class SearchAgentState(TypedDict):
     messages: Annotated[List[BaseMessage], add_messages]
+    sub_questions: List[str]
+    partial_answers: Annotated[List[dict], operator.add]
+
+
+class SubQuestionState(TypedDict):
+    query: str
+    sub_question: str
+
+
+def parse_sub_questions(text: str) -> List[str]:
+    """Parses the numbered markdown list written by the query decomposer."""
+    sub_questions = [match.strip() for match in re.findall(r"^\s*\d+[.)]\s+(.+)$", text, re.MULTILINE)]
+    return [question for question in sub_questions if question][:MAX_SUB_QUESTIONS]
+
+
+def extract_urls(text: str) -> List[str]:
+    """Returns the URLs found in `text`, without duplicates, in order of appearance."""
+    urls = re.findall(r"https?://[^\s)\]>\"'`,]+", text)
+    return list(dict.fromkeys(url.rstrip(".;:") for url in urls))
+
+
+def answer_sources(messages: List[BaseMessage], answer: str) -> List[str]:
+    """Returns the URLs passed to web_scraper_tool in `messages` and those cited in `answer`, without duplicates."""
+    sources = []
+    for message in messages:
+        for tool_call in getattr(message, "tool_calls", None) or []:
+            if tool_call["name"] == web_scraper_tool.name:
+                sources.extend(tool_call["args"].get("urls_tuple") or tool_call["args"].get("urls") or [])
+    return list(dict.fromkeys(sources + extract_urls(answer)))
+
+
+def search_results(messages: List[BaseMessage]) -> List[str]:
+    """Returns the contents of the DuckDuckGo ToolMessages in `messages`, in order."""
+    search_call_ids = {
+        tool_call["id"]
+        for message in messages
+        for tool_call in getattr(message, "tool_calls", None) or []
+        if tool_call["name"] in (duckduckgo_tool.name, "duckduckgo_results_json")
+    }
+    return [message.content for message in messages
+            if isinstance(message, ToolMessage) and message.tool_call_id in search_call_ids]
+
+
+def seen_result_urls(messages: List[BaseMessage]) -> Set[str]:
+    """Returns the canonical URLs of the search results already shown in `messages`."""
+    return {canonicalize_url(url) for result in search_results(messages) for url in extract_urls(result)}
+
+
+def relay_events(futures: list, events: "queue.SimpleQueue", progress: Callable[[dict], None]) -> None:
+    """Passes the events that the workers running `futures` put on `events` to `progress`, until they are all done."""
+    for future in futures:
+        # Queued after the events of the worker, which come before its result.
+        future.add_done_callback(lambda _: events.put(None))
+    running = len(futures)
+    while running:
+        event = events.get()
+        if event is None:
+            running -= 1
+        else:
+            progress(event)
+
+
+def stream_progress_writer() -> Optional[Callable[[dict], None]]:
+    """
+    Returns the writer of LangGraph's "custom" stream mode for the current node, or None outside a graph run.
+    Graph runs with stream_mode="custom" receive its events, e.g. one per scraped URL as soon as it is done.
+    """
+    try:
+        return get_stream_writer()
+    except Exception:
+        return None
+
+
+class SearchRunContext:
+    """
+    Mutable state of a single search run, shared by all its nodes and parallel branches.
+    It travels in the run config rather than on the agent, so one agent can serve concurrent runs.
+    """
+
+    def __init__(self, max_web_scraper_calls: int = MAX_WEB_SCRAPER_CALLS):
+        self.max_web_scraper_calls = max_web_scraper_calls
+        self.web_scraper_calls = 0
+        # Paragraphs already scraped during the run, across pages and tool calls.
+        self.duplicate_filter = NearDuplicateFilter()
+        # Research loops answered from the search snippets, and the scrapes and model turns they spared.
+        self.snippet_fast_paths = 0
+        self.scrapes_saved = 0
+        self.llm_turns_saved = 0
+        # Speculative scrapes of the top search results, started while the researcher picks its URLs.
+        self.prefetcher = Prefetcher(prefetch_url, aprefetch_url)
+        self._lock = threading.Lock()
+
+    def reserve_web_scraper_call(self) -> bool:
+        """Counts a web_scraper_tool call and returns False if it goes over the budget of the run."""
+        with self._lock:
+            self.web_scraper_calls += 1
+            return self.web_scraper_calls <= self.max_web_scraper_calls
+
+    def new_search_results(self, results: List[SearchResult], seen_urls: Set[str]) -> List[SearchResult]:
+        """
+        Returns the `results` whose canonical URL is not in `seen_urls`, those of the researcher loop asking,
+        and adds them to it. The lock covers the searches of one tool round, which share the set.
+        """
+        with self._lock:
+            new_results = [result for result in results if canonicalize_url(result.url) not in seen_urls]
+            seen_urls.update(canonicalize_url(result.url) for result in new_results)
+            return new_results
+
+    def record_snippet_fast_path(self) -> Tuple[int, int]:
+        """
+        Counts a research loop answered from the search snippets and returns the scrapes and model turns it saved.
+        Without it the researcher would have scraped (if the budget allows) and answered in a second turn,
+        so one web_scraper_tool call and one model turn are saved.
+        """
+        with self._lock:
+            scrapes_saved = 1 if self.web_scraper_calls < self.max_web_scraper_calls else 0
+            self.snippet_fast_paths += 1
+            self.scrapes_saved += scrapes_saved
+            self.llm_turns_saved += 1
+            return scrapes_saved, 1
+
+
+def with_run_context(config: Optional[RunnableConfig]) -> RunnableConfig:
+    """
+    Returns a copy of `config` carrying a new SearchRunContext. The configurable values of the enclosing run
+    are kept, e.g. its deadline when the search is started by a tool of another graph.
+    """
+    inherited = ensure_config().get("configurable", {})
+    config = ensure_config(config)
+    config["configurable"] = {**inherited, **config.get("configurable", {}), "search_run": SearchRunContext()}
+    return config
+
+
+def get_run_context(config: Optional[RunnableConfig]) -> SearchRunContext:
+    """Returns the SearchRunContext of the run, or a new one if the graph was invoked without run()/arun()."""
+    run_context = (config or {}).get("configurable", {}).get("search_run")
+    if run_context is None:
+        print("Warning: No search run context in the config, the scraper budget only applies to this step.")
+        run_context = SearchRunContext()
+    return run_context
 
 
 class SearchAgent:
-    def __init__(self, model):
-        graph = StateGraph(SearchAgentState)
-        graph.add_node("query_decomposer", self.call_query_decomposer)
-        graph.add_node("researcher_node", self.call_researcher)
-        graph.add_node("tool_node", self.call_tool)
-
-        graph.set_entry_point("query_decomposer")
-        graph.add_edge("query_decomposer", "researcher_node")
+    def __init__(self, model=None, parallel_sub_questions: bool = False,
+                 search_cache: Optional[SearchResultCache] = search_cache,
+                 answer_cache: Optional[AnswerCache] = answer_cache,
+                 snippet_fast_path: bool = False,
+                 snippet_coverage_threshold: float = SNIPPET_COVERAGE_THRESHOLD,
+                 prefetch_top_n: int = 0, decomposer_model=None):
+        """
+        Args:
+            model: Chat model of the researcher, synthesis and snippet answer nodes, by default the one of
+                the researcher route, scheduled in the interactive priority class; if given, also the default
+                of the query decomposer.
+            parallel_sub_questions: If True, each sub-question gets its own researcher/tool loop,
+                run in parallel, and a synthesis node merges the partial answers.
+            search_cache: Cache of the DuckDuckGo results, shared by default between all agents; None disables it.
+            answer_cache: Cache of the final answers, checked before running the graph,
+                shared by default between all agents, each agent configuration (models, prompts and options)
+                in its own namespace; None disables it.
+            snippet_fast_path: If True, after a search round whose snippets already cover every sub-question
+                (see snippet_coverage_threshold), the research loop answers from the snippets without scraping.
+            snippet_coverage_threshold: Minimum fraction of the terms of each sub-question found in a single snippet.
+            prefetch_top_n: Number of links of each search result scraped into the scrape cache in the background,
+                while the researcher chooses its URLs; those it does not choose are cancelled. 0 disables it.
+            decomposer_model: Chat model of the query decomposer, by default `model` or the one of the decomposer route.
+        """
+        if decomposer_model is None:
+            decomposer_model = model if model is not None else get_routed_model(ROUTE_DECOMPOSER)
+        if model is None:
+            model = get_routed_model(ROUTE_RESEARCHER)
+        self.system_researcher = prompt_search_agent_v3
+        self.system_query_decomposer = prompt_query_decomposer
+        self.system_synthesis = prompt_synthesis
+        self.model_query_decomposer = decomposer_model
+        self.model_structured_query_decomposer = decomposer_model.with_structured_output(SubQuestions)
+        self.model_researcher = model.bind_tools([duckduckgo_tool, web_scraper_tool])
+        self.model_synthesis = model
+        self.system_snippet_answer = prompt_snippet_answer
+        self.model_snippet_answer = model
+        self.parallel_sub_questions = parallel_sub_questions
+        self.search_cache = search_cache
+        self.answer_cache = answer_cache
+        self.answer_cache_namespace = LLMResponseCache.key({
+            "researcher": getattr(model, "_identifying_params", None) or type(model).__name__,
+            "decomposer": getattr(decomposer_model, "_identifying_params", None) or type(decomposer_model).__name__,
+            "prompts": [self.system_researcher, self.system_query_decomposer, self.system_synthesis,
+                        self.system_snippet_answer],
+            "parallel_sub_questions": parallel_sub_questions,
+            "snippet_fast_path": snippet_fast_path,
+            "snippet_coverage_threshold": snippet_coverage_threshold,
+        })
+        self.snippet_fast_path = snippet_fast_path
+        self.snippet_coverage_threshold = snippet_coverage_threshold
+        self.snippet_fast_path_totals = {"fast_paths": 0, "scrapes_saved": 0, "llm_turns_saved": 0}
+        self._totals_lock = threading.Lock()
+        self.prefetch_top_n = prefetch_top_n
+
+        if parallel_sub_questions:
+            self.research_graph = self._build_research_loop(StateGraph(SearchAgentState), entry_point=True).compile()
+            graph = StateGraph(SearchAgentState)
+            graph.add_node("query_decomposer", self._node(self.call_structured_query_decomposer, self.acall_structured_query_decomposer))
+            graph.add_node("sub_researcher_node", self._node(self.call_sub_researcher, self.acall_sub_researcher))
+            graph.add_node("synthesis_node", self._node(self.call_synthesis, self.acall_synthesis))
+
+            graph.set_entry_point("query_decomposer")
+            graph.add_conditional_edges("query_decomposer", self.dispatch_sub_questions, ["sub_researcher_node"])
+            graph.add_edge("sub_researcher_node", "synthesis_node")
+            graph.add_edge("synthesis_node", END)
+        else:
+            graph = self._build_research_loop(StateGraph(SearchAgentState), entry_point=False)
+            graph.add_node("query_decomposer", self._node(self.call_query_decomposer, self.acall_query_decomposer))
+            graph.set_entry_point("query_decomposer")
+            graph.add_edge("query_decomposer", "researcher_node")
+
+        self.graph = graph.compile()
+
+    @staticmethod
+    def _node(func, afunc) -> RunnableLambda:
+        """Wraps the sync and async versions of a node, so the graph runs natively with invoke() and ainvoke()."""
+        return RunnableLambda(func, afunc=afunc, name=func.__name__)
+
+    def _build_research_loop(self, graph: StateGraph, entry_point: bool) -> StateGraph:
+        """Adds the researcher <-> tool loop to `graph`."""
+        graph.add_node("researcher_node", self._node(self.call_researcher, self.acall_researcher))
+        graph.add_node("tool_node", self._node(self.call_tool, self.acall_tool))
+        if entry_point:
+            graph.set_entry_point("researcher_node")
         graph.add_conditional_edges(
             "researcher_node",
             self.exists_action,
             {True: "tool_node", False: END}
         )
-        graph.add_edge("tool_node", "researcher_node")
-
-        self.system_researcher = prompt_search_agent_v3
-        self.system_query_decomposer = prompt_query_decomposer
-        self.model_query_decomposer = model
-        self.model_researcher = model.bind_tools([duckduckgo_tool, web_scraper_tool])
-        self.graph = graph.compile()
-        self.web_scraper_calls = 0
+        if self.snippet_fast_path:
+            graph.add_node("snippet_answer_node", self._node(self.call_snippet_answer, self.acall_snippet_answer))
+            graph.add_conditional_edges(
+                "tool_node",
+                self.snippets_suffice,
+                {True: "snippet_answer_node", False: "researcher_node"}
+            )
+            graph.add_edge("snippet_answer_node", END)
+        else:
+            graph.add_edge("tool_node", "researcher_node")
+        return graph
 
     def _create_ai_message(self, response, sender, type_message):
         """Creates an AI message with appropriate metadata."""
@@ -177,111 +714,481 @@ class SearchAgent:
                 metadata={"sender_agent": sender}
                 )
     
-    def call_query_decomposer(self, state: SearchAgentState):
-        """Calls the LLM model (query_decomposer)."""
-        print("--- Calling query_decomposer ---")
+    def _query_decomposer_messages(self, state: SearchAgentState) -> List[BaseMessage]:
         messages = state["messages"]
         if not isinstance(messages[0], SystemMessage):
-            current_messages = [SystemMessage(content=self.system_query_decomposer)] + messages
-        else:
-            current_messages = messages
-
-        original_response = self.model_query_decomposer.invoke(current_messages)
+            return [SystemMessage(content=self.system_query_decomposer)] + messages
+        return messages
 
+    def _query_decomposer_update(self, original_response) -> dict:
         response_with_metadata = self._create_ai_message(original_response, sender="DecomposerAgent", type_message="HumanMessage")
         print(f"Query_decomposer response: {response_with_metadata}")
+        return {"messages": [response_with_metadata], "sub_questions": parse_sub_questions(original_response.content)}
+
+    def call_query_decomposer(self, state: SearchAgentState):
+        """Calls the LLM model (query_decomposer)."""
+        print("--- Calling query_decomposer ---")
+        original_response = self.model_query_decomposer.invoke(self._query_decomposer_messages(state))
+        return self._query_decomposer_update(original_response)
+
+    async def acall_query_decomposer(self, state: SearchAgentState):
+        """Async version of call_query_decomposer()."""
+        print("--- Calling query_decomposer ---")
+        original_response = await self.model_query_decomposer.ainvoke(self._query_decomposer_messages(state))
+        return self._query_decomposer_update(original_response)
+
+    def _structured_query_decomposer_update(self, structured_response: SubQuestions) -> dict:
+        sub_questions = [question.strip() for question in structured_response.sub_questions if question.strip()]
+        sub_questions = sub_questions[:MAX_SUB_QUESTIONS]
+        print(f"Sub-questions: {sub_questions}")
+        content = "# Sub-questions:\n" + "\n".join(f"{i + 1}. {question}" for i, question in enumerate(sub_questions))
+        decomposer_message = HumanMessage(content=content, metadata={"sender_agent": "DecomposerAgent"})
+        return {"messages": [decomposer_message], "sub_questions": sub_questions}
+
+    def call_structured_query_decomposer(self, state: SearchAgentState):
+        """Calls the LLM model (query_decomposer) and parses its output into a list of sub-questions."""
+        print("--- Calling structured query_decomposer ---")
+        structured_response = self.model_structured_query_decomposer.invoke(
+            [SystemMessage(content=self.system_query_decomposer)] + state["messages"]
+        )
+        return self._structured_query_decomposer_update(structured_response)
+
+    async def acall_structured_query_decomposer(self, state: SearchAgentState):
+        """Async version of call_structured_query_decomposer()."""
+        print("--- Calling structured query_decomposer ---")
+        structured_response = await self.model_structured_query_decomposer.ainvoke(
+            [SystemMessage(content=self.system_query_decomposer)] + state["messages"]
+        )
+        return self._structured_query_decomposer_update(structured_response)
+
+    def dispatch_sub_questions(self, state: SearchAgentState):
+        """Sends every sub-question to its own researcher loop."""
+        query = state["messages"][0].content
+        sub_questions = state.get("sub_questions") or [query]
+        return [Send("sub_researcher_node", {"query": query, "sub_question": question}) for question in sub_questions]
+
+    def _sub_research_input(self, state: SubQuestionState) -> dict:
+        sub_question = state["sub_question"]
+        print(f"--- Researching sub-question: {sub_question} ---")
+        content = f"Initial query: {state['query']}\n\nSub-question to research: {sub_question}"
+        return {"messages": [HumanMessage(content=content)], "sub_questions": [sub_question]}
+
+    def _partial_answer_update(self, state: SubQuestionState, final_state: dict) -> dict:
+        answer = final_state["messages"][-1].content
+        sources = answer_sources(final_state["messages"], answer)
+        return {"partial_answers": [{"sub_question": state["sub_question"], "answer": answer, "sources": sources}]}
+
+    def call_sub_researcher(self, state: SubQuestionState, config: RunnableConfig):
+        """Runs the researcher/tool loop on a single sub-question and returns its partial answer."""
+        # The config carries the run context, so the scraper budget is shared by all the sub-questions.
+        final_state = self.research_graph.invoke(self._sub_research_input(state), config=config)
+        return self._partial_answer_update(state, final_state)
+
+    async def acall_sub_researcher(self, state: SubQuestionState, config: RunnableConfig):
+        """Async version of call_sub_researcher()."""
+        final_state = await self.research_graph.ainvoke(self._sub_research_input(state), config=config)
+        return self._partial_answer_update(state, final_state)
+
+    def _synthesis_messages(self, state: SearchAgentState) -> List[BaseMessage]:
+        query = state["messages"][0].content
+        sections = []
+        for i, partial in enumerate(state["partial_answers"]):
+            sources = "\n".join(f"- {url}" for url in partial["sources"]) or "- No source"
+            sections.append(f"## Sub-question {i + 1}: {partial['sub_question']}\n\n{partial['answer']}\n\n### Sources\n{sources}")
+        human_content = f"Initial query: {query}\n\n" + "\n\n".join(sections)
+        return [SystemMessage(content=self.system_synthesis), HumanMessage(content=human_content)]
+
+    def call_synthesis(self, state: SearchAgentState):
+        """Merges the partial answers of the sub-questions into the final response."""
+        print("--- Calling synthesis_node ---")
+        original_response = self.model_synthesis.invoke(self._synthesis_messages(state))
+        response_with_metadata = self._create_ai_message(original_response, sender="SynthesisAgent", type_message="AIMessage")
         return {"messages": [response_with_metadata]}
 
-    def call_researcher(self, state: SearchAgentState):
-        """Calls the LLM model (researcher_node)."""
-        print("--- Calling researcher_node ---")
+    async def acall_synthesis(self, state: SearchAgentState):
+        """Async version of call_synthesis()."""
+        print("--- Calling synthesis_node ---")
+        original_response = await self.model_synthesis.ainvoke(self._synthesis_messages(state))
+        response_with_metadata = self._create_ai_message(original_response, sender="SynthesisAgent", type_message="AIMessage")
+        return {"messages": [response_with_metadata]}
+
+    def _researcher_messages(self, state: SearchAgentState) -> List[BaseMessage]:
         messages = state["messages"]
         # Add system prompt at the beginning if it's not already implicitly there
         # (Some models/frameworks handle this differently)
         # To be sure, we can check the first message.
         if not isinstance(messages[0], SystemMessage):
-             current_messages = [SystemMessage(content=self.system_researcher)] + messages
-        else:
-             current_messages = messages
+             return [SystemMessage(content=self.system_researcher)] + messages
+        return messages
 
-        original_response = self.model_researcher.invoke(current_messages)
+    def call_researcher(self, state: SearchAgentState):
+        """Calls the LLM model (researcher_node)."""
+        print("--- Calling researcher_node ---")
+        original_response = self.model_researcher.invoke(self._researcher_messages(state))
+        response_with_metadata = self._create_ai_message(original_response, sender="ResearcherAgent", type_message="AIMessage")
+        return {"messages": [response_with_metadata]}
 
+    async def acall_researcher(self, state: SearchAgentState):
+        """Async version of call_researcher()."""
+        print("--- Calling researcher_node ---")
+        original_response = await self.model_researcher.ainvoke(self._researcher_messages(state))
         response_with_metadata = self._create_ai_message(original_response, sender="ResearcherAgent", type_message="AIMessage")
         return {"messages": [response_with_metadata]}
 
-    def call_tool(self, state: SearchAgentState):
-        """Executes tool calls requested by the researcher_node."""
+    def snippets_suffice(self, state: SearchAgentState) -> bool:
+        """
+        Checks if the search snippets already cover every sub-question, after a tool round that only searched.
+        Once the researcher asked for a scrape, its pages are worth reading and the loop goes on.
+        """
+        messages = state["messages"]
+        last_request = next(message for message in reversed(messages) if isinstance(message, AIMessage))
+        if any(tool_call["name"] == web_scraper_tool.name for tool_call in last_request.tool_calls):
+            return False
+        snippets = [snippet for result in search_results(messages) for snippet in split_snippets(result)]
+        if not snippets:
+            return False
+
+        questions = state.get("sub_questions") or [messages[0].content]
+        coverage = snippet_coverage(questions, snippets)
+        print(f"--- Snippet coverage: {', '.join(f'{score:.2f}' for score in coverage.values())} "
+              f"(threshold {self.snippet_coverage_threshold}) ---")
+        return min(coverage.values()) >= self.snippet_coverage_threshold
+
+    def _snippet_answer_messages(self, state: SearchAgentState) -> List[BaseMessage]:
+        messages = state["messages"]
+        sub_questions = "\n".join(f"{i + 1}. {question}" for i, question in enumerate(state.get("sub_questions") or []))
+        results = "\n\n".join(search_results(messages))
+        human_content = (f"Initial query: {messages[0].content}\n\nSub-questions:\n{sub_questions or '- None'}"
+                         f"\n\nSearch results:\n{results}")
+        return [SystemMessage(content=self.system_snippet_answer), HumanMessage(content=human_content)]
+
+    def _snippet_answer_update(self, original_response, config: RunnableConfig) -> dict:
+        scrapes_saved, llm_turns_saved = get_run_context(config).record_snippet_fast_path()
+        with self._totals_lock:
+            self.snippet_fast_path_totals["fast_paths"] += 1
+            self.snippet_fast_path_totals["scrapes_saved"] += scrapes_saved
+            self.snippet_fast_path_totals["llm_turns_saved"] += llm_turns_saved
+        print(f"--- Answered from snippets: {scrapes_saved} scrape(s) and {llm_turns_saved} model turn(s) saved ---")
+        response_with_metadata = self._create_ai_message(original_response, sender="SnippetAnswerAgent", type_message="AIMessage")
+        return {"messages": [response_with_metadata]}
+
+    def call_snippet_answer(self, state: SearchAgentState, config: RunnableConfig):
+        """Answers from the search snippets, in place of another scrape round of the researcher."""
+        print("--- Calling snippet_answer_node ---")
+        original_response = self.model_snippet_answer.invoke(self._snippet_answer_messages(state))
+        return self._snippet_answer_update(original_response, config)
+
+    async def acall_snippet_answer(self, state: SearchAgentState, config: RunnableConfig):
+        """Async version of call_snippet_answer()."""
+        print("--- Calling snippet_answer_node ---")
+        original_response = await self.model_snippet_answer.ainvoke(self._snippet_answer_messages(state))
+        return self._snippet_answer_update(original_response, config)
+
+    def _fit_scraped_contents(self, contents: Dict[str, str], ranking_query: str) -> Tuple[str, Dict[str, str]]:
+        """
+        Formats the scraped pages for a ToolMessage. When they exceed MAX_TOOL_MSG_LENGTH, only the
+        passages most relevant to `ranking_query` are kept, instead of the head of the first pages.
+        Returns the formatted content and the text kept per URL.
+        """
+        scraped_content = format_scraped_contents(contents)
+        if len(scraped_content) <= MAX_TOOL_MSG_LENGTH:
+            return scraped_content, contents
+
+        overhead = sum(len(content_header(url)) + len("---\n") for url in contents) + 100
+        selected, omitted_chars = select_passages(contents, ranking_query, MAX_TOOL_MSG_LENGTH - overhead)
+        print(f"Scraped content too long ({len(scraped_content)} chars), kept the most relevant passages ({omitted_chars} chars omitted).")
+        return format_scraped_contents(selected) + f"\n\n[... {omitted_chars} characters of less relevant passages omitted ...]", selected
+
+    def _plan_tool_call(self, tool_call: dict, scraper_limit_reached: bool,
+                        run_context: SearchRunContext) -> Tuple[str, object]:
+        """
+        Validates a tool call and returns what to do with it: ("scrape", urls), ("search", query),
+        or ("result", content) when the ToolMessage content is already known.
+        """
+        tool_name = tool_call['name']
+        args = tool_call['args']
+        print(f"Executing tool: {tool_name} with args: {args}")
+
+        if tool_name == web_scraper_tool.name:
+            if scraper_limit_reached:
+                print("Scraper call limit reached.")
+                return "result", f"Call limit ({run_context.max_web_scraper_calls}) to web_scraper_tool reached for this query."
+            urls_arg = args.get('urls_tuple')
+            if urls_arg is None:
+                 urls_arg = args.get('urls')
+
+            if not urls_arg or not isinstance(urls_arg, list) or len(urls_arg) == 0:
+                result_content = "Error: No valid URL was provided to the web_scraper_tool. Argument 'urls_tuple' missing or empty."
+                print(result_content)
+                return "result", result_content
+            urls = list(dict.fromkeys(urls_arg))
+            print(f"--- Scraping URLs: {urls} ---")
+            return "scrape", urls
+
+        if tool_name == duckduckgo_tool.name or tool_name == 'duckduckgo_results_json':
+            query_arg = args.get('query', '')
+            if not query_arg:
+                 result_content = "Error: Search query ('query') missing for duckduckgo_tool."
+                 print(result_content)
+                 return "result", result_content
+            return "search", query_arg
+
+        result_content = f"Error: Unknown tool '{tool_name}' requested."
+        print(result_content)
+        return "result", result_content
+
+    @staticmethod
+    def _report_scrape_progress(scraped: ScrapedUrl, progress: Optional[Callable[[dict], None]]) -> None:
+        print(f"--- Scrape of {scraped.url}: {scraped.status} after {scraped.elapsed_s:.2f}s ---")
+        if progress is not None:
+            progress({"event": "scrape_progress", "url": scraped.url, "status": scraped.status,
+                      "chars": len(scraped.text or ""), "elapsed_s": scraped.elapsed_s})
+
+    def _scrape(self, urls: List[str], run_context: SearchRunContext,
+                progress: Optional[Callable[[dict], None]]) -> Tuple[Dict[str, str], List[str]]:
+        """
+        Scrapes `urls` with a deadline per URL, reporting each one as it finishes; returns the texts and the timed out URLs.
+        The wait for their prefetches counts against the same deadline.
+        """
+        start = time.perf_counter()
+        run_context.prefetcher.wait(urls, timeout=SCRAPE_URL_DEADLINE_SECONDS)
+        results = []
+        for scraped in iter_scrape_urls(urls, start=start):
+            self._report_scrape_progress(scraped, progress)
+            results.append(scraped)
+        return collect_scraped_urls(urls, results)
+
+    async def _ascrape(self, urls: List[str], run_context: SearchRunContext,
+                       progress: Optional[Callable[[dict], None]]) -> Tuple[Dict[str, str], List[str]]:
+        """Async version of _scrape()."""
+        start = time.perf_counter()
+        await run_context.prefetcher.await_urls(urls, timeout=SCRAPE_URL_DEADLINE_SECONDS)
+        results = []
+        async for scraped in aiter_scrape_urls(urls, start=start):
+            self._report_scrape_progress(scraped, progress)
+            results.append(scraped)
+        return collect_scraped_urls(urls, results)
+
+    def _scrape_result(self, contents: Dict[str, str], run_context: SearchRunContext, ranking_query: str,
+                       timed_out: List[str] = ()) -> str:
+        """Turns the scraped pages into the content of the ToolMessage."""
+        # Only the passages sent to the model are remembered: a later page repeating a passage dropped by
+        # the selection below still gets to show it.
+        contents, saved_chars = deduplicate_contents(contents, run_context.duplicate_filter, remember=False)
+        if saved_chars:
+            print(f"--- Near-duplicate paragraphs removed: {saved_chars} characters saved ---")
+        if not contents and saved_chars:
+            result_content = "The provided URLs only repeat content already scraped for this query."
+        elif not contents:
+            result_content = "No valid content could be extracted from the provided URLs."
+        else:
+            print(f"--- Scraping successful for {len(contents)} URLs ---")
+            result_content, emitted_contents = self._fit_scraped_contents(contents, ranking_query)
+            for text in emitted_contents.values():
+                run_context.duplicate_filter.remember(text)
+            result_content += duplicates_note(saved_chars)
+        result_content += timed_out_note(list(timed_out))
+        print(f"Final content for ToolMessage (truncated): {result_content[:500]}...")
+        return result_content
+
+    def _search_result(self, raw_search_result: str, run_context: SearchRunContext, seen_urls: Set[str]) -> str:
+        """
+        Turns the raw search results into the content of the ToolMessage: one compact block per result,
+        leaving out the URLs in `seen_urls`, those an earlier search of the same researcher loop already returned.
+        """
+        print(f"Raw search result (truncated): {raw_search_result[:200]}...")
+        results = parse_search_results(raw_search_result)
+        if results:
+            new_results = run_context.new_search_results(results, seen_urls)
+            repeated = len(results) - len(new_results)
+            if not new_results:
+                result_content = f"All {repeated} results of this search were already returned by earlier searches for this query."
+            else:
+                result_content, left_out = format_search_results(new_results, MAX_SEARCH_MSG_LENGTH)
+                if repeated:
+                    result_content += f"\n\n[{repeated} results already returned by earlier searches omitted]"
+                if left_out:
+                    result_content += f"\n\n[... {left_out} more results truncated ...]"
+            print(f"--- Search results: {len(results)} parsed, {repeated} already seen by this researcher ---")
+        elif len(raw_search_result) > MAX_SEARCH_MSG_LENGTH:
+            print(f"Search result too long ({len(raw_search_result)} chars), truncating...")
+            result_content = raw_search_result[:MAX_SEARCH_MSG_LENGTH] + "\n[... Truncated results ...]"
+        else:
+            result_content = raw_search_result
+        print(f"Final search result for ToolMessage (truncated): {result_content[:500]}...")
+        return result_content
+
+    def _execute_tool_call(self, tool_call: dict, scraper_limit_reached: bool, run_context: SearchRunContext,
+                           ranking_query: str = "", seen_urls: Optional[Set[str]] = None,
+                           progress: Optional[Callable[[dict], None]] = None) -> str:
+        """
+        Runs a single tool call and returns the content of its ToolMessage.
+        `ranking_query` is what scraped passages are ranked against when they have to be cut,
+        `seen_urls` the search results the researcher already got (see seen_result_urls()),
+        and `progress` receives an event per scraped URL as soon as it is done.
+        """
+        try:
+            action, value = self._plan_tool_call(tool_call, scraper_limit_reached, run_context)
+            if action == "scrape":
+                contents, timed_out = self._scrape(value, run_context, progress)
+                return self._scrape_result(contents, run_context, ranking_query, timed_out)
+            if action == "search":
+                result_content = self._search_result(self._search(value), run_context,
+                                                     seen_urls if seen_urls is not None else set())
+                if self.prefetch_top_n:
+                    run_context.prefetcher.start(extract_urls(result_content)[:self.prefetch_top_n])
+                return result_content
+            return value
+        except Exception as e:
+             print(f"Error during execution of tool {tool_call['name']}: {e}")
+             return f"Internal error during tool call {tool_call['name']}: {str(e)}"
+
+    async def _aexecute_tool_call(self, tool_call: dict, scraper_limit_reached: bool, run_context: SearchRunContext,
+                                  ranking_query: str = "", seen_urls: Optional[Set[str]] = None,
+                                  progress: Optional[Callable[[dict], None]] = None) -> str:
+        """Async version of _execute_tool_call()."""
+        try:
+            action, value = self._plan_tool_call(tool_call, scraper_limit_reached, run_context)
+            if action == "scrape":
+                contents, timed_out = await self._ascrape(value, run_context, progress)
+                return self._scrape_result(contents, run_context, ranking_query, timed_out)
+            if action == "search":
+                result_content = self._search_result(await self._asearch(value), run_context,
+                                                     seen_urls if seen_urls is not None else set())
+                if self.prefetch_top_n:
+                    run_context.prefetcher.astart(extract_urls(result_content)[:self.prefetch_top_n])
+                return result_content
+            return value
+        except Exception as e:
+             print(f"Error during execution of tool {tool_call['name']}: {e}")
+             return f"Internal error during tool call {tool_call['name']}: {str(e)}"
+
+    def _search(self, query: str) -> str:
+        """Runs a DuckDuckGo search, through the search cache if there is one."""
+        if self.search_cache is None:
+            return duckduckgo_tool.invoke(query)
+        return self.search_cache.get_or_search(query, duckduckgo_tool.invoke)
+
+    async def _asearch(self, query: str) -> str:
+        """Async version of _search()."""
+        if self.search_cache is None:
+            return await duckduckgo_tool.ainvoke(query)
+        return await self.search_cache.aget_or_search(query, duckduckgo_tool.ainvoke)
+
+    def _timing(self, tool_call: dict, start: float, end: float, node_start: float) -> Dict[str, float]:
+        return {
+            "tool_name": tool_call['name'],
+            "start_s": round(start - node_start, 4),
+            "duration_s": round(end - start, 4),
+        }
+
+    def _timed_tool_call(self, tool_call: dict, scraper_limit_reached: bool, run_context: SearchRunContext,
+                         ranking_query: str, seen_urls: Set[str], node_start: float,
+                         progress: Optional[Callable[[dict], None]] = None) -> Tuple[str, Dict[str, float]]:
+        """Runs a tool call and measures when it started and how long it took, relative to the node start."""
+        start = time.perf_counter()
+        result_content = self._execute_tool_call(tool_call, scraper_limit_reached, run_context, ranking_query,
+                                                 seen_urls, progress)
+        return result_content, self._timing(tool_call, start, time.perf_counter(), node_start)
+
+    async def _atimed_tool_call(self, tool_call: dict, scraper_limit_reached: bool, run_context: SearchRunContext,
+                                ranking_query: str, seen_urls: Set[str], node_start: float, slots: asyncio.Semaphore,
+                                progress: Optional[Callable[[dict], None]] = None) -> Tuple[str, Dict[str, float]]:
+        """Async version of _timed_tool_call(); `slots` bounds the tool calls running at once."""
+        async with slots:
+            start = time.perf_counter()
+            result_content = await self._aexecute_tool_call(tool_call, scraper_limit_reached, run_context, ranking_query,
+                                                            seen_urls, progress)
+            return result_content, self._timing(tool_call, start, time.perf_counter(), node_start)
+
+    def _prepare_tool_calls(self, state: SearchAgentState, config: RunnableConfig) -> Tuple[list, List[bool], SearchRunContext, str, Set[str]]:
+        """
+        Returns the tool calls to run, whether each one is over the scraper budget, the run context, the ranking query
+        and the URLs of the search results already shown to this researcher loop.
+        """
         print("--- Calling Tool Node ---")
         last_message = state["messages"][-1]
         tool_calls = last_message.tool_calls
         print(f"Requested tool calls: {tool_calls}")
 
+        # The scraper budget is assigned in request order before dispatching,
+        # so the same calls are refused whatever order the calls finish in.
+        run_context = get_run_context(config)
+        scraper_limits = [
+            tool_call['name'] == web_scraper_tool.name and not run_context.reserve_web_scraper_call()
+            for tool_call in tool_calls
+        ]
+
+        if self.prefetch_top_n:
+            self._cancel_unchosen_prefetches(state, tool_calls, run_context)
+
+        # Scraped passages are ranked against the query and its sub-questions.
+        ranking_query = "\n".join([state["messages"][0].content] + (state.get("sub_questions") or []))
+        # Taken from the loop's own messages: parallel sub-researchers do not hide results from each other.
+        return tool_calls, scraper_limits, run_context, ranking_query, seen_result_urls(state["messages"])
+
+    def _cancel_unchosen_prefetches(self, state: SearchAgentState, tool_calls: list, run_context: SearchRunContext) -> None:
+        """Cancels the prefetches of the links of this loop's earlier search results that the researcher did not choose."""
+        chosen_urls = {
+            url
+            for tool_call in tool_calls if tool_call['name'] == web_scraper_tool.name
+            for url in tool_call['args'].get('urls_tuple') or tool_call['args'].get('urls') or []
+        }
+        candidate_urls = [url for result in search_results(state["messages"]) for url in extract_urls(result)]
+        cancelled = run_context.prefetcher.cancel(url for url in candidate_urls if url not in chosen_urls)
+        if cancelled:
+            print(f"--- Prefetch: {cancelled} unchosen prefetch(es) cancelled ---")
+
+    def _tool_messages(self, tool_calls: list, results: List[Tuple[str, Dict[str, float]]], total_duration: float) -> dict:
         results_messages = []
-        for tool_call in tool_calls:
-            tool_name = tool_call['name']
-            args = tool_call['args']
-            print(f"Executing tool: {tool_name} with args: {args}")
-
-            result_content = ""
-
-            try:
-                if tool_name == web_scraper_tool.name:
-                    self.web_scraper_calls += 1
-                    if self.web_scraper_calls > 3:
-                        print("Scraper call limit reached.")
-                        result_content = "Call limit (3) to web_scraper_tool reached for this query."
-                    else:
-                        urls_arg = args.get('urls_tuple')
-                        if urls_arg is None:
-                             urls_arg = args.get('urls')
-
-                        if not urls_arg or not isinstance(urls_arg, list) or len(urls_arg) == 0:
-                            result_content = "Error: No valid URL was provided to the web_scraper_tool. Argument 'urls_tuple' missing or empty."
-                            print(result_content)
-                        else:
-                            urls_tuple_for_cache = tuple(urls_arg)
-                            print(f"Calling cached_web_scraper with key tuple: {urls_tuple_for_cache}")
-                            raw_scraped_content = cached_web_scraper(urls_tuple_for_cache)
-                            print(f"Raw scraping result (truncated): {raw_scraped_content[:200]}...")
-
-                            if len(raw_scraped_content) > MAX_TOOL_MSG_LENGTH:
-                                print(f"Scraped content too long ({len(raw_scraped_content)} chars), truncating to {MAX_TOOL_MSG_LENGTH}.")
-                                result_content = raw_scraped_content[:MAX_TOOL_MSG_LENGTH] + f"\n\n[... Truncated content ({len(raw_scraped_content) - MAX_TOOL_MSG_LENGTH} characters omitted) ...]"
-                            else:
-                                result_content = raw_scraped_content
-                            print(f"Final content for ToolMessage (truncated): {result_content[:500]}...")
-
-                elif tool_name == duckduckgo_tool.name or tool_name == 'duckduckgo_results_json':
-                    query_arg = args.get('query', '')
-                    if not query_arg:
-                         result_content = "Error: Search query ('query') missing for duckduckgo_tool."
-                         print(result_content)
-                    else:
-                        raw_search_result = duckduckgo_tool.invoke(query_arg)
-                        print(f"Raw search result (truncated): {raw_search_result[:200]}...")
-
-                        if len(raw_search_result) > MAX_SEARCH_MSG_LENGTH:
-                            print(f"Search result too long ({len(raw_search_result)} chars), truncating...")
-                            result_content = raw_search_result[:MAX_SEARCH_MSG_LENGTH] + "\n[... Truncated results ...]"
-                        else:
-                            result_content = raw_search_result
-                        print(f"Final search result for ToolMessage (truncated): {result_content[:500]}...")
-
-                else:
-                    result_content = f"Error: Unknown tool '{tool_name}' requested."
-                    print(result_content)
-
-            except Exception as e:
-                 print(f"Error during execution of tool {tool_name}: {e}")
-                 result_content = f"Internal error during tool call {tool_name}: {str(e)}"
-
+        for tool_call, (result_content, timing) in zip(tool_calls, results):
             results_messages.append(ToolMessage(
                 content=result_content,
-                tool_call_id=tool_call['id']
+                tool_call_id=tool_call['id'],
+                response_metadata={"timing": timing}
             ))
 
+        sequential_duration = sum(timing["duration_s"] for _, timing in results)
+        print(f"--- Tool calls done in {total_duration:.2f}s (sequential sum {sequential_duration:.2f}s) ---")
+        for _, timing in results:
+            print(f"    {timing['tool_name']}: started +{timing['start_s']:.2f}s, took {timing['duration_s']:.2f}s")
+
         return {"messages": results_messages}
 
+    def call_tool(self, state: SearchAgentState, config: RunnableConfig):
+        """Executes tool calls requested by the researcher_node, concurrently, keeping their order."""
+        tool_calls, scraper_limits, run_context, ranking_query, seen_urls = self._prepare_tool_calls(state, config)
+
+        # The stream writer belongs to the node's context, which the worker threads do not inherit:
+        # they queue their events, and this thread passes them on.
+        progress = stream_progress_writer()
+        events = queue.SimpleQueue() if progress is not None else None
+        node_start = time.perf_counter()
+        max_workers = max(1, min(MAX_CONCURRENT_TOOL_CALLS, len(tool_calls)))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(self._timed_tool_call, tool_call, limit_reached, run_context, ranking_query, seen_urls,
+                                node_start, events.put if events is not None else None)
+                for tool_call, limit_reached in zip(tool_calls, scraper_limits)
+            ]
+            if events is not None:
+                relay_events(futures, events, progress)
+            results = [future.result() for future in futures]
+        return self._tool_messages(tool_calls, results, time.perf_counter() - node_start)
+
+    async def acall_tool(self, state: SearchAgentState, config: RunnableConfig):
+        """Async version of call_tool(): the tool calls are interleaved on the event loop instead of threads."""
+        tool_calls, scraper_limits, run_context, ranking_query, seen_urls = self._prepare_tool_calls(state, config)
+
+        progress = stream_progress_writer()
+        node_start = time.perf_counter()
+        slots = asyncio.Semaphore(MAX_CONCURRENT_TOOL_CALLS)
+        results = await asyncio.gather(*(
+            self._atimed_tool_call(tool_call, limit_reached, run_context, ranking_query, seen_urls, node_start, slots, progress)
+            for tool_call, limit_reached in zip(tool_calls, scraper_limits)
+        ))
+        return self._tool_messages(tool_calls, list(results), time.perf_counter() - node_start)
+
 
     def exists_action(self, state: SearchAgentState):
         """Checks if the last message contains tool calls."""
@@ -292,14 +1199,58 @@ class SearchAgent:
         return has_tool_calls
 
 
+    def _cached_answer(self, query: str) -> Optional[str]:
+        if self.answer_cache is None:
+            return None
+        cached = self.answer_cache.get(query, self.answer_cache_namespace)
+        if cached is None:
+            return None
+        print(f"--- Answer cache hit (similarity {cached.similarity}) for cached query: {cached.query} ---")
+        return cached.answer
+
+    def _start_run(self, query: str, config: Optional[RunnableConfig]) -> Tuple[dict, RunnableConfig]:
+        print("--- STARTING NEW SEARCH ---")
+        print(f"Initial query: {query}")
+        initial_state = {"messages": [HumanMessage(content=query)]}
+        return initial_state, with_run_context(config)
+
+    def _final_response(self, query: str, final_state: dict, config: RunnableConfig) -> str:
+        print("--- SEARCH COMPLETED ---")
+        if self.search_cache is not None:
+            print(f"--- Search cache: {self.search_cache.stats()} ---")
+        run_context = get_run_context(config)
+        if run_context.snippet_fast_paths:
+            print(f"--- Snippet fast path: {run_context.snippet_fast_paths} research loop(s) answered from snippets, "
+                  f"{run_context.scrapes_saved} scrape(s) and {run_context.llm_turns_saved} model turn(s) saved ---")
+        run_context.prefetcher.cancel_all()
+        if run_context.prefetcher.started:
+            print(f"--- Prefetch: {run_context.prefetcher.stats()} ---")
+        final_message = final_state["messages"][-1]
+        if isinstance(final_message, SystemMessage):
+            for msg in reversed(final_state["messages"]):
+                if msg.type not in ["system", "tool"]:
+                    final_message = msg
+                    break
+
+        if not final_message:
+            return "No response generated."
+        if self.answer_cache is not None and final_message.content:
+            sources = answer_sources(final_state["messages"], final_message.content)
+            for partial in final_state.get("partial_answers") or []:
+                sources.extend(url for url in partial["sources"] if url not in sources)
+            self.answer_cache.set(query, final_message.content, sources, self.answer_cache_namespace)
+        return final_message.content
+
     def run(self, query: str, config=None) -> str:
         """
         Runs the search agent with a given query and returns the final response.
+        A hit in the answer cache is returned without running the graph.
+        Every run gets its own SearchRunContext, so concurrent runs on the same agent are independent.
         """
-        print(f"--- STARTING NEW SEARCH ---")
-        print(f"Initial query: {query}")
-        self.web_scraper_calls = 0
-        initial_state = {"messages": [HumanMessage(content=query)]}
+        cached_answer = self._cached_answer(query)
+        if cached_answer is not None:
+            return cached_answer
+        initial_state, config = self._start_run(query, config)
 
         # Invoke the graph
         # Using stream to see the steps can be useful for debugging:
@@ -307,35 +1258,92 @@ class SearchAgent:
         #     print(event)
         # Or invoke to directly get the final state:
         final_state = self.graph.invoke(initial_state, config=config)
+        return self._final_response(query, final_state, config)
 
-        print("--- SEARCH COMPLETED ---")
-        final_message = final_state["messages"][-1]
-        if isinstance(final_message, SystemMessage):
-            for msg in reversed(final_state["messages"]):
-                if msg.type not in ["system", "tool"]:
-                    final_message = msg
-                    break
+    async def arun(self, query: str, config=None) -> str:
+        """
+        Async version of run(): every node, model call, search and scrape runs on the caller's event loop,
+        so many queries can be in flight without a thread each.
+        """
+        cached_answer = self._cached_answer(query)
+        if cached_answer is not None:
+            return cached_answer
+        initial_state, config = self._start_run(query, config)
+        final_state = await self.graph.ainvoke(initial_state, config=config)
+        return self._final_response(query, final_state, config)
 
-        # return "No response generated."
-        return final_message.content if final_message else "No response generated."
+
+class SearchAgentPool:
+    """
+    Warm SearchAgent of a model, compiled on first use and then reused by every query.
+    The per-query state lives in each run, so the single agent serves concurrent queries.
+    """
+
+    def __init__(self, model=None, **agent_kwargs):
+        """
+        Args:
+            model: Chat model of the agent, None for the models of its routes.
+            agent_kwargs: Other arguments given to SearchAgent.
+        """
+        self.model = model
+        self.agent_kwargs = agent_kwargs
+        self._agent: Optional[SearchAgent] = None
+        self._lock = threading.Lock()
+
+    @property
+    def agent(self) -> SearchAgent:
+        with self._lock:
+            if self._agent is None:
+                self._agent = SearchAgent(self.model, **self.agent_kwargs)
+            return self._agent
+
+    def run(self, query: str, config=None) -> str:
+        """Runs `query` on the warm agent and returns the final response."""
+        return self.agent.run(query, config=config)
+
+    async def arun(self, query: str, config=None) -> str:
+        """Async version of run()."""
+        return await self.agent.arun(query, config=config)
+
+
+# Pools by id() of their model, next to a weak reference telling whether the id still belongs to that model:
+# chat models are not hashable, so a WeakKeyDictionary cannot hold them. The pool of an unscheduled model keeps
+# its model alive, so the least recently used pool is evicted past MAX_SEARCH_AGENT_POOLS.
+MAX_SEARCH_AGENT_POOLS = 8
+_search_agent_pools: "OrderedDict[int, Tuple[Callable[[], object], SearchAgentPool]]" = OrderedDict()
+_search_agent_pools_lock = threading.Lock()
+
+
+def get_search_agent_pool(model=None) -> SearchAgentPool:
+    """
+    Returns the process-wide pool of search agents of `model` (None for the routed models), creating it on first use.
+    A scheduled model is moved to the interactive priority class: a search holds up the agent waiting for it.
+    """
+    key = id(model)
+    with _search_agent_pools_lock:
+        entry = _search_agent_pools.get(key)
+        if entry is not None and entry[0]() is model:
+            _search_agent_pools.move_to_end(key)
+            return entry[1]
+        search_model = model.with_priority(PRIORITY_INTERACTIVE) if isinstance(model, ScheduledChatModel) else model
+        pool = SearchAgentPool(search_model)
+        _search_agent_pools[key] = (weakref.ref(model) if model is not None else lambda: None, pool)
+        while len(_search_agent_pools) > MAX_SEARCH_AGENT_POOLS:
+            _search_agent_pools.popitem(last=False)
+        return pool
 
 
 if __name__ == "__main__":
     from langchain_mistralai import ChatMistralAI
-    from langchain_google_genai import ChatGoogleGenerativeAI
-    import os
-    from dotenv import load_dotenv
-
-    load_dotenv()
 
     # Make sure the API key is available
     # if not os.getenv("MISTRAL_API_KEY"):
     #     print("Error: The MISTRAL_API_KEY environment variable is not defined.")
+    model = get_chat_model()
     if not os.getenv("GOOGLE_API_KEY"):
         print("Error: The GOOGLE_API_KEY environment variable is not defined.")
     else:
         # model = ChatMistralAI(model="mistral-large-latest", temperature=0)
-        model = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0, google_api_key=os.getenv("GOOGLE_API_KEY"))
         search_agent_instance = SearchAgent(model)
 
         # Example query
@@ -8,6 +8,7 @@ from langgraph.checkpoint.memory import MemorySaver
 from typing import Annotated, List, Tuple, Dict
 from typing_extensions import TypedDict
 import os
+from src.utils.model_registry import get_chat_model
 
 
 prompt_test_agent = """
@@ -65,13 +66,7 @@ class Test_agent:
     
 
 if __name__ == "__main__":
-    from langchain_google_genai import ChatGoogleGenerativeAI
-    import os
-    from dotenv import load_dotenv
-
-    load_dotenv()
-
-    model = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0, google_api_key=os.getenv("GOOGLE_API_KEY"))
+    model = get_chat_model()
     Test_agent_instance = Test_agent(model)
     thread = {"configurable": {"thread_id": "123"}}
     result = Test_agent_instance.graph.invoke({"subject": "la vie"}, thread)
@@ -1,6 +1,8 @@
 import os
 
 DIR_MD_OUTPUT = os.path.join(os.path.dirname(__file__), "../outputs")
+# Directory of the on-disk caches (scraped pages, search results, answers, LLM responses), overridden by AGENT_CACHE_DIR.
+DIR_CACHE = os.getenv("AGENT_CACHE_DIR") or os.path.join(os.path.dirname(__file__), "../.cache")
 
 RED = "\033[91m"
 BLUE = "\033[94m"
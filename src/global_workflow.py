@@ -3,7 +3,7 @@ from langgraph.graph.message import add_messages
 from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage, BaseMessage, AIMessage
 from langchain_core.tools import tool
 
-from typing import Annotated, List, Tuple, Dict
+from typing import Annotated, List, Optional, Tuple, Dict
 from typing_extensions import TypedDict
 import os
 from pydantic import BaseModel, Field
@@ -15,6 +15,10 @@ from src.agents.architect_agent import Architect_agent
 from src.agents.GDPR_agent import GDPR_agent
 from src.utils.utils_agent import summarize_messages
 from src.utils.custom_messages import ArchitectMessage, GDPRMessage, ReviewerMessage, SecurityMessage
+from src.utils.hedging import DeadlineExceeded, check_deadline, with_deadline
+from src.utils.llm_scheduler import get_llm_scheduler
+from src.utils.model_routing import ROUTE_REVIEWER, ROUTE_SECURITY, get_routed_model, route_stats
+from src.utils.streaming import TokenPrinter, stream_graph
 
 class global_review_response(BaseModel):
     note : int = Field(description="The note of the review on a scale of 0 to 100")
@@ -32,10 +36,19 @@ class Global_worflow_state(TypedDict):
     security_insight : str
     gdpr_insight : str
     global_review_comment : str
+    timed_out : bool
 
 
 class Global_graph:
-    def __init__(self, model):
+    def __init__(self, model=None, summary_model=None, deadline_s: Optional[float] = None):
+        """
+        Args:
+            model: Chat model of every node and sub-agent, by default the model of the route of each node.
+            summary_model: Chat model of the summaries of the sub-agents, by default the one of summarize_messages().
+            deadline_s: Time budget of a run of invoke() or run_config(), in seconds, None for no deadline.
+                Once it has passed, the run ends with the latest manifests and review notes,
+                and "timed_out" set in the final state.
+        """
         graph = StateGraph(Global_worflow_state)
         graph.add_node("architect_node", self.architect_node)
         graph.add_node("GDPR_node", self.gdpr_node)
@@ -52,45 +65,106 @@ class Global_graph:
             {True: END, False: "architect_node"}
         )
         
-        self.model = model
+        self.model = model if model is not None else get_routed_model(ROUTE_SECURITY)
+        self.reviewer_model = model if model is not None else get_routed_model(ROUTE_REVIEWER)
+        self.summary_model = summary_model
+        self.deadline_s = deadline_s
         
         self.graph = graph.compile()
-        self.architect_agent = Architect_agent(self.model)
-        self.gdpr_agent = GDPR_agent(self.model)
+        self.architect_agent = Architect_agent(model)
+        self.gdpr_agent = GDPR_agent(model)
+
+
+    def run_config(self, config: Optional[dict] = None) -> dict:
+        """Returns the run config `config` with the deadline of the graph, to run self.graph with."""
+        return with_deadline(self.deadline_s, config) if self.deadline_s is not None else dict(config or {})
+
+
+    def invoke(self, state: dict, config: Optional[dict] = None) -> dict:
+        return self.graph.invoke(state, self.run_config(config))
+
+
+    def out_of_time(self, state: Global_worflow_state, error: DeadlineExceeded) -> dict:
+        """Ends the run with the latest manifests, if both exist; otherwise raises `error`."""
+        if not state.get("architecture_manifest") or not state.get("gdpr_manifest"):
+            raise error
+        print(f"{RED}Run deadline reached, keeping the latest manifests: {error}{RESET}")
+        return {"timed_out": True}
 
 
     def architect_node(self, state: Global_worflow_state):
+        if state.get("timed_out"):
+            return {}
+        try:
+            check_deadline()
+            return self.call_architect(state)
+        except DeadlineExceeded as e:
+            return self.out_of_time(state, e)
+
+
+    def call_architect(self, state: Global_worflow_state):
         if state["iteration"] == 0:
             architect_response = self.architect_agent.graph.invoke({"messages": [HumanMessage(content=INPUT_ARCHI)], "iteration": 0, "iteration_max": 4, "note_max": 90, "diff_notes_max": 5})
         else:
             input = state['architect_messages'] + [HumanMessage(content=state['global_review_comment'])]    
             architect_response = self.architect_agent.graph.invoke({"messages": input, "iteration": 0, "iteration_max": 3, "note_max": 90, "diff_notes_max": 5})
-        summary = summarize_messages(architect_response["messages"])
-        return {"messages": [ArchitectMessage(content=summary)], "architecture_manifest": architect_response["manifest"]}
+        summary = summarize_messages(architect_response["messages"], self.summary_model)
+        return {"messages": [ArchitectMessage(content=summary)], "architecture_manifest": architect_response["manifest"],
+                "architect_messages": architect_response["messages"]}
 
 
     def gdpr_node(self, state: Global_worflow_state):
+        if state.get("timed_out"):
+            return {}
+        try:
+            check_deadline()
+            return self.call_gdpr(state)
+        except DeadlineExceeded as e:
+            return self.out_of_time(state, e)
+
+
+    def call_gdpr(self, state: Global_worflow_state):
         gdpr_response = self.gdpr_agent.graph.invoke({"messages": [HumanMessage(content=state["architecture_manifest"])], "iteration": 0, "iteration_max": 3, "note_max": 85, "diff_notes_max": 5})
-        summary = summarize_messages(gdpr_response["messages"])
+        summary = summarize_messages(gdpr_response["messages"], self.summary_model)
         return {"messages": [GDPRMessage(content=summary)], "gdpr_manifest": gdpr_response["manifest"]}
 
 
     def security_node(self, state: Global_worflow_state):
+        if state.get("timed_out"):
+            return {}
+        try:
+            check_deadline()
+            return self.call_security(state)
+        except DeadlineExceeded as e:
+            return self.out_of_time(state, e)
+
+
+    def call_security(self, state: Global_worflow_state):
         security_response = self.model.invoke([SystemMessage(content=PROMPT_SECURITY_AGENT), 
                                                HumanMessage(content="architecture manifest : " + state["architecture_manifest"] + "\n" + "gdpr manifest : " + state["gdpr_manifest"])])
         print(f"{RED}=========== SECURITY RESPONSE ==========={RESET}")
         print(f"Security insight : {security_response.content}")
-        print(f"=========================================")
+        print("=========================================")
         return {"messages": [SecurityMessage(content=security_response.content)], "security_insight": security_response.content}
 
 
     def global_reviewer_node(self, state: Global_worflow_state):
+        if state.get("timed_out"):
+            return {"iteration": state["iteration"] + 1}
         data_for_review = ("architecture manifest : " + "\n" + state["architecture_manifest"] 
         + "\n" + "gdpr manifest : " + "\n" + state["gdpr_manifest"])
 
-        structured_output = self.model.with_structured_output(global_review_response).invoke([SystemMessage(content=PROMPT_GLOBAL_REVIEWER_AGENT),
-                                                                                    *state['messages'],
-                                                                                    HumanMessage(content=data_for_review)])
+        try:
+            check_deadline()
+            structured_output = self.reviewer_model.with_structured_output(global_review_response).invoke([SystemMessage(content=PROMPT_GLOBAL_REVIEWER_AGENT),
+                                                                                        *state['messages'],
+                                                                                        HumanMessage(content=data_for_review)])
+        except DeadlineExceeded as e:
+            # Out of time: the manifests are kept unreviewed, and the notes stay those of the previous reviews.
+            print(f"{RED}Global review skipped: {e}{RESET}")
+            comment = f"Review skipped, run deadline reached: {e}"
+            return {"messages": [ReviewerMessage(content=comment)], "iteration": state["iteration"] + 1,
+                    "global_review_comment": comment, "timed_out": True}
         print(f"=========== GLOBAL REVIEWER RESPONSE ==========={RED}")
         print(f"Iteration {state['iteration']} : Note {structured_output.note}")
         print(f"Comment : {structured_output.comment}")
@@ -99,19 +173,21 @@ class Global_graph:
 
 
     def check_reviewing(self, state: Global_worflow_state):
+        if state.get("timed_out"):
+            return True
         return check_reviewing_process(state["iteration"], state["note"], iteration_max=3, note_max=90, diff_notes_max=5)
 
 
 if __name__ == "__main__":
-    from langchain_google_genai import ChatGoogleGenerativeAI
-    import os
-    from dotenv import load_dotenv
-
-    load_dotenv()
-
-    model = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0, max_output_tokens=4000, google_api_key=os.getenv("GOOGLE_API_KEY"))
-    global_graph_instance = Global_graph(model)
-    result = global_graph_instance.graph.invoke({"messages": [HumanMessage(content=INPUT_ARCHI)], "iteration": 0, "iteration_max": 4, "note_max": 90, "diff_notes_max": 5})
+    # GLOBAL_DEADLINE_S bounds the whole run, e.g. GLOBAL_DEADLINE_S=900.
+    deadline_s = float(os.getenv("GLOBAL_DEADLINE_S")) if os.getenv("GLOBAL_DEADLINE_S") else None
+    global_graph_instance = Global_graph(deadline_s=deadline_s)
+    result = stream_graph(global_graph_instance.graph, {"messages": [HumanMessage(content=INPUT_ARCHI)], "iteration": 0, "iteration_max": 4, "note_max": 90, "diff_notes_max": 5}, TokenPrinter(),
+                          config=global_graph_instance.run_config())
+    if result.get("timed_out"):
+        print(f"{RED}Run stopped at its deadline after {result['iteration']} iteration(s), notes {result.get('note')}{RESET}")
+    print(f"--- LLM scheduler: {get_llm_scheduler().stats()} ---")
+    print(f"--- Model routes: {route_stats()} ---")
     global_agent_messages = result['messages']
     manifest_architecture = result['architecture_manifest']
     manifest_gdpr = result['gdpr_manifest']
@@ -0,0 +1,146 @@
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from src.utils.search_cache import normalize_query
+
+DEFAULT_NAMESPACE = "default"
+
+
+class CachedAnswer(NamedTuple):
+    query: str
+    answer: str
+    sources: List[str]
+    created_at: float
+    # 1.0 for an exact hit on the normalized query, the cosine similarity for an approximate one.
+    similarity: float = 1.0
+
+
+def char_ngrams(text: str, ngram_range: Tuple[int, int] = (3, 5)) -> Counter:
+    """Returns the counts of the character n-grams of `text`, padded with spaces at the word boundaries."""
+    text = f" {text} "
+    return Counter(text[i:i + n] for n in range(ngram_range[0], ngram_range[1] + 1) for i in range(len(text) - n + 1))
+
+
+def numbers(text: str) -> List[str]:
+    """Returns the numbers of `text` (years, article numbers, amounts...), sorted."""
+    return sorted(re.findall(r"\d+(?:[.,]\d+)*", text))
+
+
+class AnswerCache:
+    """
+    Cache of final search answers, looked up by normalized query and then by similarity.
+
+    Answers are stored in a namespace, e.g. one per agent configuration, and only found in it.
+    An exact hit needs the same normalized query. Otherwise the closest cached query,
+    by cosine similarity of character n-gram TF-IDF vectors, is a hit if it reaches
+    `similarity_threshold` and has the same numbers ("GDPR fines 2023" never answers
+    "GDPR fines 2024"). Entries expire after `ttl_seconds`, and the least recently
+    used ones are dropped beyond `max_entries`. In memory and thread-safe.
+    """
+
+    def __init__(self, similarity_threshold: float = 0.95, ttl_seconds: float = 6 * 3600, max_entries: int = 256,
+                 ngram_range: Tuple[int, int] = (3, 5)):
+        """
+        Args:
+            similarity_threshold: Minimum cosine similarity of an approximate hit, above 1 to disable them.
+                Keep it high: "GDPR fines in France" and "GDPR fines in Spain" already score about 0.75.
+            ttl_seconds: Lifetime of an answer.
+            max_entries: Maximum number of answers kept.
+            ngram_range: Sizes of the character n-grams of the similarity index.
+        """
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.ngram_range = ngram_range
+        self.exact_hits = 0
+        self.approximate_hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[CachedAnswer, Counter]]" = OrderedDict()
+        self._document_frequency: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        _, ngrams = self._entries.pop(key)
+        self._document_frequency.subtract(ngrams.keys())
+        self._document_frequency += Counter()  # drops the n-grams whose count fell to zero
+
+    def _drop_expired(self, now: float) -> None:
+        expired = [key for key, (entry, _) in self._entries.items() if now - entry.created_at > self.ttl_seconds]
+        for key in expired:
+            self._remove(key)
+
+    def _tfidf(self, ngrams: Counter) -> Dict[str, float]:
+        documents = len(self._entries) + 1
+        return {
+            ngram: count * (math.log((1 + documents) / (1 + self._document_frequency[ngram])) + 1)
+            for ngram, count in ngrams.items()
+        }
+
+    @staticmethod
+    def _cosine(a: Dict[str, float], b: Dict[str, float]) -> float:
+        if len(a) > len(b):
+            a, b = b, a
+        dot = sum(weight * b.get(ngram, 0.0) for ngram, weight in a.items())
+        norm = math.sqrt(sum(w * w for w in a.values())) * math.sqrt(sum(w * w for w in b.values()))
+        return dot / norm if norm else 0.0
+
+    def get(self, query: str, namespace: str = DEFAULT_NAMESPACE) -> Optional[CachedAnswer]:
+        """Returns the cached answer of `query` or of the most similar cached query of `namespace`, or None."""
+        normalized = normalize_query(query)
+        key = (namespace, normalized)
+        with self._lock:
+            self._drop_expired(time.time())
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return self._entries[key][0]
+
+            best_key, best_similarity = None, 0.0
+            if self.similarity_threshold <= 1.0 and self._entries:
+                query_vector = self._tfidf(char_ngrams(normalized, self.ngram_range))
+                query_numbers = numbers(normalized)
+                for candidate_key, (_, ngrams) in self._entries.items():
+                    if candidate_key[0] != namespace or numbers(candidate_key[1]) != query_numbers:
+                        continue
+                    similarity = self._cosine(query_vector, self._tfidf(ngrams))
+                    if similarity > best_similarity:
+                        best_key, best_similarity = candidate_key, similarity
+
+            if best_key is None or best_similarity < self.similarity_threshold:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self.approximate_hits += 1
+            return self._entries[best_key][0]._replace(similarity=round(best_similarity, 4))
+
+    def set(self, query: str, answer: str, sources: List[str], namespace: str = DEFAULT_NAMESPACE) -> None:
+        key = (namespace, normalize_query(query))
+        ngrams = char_ngrams(key[1], self.ngram_range)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (CachedAnswer(query, answer, list(sources), time.time()), ngrams)
+            self._document_frequency.update(ngrams.keys())
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._document_frequency.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Returns hit/miss counters and the current number of answers."""
+        with self._lock:
+            lookups = self.exact_hits + self.approximate_hits + self.misses
+            return {
+                "exact_hits": self.exact_hits,
+                "approximate_hits": self.approximate_hits,
+                "misses": self.misses,
+                "hit_rate": (self.exact_hits + self.approximate_hits) / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+            }
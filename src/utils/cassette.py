@@ -0,0 +1,288 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import zstandard
+from langchain_core.tools import BaseTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from src.utils.llm_cache import (
+    LLMResponseCache, dump_message, load_message, schema_description, serialize_input, structured_codec
+)
+from src.utils.web_fetch import FetchedPage
+
+CASSETTE_VERSION = 1
+RECORD = "record"
+REPLAY = "replay"
+
+
+class CassetteMiss(KeyError):
+    """Raised on replay for a request the cassette did not record."""
+
+
+class ReplayedError(RuntimeError):
+    """Replays the error a request raised while recording."""
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+class Cassette:
+    """
+    Recording of the external traffic of a run (chat model calls, DuckDuckGo searches and page downloads)
+    that can be replayed offline in place of the model, the search engine and the network.
+
+    Each interaction is stored under its kind and the key of its request, with its response (or error) and
+    the time it took; a request made several times replays its responses in the recorded order, then the last
+    one again. The file is zstd-compressed JSON. Thread-safe.
+    """
+
+    def __init__(self, path: str, mode: str = REPLAY, time_scale: float = 1.0):
+        """
+        Args:
+            path: Path of the cassette file, written by save() when recording and read when replaying.
+            mode: "record" to call the real services and store their traffic, "replay" to answer from the file.
+            time_scale: Replay delay as a fraction of the recorded latency: 1 for the original timings, 0 for none.
+        """
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.time_scale = time_scale
+        self.interactions: Dict[str, Dict[str, List[dict]]] = {}
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+        self._cursors: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+        if mode == REPLAY:
+            self.load()
+
+    def load(self) -> None:
+        with open(self.path, "rb") as f:
+            data = json.loads(zstandard.ZstdDecompressor().decompress(f.read()))
+        if data.get("version") != CASSETTE_VERSION:
+            raise ValueError(f"Unsupported cassette version {data.get('version')} in {self.path}")
+        with self._lock:
+            self.interactions = data["interactions"]
+            self._cursors.clear()
+
+    def save(self) -> None:
+        """Writes the cassette file atomically."""
+        with self._lock:
+            serialized = json.dumps({"version": CASSETTE_VERSION, "interactions": self.interactions}, ensure_ascii=False)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "wb") as f:
+            f.write(zstandard.ZstdCompressor(level=10).compress(serialized.encode("utf-8")))
+        os.replace(temporary_path, self.path)
+
+    def record(self, kind: str, key: str, response: Any = None, elapsed_s: float = 0.0, error: Optional[str] = None) -> None:
+        """Stores one interaction: its JSON-serializable response, or the error it raised."""
+        interaction = {"elapsed_s": round(elapsed_s, 4)}
+        if error is None:
+            interaction["response"] = response
+        else:
+            interaction["error"] = error
+        with self._lock:
+            self.interactions.setdefault(kind, {}).setdefault(key, []).append(interaction)
+            self.recorded += 1
+
+    def play(self, kind: str, key: str) -> Tuple[dict, float]:
+        """Returns the next recorded interaction of a request and the delay to wait before answering it."""
+        with self._lock:
+            interactions = self.interactions.get(kind, {}).get(key)
+            if not interactions:
+                self.misses += 1
+                raise CassetteMiss(f"No recorded {kind} request with key {key[:200]!r} in {self.path}")
+            cursor = self._cursors.get((kind, key), 0)
+            self._cursors[(kind, key)] = cursor + 1
+            self.replayed += 1
+        interaction = interactions[min(cursor, len(interactions) - 1)]
+        return interaction, interaction["elapsed_s"] * self.time_scale
+
+    @staticmethod
+    def _replayed_response(interaction: dict, load: Callable[[Any], Any]) -> Any:
+        if "error" in interaction:
+            raise ReplayedError(interaction["error"])
+        return load(interaction["response"])
+
+    def call(self, kind: str, key: str, compute: Callable[[], Any],
+             dump: Callable[[Any], Any] = _identity, load: Callable[[Any], Any] = _identity) -> Any:
+        """
+        Records `compute()` under `key`, or replays it.
+
+        Args:
+            kind: Kind of traffic, e.g. "llm", "search" or "fetch".
+            key: Key of the request within its kind.
+            compute: Calls the real service; only used when recording.
+            dump: Converts the output of compute() into a JSON-serializable response.
+            load: Converts a recorded response back into the output of compute().
+        """
+        if self.mode == RECORD:
+            start = time.perf_counter()
+            try:
+                output = compute()
+            except Exception as e:
+                self.record(kind, key, elapsed_s=time.perf_counter() - start, error=f"{type(e).__name__}: {e}")
+                raise
+            self.record(kind, key, dump(output), time.perf_counter() - start)
+            return output
+
+        interaction, delay = self.play(kind, key)
+        if delay > 0:
+            time.sleep(delay)
+        return self._replayed_response(interaction, load)
+
+    async def acall(self, kind: str, key: str, compute: Callable[[], Awaitable[Any]],
+                    dump: Callable[[Any], Any] = _identity, load: Callable[[Any], Any] = _identity) -> Any:
+        """Async version of call(); `compute` returns an awaitable."""
+        if self.mode == RECORD:
+            start = time.perf_counter()
+            try:
+                output = await compute()
+            except Exception as e:
+                self.record(kind, key, elapsed_s=time.perf_counter() - start, error=f"{type(e).__name__}: {e}")
+                raise
+            self.record(kind, key, dump(output), time.perf_counter() - start)
+            return output
+
+        interaction, delay = self.play(kind, key)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return self._replayed_response(interaction, load)
+
+    def chat_model(self, model=None, namespace: str = "default") -> "CassetteChatModel":
+        """Returns `model` recorded in this cassette, or its replay when `model` is None."""
+        return CassetteChatModel(self, model, namespace)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "requests": {kind: sum(len(interactions) for interactions in requests.values())
+                             for kind, requests in self.interactions.items()},
+                "recorded": self.recorded,
+                "replayed": self.replayed,
+                "misses": self.misses,
+            }
+
+
+class _CassetteRunnable:
+    """A runnable of a chat model (the model itself, its bound tools or its structured output) recorded in a cassette."""
+
+    def __init__(self, runnable, cassette: Cassette, request: Dict[str, Any],
+                 dump: Callable[[Any], Any], load: Callable[[Any], Any]):
+        self.runnable = runnable
+        self.cassette = cassette
+        self.request = request
+        self.dump = dump
+        self.load = load
+
+    def _key(self, model_input: Any, kwargs: Dict[str, Any]) -> str:
+        return LLMResponseCache.key({**self.request, "input": serialize_input(model_input), "kwargs": kwargs})
+
+    def invoke(self, model_input, config=None, **kwargs):
+        return self.cassette.call("llm", self._key(model_input, kwargs),
+                                  lambda: self.runnable.invoke(model_input, config, **kwargs), self.dump, self.load)
+
+    async def ainvoke(self, model_input, config=None, **kwargs):
+        return await self.cassette.acall("llm", self._key(model_input, kwargs),
+                                         lambda: self.runnable.ainvoke(model_input, config, **kwargs), self.dump, self.load)
+
+    def __getattr__(self, name):
+        # Anything else (stream, batch, ...) goes to the wrapped runnable, unrecorded.
+        if name == "runnable" or self.runnable is None:
+            raise AttributeError(name)
+        return getattr(self.runnable, name)
+
+
+class CassetteChatModel(_CassetteRunnable):
+    """
+    Chat model wrapper recording its calls in a cassette, or replaying them without any model.
+
+    invoke()/ainvoke() of the model, of bind_tools() and of with_structured_output() are recorded,
+    keyed by the namespace, the tools or output schema and the messages (whatever the model parameters,
+    which a replay does not know); structured outputs are stored as JSON and rebuilt into their schema.
+    """
+
+    def __init__(self, cassette: Cassette, model=None, namespace: str = "default"):
+        """
+        Args:
+            cassette: Cassette recording or replaying the calls.
+            model: Wrapped chat model, needed to record only.
+            namespace: Separates the requests of models that would otherwise share keys, e.g. "summary".
+        """
+        if model is None and cassette.mode == RECORD:
+            raise ValueError("Recording a cassette needs a chat model")
+        super().__init__(model, cassette, {"namespace": namespace}, _dump_message_json, _load_message_json)
+        self.model = model
+
+    def bind_tools(self, tools, **kwargs) -> _CassetteRunnable:
+        request = {**self.request, "tools": [convert_to_openai_tool(tool) for tool in tools], "bind_kwargs": kwargs}
+        runnable = self.model.bind_tools(tools, **kwargs) if self.model is not None else None
+        return _CassetteRunnable(runnable, self.cassette, request, _dump_message_json, _load_message_json)
+
+    def with_structured_output(self, schema, **kwargs) -> _CassetteRunnable:
+        if kwargs.get("include_raw"):
+            raise ValueError("Cassettes do not record the raw outputs of with_structured_output()")
+        dump, load = structured_codec(schema)
+        request = {**self.request, "schema": schema_description(schema), "structured_kwargs": kwargs}
+        runnable = self.model.with_structured_output(schema, **kwargs) if self.model is not None else None
+        return _CassetteRunnable(runnable, self.cassette, request, lambda output: json.loads(dump(output)),
+                                 lambda response: load(json.dumps(response)))
+
+
+def _dump_message_json(message) -> Any:
+    return json.loads(dump_message(message))
+
+
+def _load_message_json(response: Any):
+    return load_message(json.dumps(response))
+
+
+class CassetteSearchTool(BaseTool):
+    """Search tool recorded in or replayed from a cassette, with the name and arguments of the wrapped tool."""
+
+    tool: Any = None
+    cassette: Any = None
+
+    @classmethod
+    def wrap(cls, tool: BaseTool, cassette: Cassette) -> "CassetteSearchTool":
+        return cls(name=tool.name, description=tool.description, args_schema=tool.args_schema, tool=tool, cassette=cassette)
+
+    def _run(self, query: str) -> str:
+        return self.cassette.call("search", query, lambda: self.tool.invoke(query))
+
+    async def _arun(self, query: str) -> str:
+        return await self.cassette.acall("search", query, lambda: self.tool.ainvoke(query))
+
+
+def _dump_pages(pages: Dict[str, FetchedPage]) -> Dict[str, dict]:
+    return {url: page._asdict() for url, page in pages.items()}
+
+
+def _load_pages(pages: Dict[str, dict]) -> Dict[str, FetchedPage]:
+    return {url: FetchedPage(**page) for url, page in pages.items()}
+
+
+def cassette_fetch_pages(cassette: Cassette, fetch_pages: Callable[..., Dict[str, FetchedPage]]):
+    """Returns `fetch_pages` recorded in or replayed from `cassette`, keyed by the list of URLs of each call."""
+    def recorded_fetch_pages(urls: List[str], **kwargs) -> Dict[str, FetchedPage]:
+        if not urls:
+            return {}
+        return cassette.call("fetch", "\n".join(urls), lambda: fetch_pages(urls, **kwargs), _dump_pages, _load_pages)
+    return recorded_fetch_pages
+
+
+def cassette_afetch_pages(cassette: Cassette, afetch_pages: Callable[..., Awaitable[Dict[str, FetchedPage]]]):
+    """Async version of cassette_fetch_pages()."""
+    async def recorded_afetch_pages(urls: List[str], **kwargs) -> Dict[str, FetchedPage]:
+        if not urls:
+            return {}
+        return await cassette.acall("fetch", "\n".join(urls), lambda: afetch_pages(urls, **kwargs), _dump_pages, _load_pages)
+    return recorded_afetch_pages
@@ -0,0 +1,177 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+import zstandard
+
+
+class DiskCache:
+    """
+    Persistent text cache stored in a SQLite file, values compressed with zstd.
+
+    Entries live in a namespace so several caches can share the same file.
+    They expire after `ttl_seconds`, and once the compressed size of a namespace
+    goes over `max_bytes` the least recently used entries are evicted.
+    The SQLite file can be shared between processes; each instance is thread-safe.
+    """
+
+    def __init__(self, path: str, namespace: str = "default", ttl_seconds: Optional[float] = 24 * 3600,
+                 max_bytes: int = 200 * 1024 * 1024, compression_level: int = 3):
+        """
+        Args:
+            path: Path of the SQLite file, created with its directory on first use if missing.
+            namespace: Logical partition of the file used by this cache.
+            ttl_seconds: Lifetime of an entry, None to never expire.
+            max_bytes: Maximum compressed size of the namespace before LRU eviction.
+            compression_level: zstd compression level.
+        """
+        self.path = path
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.compression_level = compression_level
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        # Opened on first use, so that defining a cache (e.g. at import time) creates no file.
+        self._sqlite: Optional[sqlite3.Connection] = None
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """The SQLite connection, opened on first use; only accessed under self._lock."""
+        if self._sqlite is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " namespace TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " value BLOB NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries (namespace, accessed_at)")
+            self._sqlite = conn
+        return self._sqlite
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the cached value for `key`, or None on a miss or an expired entry."""
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        """Returns the cached values found for `keys`; missing and expired keys are left out."""
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        now = time.time()
+        found = {}
+        expired = []
+        with self._lock:
+            placeholders = ",".join("?" for _ in keys)
+            rows = self._conn.execute(
+                f"SELECT key, value, created_at FROM entries WHERE namespace = ? AND key IN ({placeholders})",
+                [self.namespace, *keys]
+            ).fetchall()
+            decompressor = zstandard.ZstdDecompressor()
+            for key, value, created_at in rows:
+                if self._is_expired(created_at, now):
+                    expired.append(key)
+                    continue
+                found[key] = decompressor.decompress(value).decode("utf-8")
+
+            if expired:
+                self._conn.executemany(
+                    "DELETE FROM entries WHERE namespace = ? AND key = ?",
+                    [(self.namespace, key) for key in expired]
+                )
+            if found:
+                self._conn.executemany(
+                    "UPDATE entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                    [(now, self.namespace, key) for key in found]
+                )
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set(self, key: str, value: str) -> None:
+        """Stores `value` under `key`, replacing any previous entry."""
+        self.set_many({key: value})
+
+    def set_many(self, items: Dict[str, str]) -> None:
+        """Stores several values at once, then evicts the LRU entries if the size cap is exceeded."""
+        if not items:
+            return
+        now = time.time()
+        compressor = zstandard.ZstdCompressor(level=self.compression_level)
+        rows = []
+        for key, value in items.items():
+            blob = compressor.compress(value.encode("utf-8"))
+            rows.append((self.namespace, key, blob, len(blob), now, now))
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, size, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._evict()
+
+    def delete(self, key: str) -> None:
+        """Removes a single entry."""
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (self.namespace, key))
+
+    def clear(self) -> None:
+        """Removes every entry of this namespace."""
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE namespace = ?", (self.namespace,))
+
+    def _evict(self) -> None:
+        """Drops expired entries, then the least recently used ones until the namespace fits in max_bytes."""
+        if self.ttl_seconds is not None:
+            self._conn.execute(
+                "DELETE FROM entries WHERE namespace = ? AND created_at < ?",
+                (self.namespace, time.time() - self.ttl_seconds)
+            )
+        total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries WHERE namespace = ?", (self.namespace,)
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        to_delete = []
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM entries WHERE namespace = ? ORDER BY accessed_at ASC", (self.namespace,)
+        ):
+            if total <= self.max_bytes:
+                break
+            to_delete.append((self.namespace, key))
+            total -= size
+        self._conn.executemany("DELETE FROM entries WHERE namespace = ? AND key = ?", to_delete)
+        self.evictions += len(to_delete)
+
+    def stats(self) -> Dict[str, float]:
+        """Returns hit/miss counters and the current size of the namespace."""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries WHERE namespace = ?", (self.namespace,)
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_bytes": size,
+        }
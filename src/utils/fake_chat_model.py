@@ -0,0 +1,183 @@
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import PrivateAttr
+
+FILLER_WORDS = ("lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit")
+
+# Returns the response to scripted messages given the bound tools (OpenAI format) and the tool choice,
+# or None to fall back to the default response.
+Responder = Callable[[List[BaseMessage], List[dict], Optional[Any]], Union[str, AIMessage, None]]
+
+
+def fixed_latency(seconds: float) -> Callable[[], float]:
+    return lambda: seconds
+
+
+def uniform_latency(low: float, high: float, seed: Optional[int] = None) -> Callable[[], float]:
+    rng = random.Random(seed)
+    return lambda: rng.uniform(low, high)
+
+
+def lognormal_latency(median: float, sigma: float = 0.5, seed: Optional[int] = None) -> Callable[[], float]:
+    """Latencies with a long right tail, like those of a hosted model: half of them are below `median`."""
+    if median <= 0:
+        return fixed_latency(0.0)
+    rng = random.Random(seed)
+    mu = math.log(median)
+    return lambda: rng.lognormvariate(mu, sigma)
+
+
+def filler_text(words: int) -> str:
+    return " ".join(FILLER_WORDS[i % len(FILLER_WORDS)] for i in range(words))
+
+
+def example_value(schema: dict, definitions: Optional[dict] = None, integer: int = 80) -> Any:
+    """Returns a value valid against a JSON schema: every property filled, the first choice of enums and unions."""
+    definitions = definitions if definitions is not None else schema.get("$defs", {})
+    if "$ref" in schema:
+        return example_value(definitions[schema["$ref"].split("/")[-1]], definitions, integer)
+    if "enum" in schema:
+        return schema["enum"][0]
+    for union in ("anyOf", "oneOf"):
+        if union in schema:
+            options = [option for option in schema[union] if option.get("type") != "null"] or schema[union]
+            return example_value(options[0], definitions, integer)
+    schema_type = schema.get("type")
+    if schema_type == "object":
+        return {name: example_value(property_schema, definitions, integer)
+                for name, property_schema in schema.get("properties", {}).items()}
+    if schema_type == "array":
+        return [example_value(schema.get("items", {}), definitions, integer)]
+    if schema_type == "integer":
+        return integer
+    if schema_type == "number":
+        return float(integer)
+    if schema_type == "boolean":
+        return True
+    return filler_text(8)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Offline chat model with scripted responses and simulated latency, to run the graphs without any API.
+
+    Each call waits `latency()` seconds plus `seconds_per_output_token` per generated token, then returns
+    what `responder` scripts for the messages, or by default `output_tokens` words of filler text.
+    When streamed, the first token comes after `latency()` and the next ones (words) every `seconds_per_output_token`.
+    It supports bind_tools(), and with_structured_output() through forced tool calls: without a script,
+    a forced tool call gets example arguments valid against the tool schema. Thread-safe.
+    """
+
+    responder: Optional[Responder] = None
+    latency: Callable[[], float] = fixed_latency(0.0)
+    output_tokens: int = 200
+    seconds_per_output_token: float = 0.0
+    # Integer filled in the example arguments of forced tool calls, e.g. the note of a structured review.
+    example_integer: int = 80
+    model_name: str = "fake-chat-model"
+    temperature: float = 0
+
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _calls: int = PrivateAttr(default=0)
+    _wait_seconds: float = PrivateAttr(default=0.0)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model": self.model_name, "temperature": self.temperature, "output_tokens": self.output_tokens}
+
+    def bind_tools(self, tools, tool_choice=None, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], tool_choice=tool_choice, **kwargs)
+
+    def _default_response(self, tools: List[dict], tool_choice) -> AIMessage:
+        if tools and tool_choice:
+            tool = next((tool for tool in tools if tool["function"]["name"] == tool_choice), tools[0])["function"]
+            arguments = example_value(tool.get("parameters", {}), integer=self.example_integer)
+            return AIMessage(content="", tool_calls=[{"name": tool["name"], "args": arguments, "id": uuid.uuid4().hex}])
+        return AIMessage(content=filler_text(self.output_tokens))
+
+    def _respond(self, messages: List[BaseMessage], tools: Optional[List[dict]], tool_choice) -> AIMessage:
+        tools = tools or []
+        response = self.responder(messages, tools, tool_choice) if self.responder is not None else None
+        if response is None:
+            response = self._default_response(tools, tool_choice)
+        elif isinstance(response, str):
+            response = AIMessage(content=response)
+        input_tokens = sum(len(str(message.content)) for message in messages) // 4
+        output_tokens = len(str(response.content).split()) + sum(len(json.dumps(call["args"]).split()) for call in response.tool_calls)
+        response.usage_metadata = {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                                   "total_tokens": input_tokens + output_tokens}
+        return response
+
+    def _latencies(self, response: AIMessage) -> Tuple[float, float]:
+        """Returns the time to the first token and the time per following token of a response."""
+        first_token = max(0.0, self.latency())
+        with self._lock:
+            self._calls += 1
+            self._wait_seconds += first_token + self.seconds_per_output_token * response.usage_metadata["output_tokens"]
+        return first_token, self.seconds_per_output_token
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, tools=None, tool_choice=None,
+                  **kwargs) -> ChatResult:
+        response = self._respond(messages, tools, tool_choice)
+        first_token, per_token = self._latencies(response)
+        time.sleep(first_token + per_token * response.usage_metadata["output_tokens"])
+        return ChatResult(generations=[ChatGeneration(message=response)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None, tools=None, tool_choice=None,
+                         **kwargs) -> ChatResult:
+        response = self._respond(messages, tools, tool_choice)
+        first_token, per_token = self._latencies(response)
+        await asyncio.sleep(first_token + per_token * response.usage_metadata["output_tokens"])
+        return ChatResult(generations=[ChatGeneration(message=response)])
+
+    @staticmethod
+    def _chunks(response: AIMessage) -> List[AIMessageChunk]:
+        """Splits a response into one chunk per word, then one chunk per tool call, the usage on the last one."""
+        words = str(response.content).split(" ") if response.content else []
+        chunks = [AIMessageChunk(content=word if i == 0 else " " + word) for i, word in enumerate(words)]
+        chunks += [AIMessageChunk(content="", tool_call_chunks=[{"name": call["name"], "args": json.dumps(call["args"]),
+                                                                 "id": call["id"], "index": i}])
+                   for i, call in enumerate(response.tool_calls)]
+        chunks = chunks or [AIMessageChunk(content="")]
+        chunks[-1].usage_metadata = response.usage_metadata
+        return chunks
+
+    def _stream(self, messages: List[BaseMessage], stop=None, run_manager=None, tools=None, tool_choice=None,
+                **kwargs) -> Iterator[ChatGenerationChunk]:
+        response = self._respond(messages, tools, tool_choice)
+        first_token, per_token = self._latencies(response)
+        time.sleep(first_token)
+        for i, chunk in enumerate(self._chunks(response)):
+            if i and per_token:
+                time.sleep(per_token)
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(self, messages: List[BaseMessage], stop=None, run_manager=None, tools=None, tool_choice=None,
+                       **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        response = self._respond(messages, tools, tool_choice)
+        first_token, per_token = self._latencies(response)
+        await asyncio.sleep(first_token)
+        for i, chunk in enumerate(self._chunks(response)):
+            if i and per_token:
+                await asyncio.sleep(per_token)
+            yield ChatGenerationChunk(message=chunk)
+
+    def stats(self) -> Dict[str, float]:
+        """Returns the number of calls and the total simulated latency."""
+        with self._lock:
+            return {"calls": self._calls, "wait_seconds": round(self._wait_seconds, 4)}
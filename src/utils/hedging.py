@@ -0,0 +1,271 @@
+import asyncio
+import contextvars
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Deque, Dict, Optional
+
+from langchain_core.runnables.config import ensure_config
+from langgraph.constants import TAG_NOSTREAM
+
+# A request still running at this percentile of the recent latencies gets a duplicate.
+HEDGE_PERCENTILE = 95
+# Below this many latency samples, the percentile is not trusted and INITIAL_HEDGE_DELAY_SECONDS is used.
+MIN_LATENCY_SAMPLES = 20
+INITIAL_HEDGE_DELAY_SECONDS = 10.0
+LATENCY_WINDOW = 500
+# Cost budget: at most this fraction of the requests is duplicated, with a burst of MAX_HEDGE_CREDIT duplicates.
+MAX_HEDGE_RATIO = 0.1
+MAX_HEDGE_CREDIT = 5.0
+MAX_HEDGE_WORKERS = 64
+# Key of the run deadline in config["configurable"], a time.time() timestamp.
+DEADLINE_KEY = "deadline"
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised by a model call made after, or still running at, the deadline of its run."""
+
+
+def with_deadline(seconds: float, config: Optional[dict] = None) -> dict:
+    """
+    Returns a copy of the run config `config` with a deadline `seconds` from now. The graph nodes, their
+    subgraphs and the HedgedChatModel calls of the run see it, e.g.
+    graph.invoke(state, config=with_deadline(600)).
+    """
+    config = dict(config or {})
+    config["configurable"] = {**config.get("configurable", {}), DEADLINE_KEY: time.time() + seconds}
+    return config
+
+
+def remaining_time(config: Optional[dict] = None) -> Optional[float]:
+    """Returns the seconds left before the deadline of the current run, None if it has none."""
+    deadline = ensure_config(config).get("configurable", {}).get(DEADLINE_KEY)
+    return None if deadline is None else deadline - time.time()
+
+
+def check_deadline(config: Optional[dict] = None) -> Optional[float]:
+    """Returns remaining_time(), raising DeadlineExceeded if the deadline has passed."""
+    remaining = remaining_time(config)
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded(f"Run deadline passed {-remaining:.1f}s ago")
+    return remaining
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_HEDGE_WORKERS, thread_name_prefix="hedged-llm")
+        return _executor
+
+
+class HedgePolicy:
+    """
+    When to hedge, shared by a model and its runnables: the hedge delay is a percentile of the recent
+    latencies of the first attempts, and the duplicates are paid from a credit earning MAX_HEDGE_RATIO per request.
+    """
+
+    def __init__(self, percentile: float = HEDGE_PERCENTILE, max_hedge_ratio: float = MAX_HEDGE_RATIO,
+                 initial_delay: float = INITIAL_HEDGE_DELAY_SECONDS, min_delay: float = 0.0,
+                 window: int = LATENCY_WINDOW):
+        """
+        Args:
+            percentile: Percentile of the recent latencies after which a request is duplicated.
+            max_hedge_ratio: Fraction of the requests which may be duplicated, the extra cost.
+            initial_delay: Hedge delay until MIN_LATENCY_SAMPLES latencies are known.
+            min_delay: Lower bound of the hedge delay.
+            window: Number of recent latencies kept.
+        """
+        self.percentile = percentile
+        self.max_hedge_ratio = max_hedge_ratio
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.credit = 0.0
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.deadline_exceeded = 0
+        self._lock = threading.Lock()
+
+    def record(self, latency: float) -> None:
+        with self._lock:
+            self.latencies.append(latency)
+
+    def delay(self) -> float:
+        with self._lock:
+            if len(self.latencies) < MIN_LATENCY_SAMPLES:
+                return max(self.min_delay, self.initial_delay)
+            ordered = sorted(self.latencies)
+        index = max(0, math.ceil(len(ordered) * self.percentile / 100) - 1)
+        return max(self.min_delay, ordered[index])
+
+    def start_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+            self.credit = min(MAX_HEDGE_CREDIT, self.credit + self.max_hedge_ratio)
+
+    def try_hedge(self) -> bool:
+        """Takes the credit of a duplicate request, if the budget allows one."""
+        with self._lock:
+            if self.credit < 1:
+                return False
+            self.credit -= 1
+            self.hedges += 1
+            return True
+
+    def record_outcome(self, hedge_won: bool = False, deadline_exceeded: bool = False) -> None:
+        with self._lock:
+            self.hedge_wins += hedge_won
+            self.deadline_exceeded += deadline_exceeded
+
+    def stats(self) -> Dict[str, Any]:
+        delay = self.delay()
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "hedges": self.hedges,
+                "hedge_ratio": round(self.hedges / self.requests, 3) if self.requests else 0.0,
+                "hedge_wins": self.hedge_wins,
+                "deadline_exceeded": self.deadline_exceeded,
+                "hedge_delay_s": round(delay, 3),
+            }
+
+
+def _hedge_config(config: Optional[dict]) -> dict:
+    # The duplicate is kept out of the token stream, which already shows the first attempt.
+    config = dict(config or {})
+    config["tags"] = [*(ensure_config(config).get("tags") or []), TAG_NOSTREAM]
+    return config
+
+
+class _HedgedRunnable:
+    """A runnable of a chat model (the model itself, its bound tools or its structured output) with hedged requests."""
+
+    def __init__(self, runnable, policy: HedgePolicy):
+        self.runnable = runnable
+        self.policy = policy
+
+    def _submit(self, model_input, config, kwargs, hedge: bool) -> Future:
+        start = time.monotonic()
+        run_config = _hedge_config(config) if hedge else config
+        # Each attempt runs in its own copy of the context, to keep the LangGraph run config and callbacks.
+        context = contextvars.copy_context()
+        future = _get_executor().submit(context.run, self.runnable.invoke, model_input, run_config, **kwargs)
+        if not hedge:
+            # The latency of every first attempt, including those which lost the race, sets the hedge delay.
+            future.add_done_callback(
+                lambda done: done.exception() is None and self.policy.record(time.monotonic() - start))
+        return future
+
+    def invoke(self, model_input, config=None, **kwargs):
+        """
+        Sends the request, then a duplicate if it is still running after the hedge delay and the budget allows,
+        and returns the first successful response. A loser cannot be interrupted; its result is discarded.
+        """
+        remaining = check_deadline(config)
+        self.policy.start_request()
+        now = time.monotonic()
+        deadline_at = None if remaining is None else now + remaining
+        hedge_at = now + self.policy.delay()
+        primary = self._submit(model_input, config, kwargs, hedge=False)
+        pending = {primary}
+        hedged = False
+        errors = []
+        while pending:
+            wake_at = deadline_at if hedged else min(hedge_at, deadline_at or hedge_at)
+            timeout = None if wake_at is None else max(0.0, wake_at - time.monotonic())
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self.policy.record_outcome(hedge_won=future is not primary)
+                    return future.result()
+                errors.append(future.exception())
+            if deadline_at is not None and time.monotonic() >= deadline_at:
+                self.policy.record_outcome(deadline_exceeded=True)
+                raise DeadlineExceeded(f"Model call still running at the run deadline ({remaining:.1f}s)")
+            if not hedged and pending and time.monotonic() >= hedge_at:
+                hedged = True
+                if self.policy.try_hedge():
+                    pending.add(self._submit(model_input, config, kwargs, hedge=True))
+        raise errors[0]
+
+    async def ainvoke(self, model_input, config=None, **kwargs):
+        """Async version of invoke(); the losing attempt is cancelled."""
+        remaining = check_deadline(config)
+        self.policy.start_request()
+        loop = asyncio.get_running_loop()
+        deadline_at = None if remaining is None else loop.time() + remaining
+        hedge_at = loop.time() + self.policy.delay()
+        start = loop.time()
+        primary = asyncio.ensure_future(self.runnable.ainvoke(model_input, config, **kwargs))
+        primary.add_done_callback(
+            lambda done: not done.cancelled() and done.exception() is None and self.policy.record(loop.time() - start))
+        pending = {primary}
+        hedged = False
+        errors = []
+        try:
+            while pending:
+                wake_at = deadline_at if hedged else min(hedge_at, deadline_at or hedge_at)
+                timeout = None if wake_at is None else max(0.0, wake_at - loop.time())
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self.policy.record_outcome(hedge_won=task is not primary)
+                        return task.result()
+                    errors.append(task.exception())
+                if deadline_at is not None and loop.time() >= deadline_at:
+                    self.policy.record_outcome(deadline_exceeded=True)
+                    raise DeadlineExceeded(f"Model call still running at the run deadline ({remaining:.1f}s)")
+                if not hedged and pending and loop.time() >= hedge_at:
+                    hedged = True
+                    if self.policy.try_hedge():
+                        pending.add(asyncio.ensure_future(
+                            self.runnable.ainvoke(model_input, _hedge_config(config), **kwargs)))
+            raise errors[0]
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stream(self, model_input, config=None, **kwargs):
+        """Streams without hedging, since the first chunks are delivered before the latency is known."""
+        check_deadline(config)
+        yield from self.runnable.stream(model_input, config, **kwargs)
+
+    def __getattr__(self, name):
+        # Anything else (batch, astream, ...) goes to the wrapped runnable, unhedged.
+        if name == "runnable":
+            raise AttributeError(name)
+        return getattr(self.runnable, name)
+
+
+class HedgedChatModel(_HedgedRunnable):
+    """
+    Chat model wrapper cutting the tail latency with hedged requests: a request still running after a
+    percentile of the recent latencies is sent again, and the first response wins, within a budget of
+    duplicated requests. Calls also honour the run deadline set by with_deadline(), failing fast with
+    DeadlineExceeded instead of waiting past it.
+
+    invoke()/ainvoke() of the model, of bind_tools() and of with_structured_output() are hedged. Wrap a
+    scheduled model, so that the duplicates count against the quotas, e.g. HedgedChatModel(get_chat_model()).
+    """
+
+    def __init__(self, model, policy: Optional[HedgePolicy] = None):
+        """
+        Args:
+            model: Wrapped chat model.
+            policy: Hedge delay and budget, shared with the runnables of bind_tools() and with_structured_output().
+        """
+        super().__init__(model, policy or HedgePolicy())
+        self.model = model
+
+    def bind_tools(self, tools, **kwargs) -> _HedgedRunnable:
+        return _HedgedRunnable(self.model.bind_tools(tools, **kwargs), self.policy)
+
+    def with_structured_output(self, schema, **kwargs) -> _HedgedRunnable:
+        return _HedgedRunnable(self.model.with_structured_output(schema, **kwargs), self.policy)
@@ -0,0 +1,163 @@
+import asyncio
+import atexit
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from typing import Callable, Dict, Optional, Tuple
+
+REMOVED_TAGS = ["script", "style", "header", "footer", "nav",
+                "aside", "form", "noscript", "iframe", "img", "button"]
+CONTENT_TAGS = ["h1", "h2", "h3", "h4", "h5", "h6", "p",
+                "ul", "ol", "li", "blockquote", "td", "th"]
+
+# Fastest first: the default backend is the first one whose library is installed.
+PARSER_PREFERENCE = ("selectolax", "lxml", "html.parser")
+MAX_EXTRACTION_WORKERS = min(4, os.cpu_count() or 1)
+# Below this total size, shipping the pages to the process pool costs more than it saves.
+MIN_POOL_BATCH_BYTES = 256 * 1024
+
+
+def _clean_text(text: str) -> str:
+    # One line per content tag, so that paragraphs can be told apart downstream.
+    return "\n".join(line.strip() for line in text.splitlines() if line.strip())
+
+
+def _extract_with_bs4(html_content: str, features: str) -> str:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html_content, features)
+    article = soup.find("article") or soup.find("main") or soup.body
+    if not article:
+        return ""
+
+    for tag in article.find_all(REMOVED_TAGS):
+        tag.decompose()
+
+    content_tags = article.find_all(CONTENT_TAGS)
+    return _clean_text("\n".join(tag.get_text(separator=' ', strip=True) for tag in content_tags))
+
+
+def _extract_with_selectolax(html_content: str) -> str:
+    from selectolax.parser import HTMLParser
+
+    tree = HTMLParser(html_content)
+    article = tree.css_first("article") or tree.css_first("main") or tree.body
+    if article is None:
+        return ""
+
+    for node in article.css(",".join(REMOVED_TAGS)):
+        node.decompose()
+
+    content_nodes = article.css(",".join(CONTENT_TAGS))
+    return _clean_text("\n".join(node.text(separator=' ', strip=True) for node in content_nodes))
+
+
+PARSER_BACKENDS: Dict[str, Callable[[str], str]] = {
+    "selectolax": _extract_with_selectolax,
+    "lxml": lambda html_content: _extract_with_bs4(html_content, "lxml"),
+    "html.parser": lambda html_content: _extract_with_bs4(html_content, "html.parser"),
+}
+
+_BACKEND_MODULES = {"selectolax": ("selectolax",), "lxml": ("bs4", "lxml"), "html.parser": ("bs4",)}
+
+
+@lru_cache(maxsize=None)
+def available_parsers() -> Tuple[str, ...]:
+    """Returns the parser backends whose libraries are installed, fastest first."""
+    available = []
+    for name in PARSER_PREFERENCE:
+        try:
+            for module in _BACKEND_MODULES[name]:
+                __import__(module)
+        except ImportError:
+            continue
+        available.append(name)
+    return tuple(available)
+
+
+def default_parser() -> str:
+    """Returns the fastest installed parser backend."""
+    parsers = available_parsers()
+    return parsers[0] if parsers else "html.parser"
+
+
+def extract_text(html_content: str, parser: Optional[str] = None) -> str:
+    """
+    Extracts the readable text of the main content of an HTML page, or an empty string.
+    Pure function of its arguments, so it can run in a worker process.
+    """
+    if not html_content:
+        return ""
+    return PARSER_BACKENDS[parser or default_parser()](html_content)
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=MAX_EXTRACTION_WORKERS)
+        return _pool
+
+
+def _reset_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+atexit.register(_reset_pool)
+
+
+def _extract_all(pages: Dict[str, str], parser: str) -> Dict[str, str]:
+    return {url: extract_text(html_content, parser) for url, html_content in pages.items()}
+
+
+def extract_many(pages: Dict[str, str], parser: Optional[str] = None) -> Dict[str, str]:
+    """
+    Extracts the text of several pages, one page per task in a shared process pool.
+    Small batches are extracted in the calling thread. Returns the text of every page, keyed like `pages`.
+    """
+    parser = parser or default_parser()
+    total_bytes = sum(len(html_content) for html_content in pages.values())
+    if MAX_EXTRACTION_WORKERS < 2 or total_bytes < MIN_POOL_BATCH_BYTES:
+        return _extract_all(pages, parser)
+
+    try:
+        pool = _get_pool()
+        futures = {url: pool.submit(extract_text, html_content, parser) for url, html_content in pages.items()}
+        return {url: future.result() for url, future in futures.items()}
+    except BrokenProcessPool as e:
+        print(f"Warning: HTML extraction pool crashed ({e}), extracting in the calling thread.")
+        _reset_pool()
+        return _extract_all(pages, parser)
+
+
+async def aextract_many(pages: Dict[str, str], parser: Optional[str] = None) -> Dict[str, str]:
+    """
+    Async version of extract_many(): the event loop keeps running while the pool extracts the pages.
+    Small batches are extracted in a worker thread rather than on the event loop.
+    """
+    parser = parser or default_parser()
+    total_bytes = sum(len(html_content) for html_content in pages.values())
+    if MAX_EXTRACTION_WORKERS < 2 or total_bytes < MIN_POOL_BATCH_BYTES:
+        return await asyncio.to_thread(_extract_all, pages, parser)
+
+    loop = asyncio.get_running_loop()
+    try:
+        pool = _get_pool()
+        texts = await asyncio.gather(
+            *(loop.run_in_executor(pool, extract_text, html_content, parser) for html_content in pages.values())
+        )
+        return dict(zip(pages, texts))
+    except BrokenProcessPool as e:
+        print(f"Warning: HTML extraction pool crashed ({e}), extracting in a worker thread.")
+        _reset_pool()
+        return await asyncio.to_thread(_extract_all, pages, parser)
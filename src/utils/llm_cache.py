@@ -0,0 +1,246 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.messages import (
+    AIMessageChunk, BaseMessage, convert_to_messages, message_to_dict, messages_from_dict, messages_to_dict
+)
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, LLMResult
+from langchain_core.runnables.config import (
+    ensure_config, get_async_callback_manager_for_config, get_callback_manager_for_config
+)
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import BaseModel
+
+from src.constants import DIR_CACHE
+from src.utils.disk_cache import DiskCache
+
+LLM_CACHE_TTL_SECONDS = 7 * 24 * 3600
+LLM_CACHE_MAX_BYTES = 200 * 1024 * 1024
+# Set in the invocation params of the model runs that replay a cached response, for the callbacks to tell them apart.
+CACHE_HIT_PARAM = "llm_cache_hit"
+
+
+class LLMResponseCache:
+    """
+    Content-addressed cache of chat model responses, in a SQLite file with zstd compression.
+
+    The key is a hash of the model parameters, the bound tools or output schema and the serialized
+    messages, so only an identical request is a hit. Each namespace (e.g. one per agent) is a
+    DiskCache partition with its own LRU size cap, and can be invalidated on its own. Thread-safe.
+    """
+
+    def __init__(self, path: str = os.path.join(DIR_CACHE, "llm_responses.sqlite"),
+                 ttl_seconds: Optional[float] = LLM_CACHE_TTL_SECONDS, max_bytes: int = LLM_CACHE_MAX_BYTES):
+        """
+        Args:
+            path: Path of the SQLite file (created on first use).
+            ttl_seconds: Lifetime of a response, None to never expire.
+            max_bytes: Maximum compressed size of each namespace before LRU eviction.
+        """
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._namespaces: Dict[str, DiskCache] = {}
+        self._lock = threading.Lock()
+
+    def namespace(self, name: str) -> DiskCache:
+        """Returns the DiskCache of namespace `name`, opening it on first use."""
+        with self._lock:
+            disk_cache = self._namespaces.get(name)
+            if disk_cache is None:
+                disk_cache = DiskCache(self.path, namespace=name, ttl_seconds=self.ttl_seconds, max_bytes=self.max_bytes)
+                self._namespaces[name] = disk_cache
+            return disk_cache
+
+    @staticmethod
+    def key(request: Dict[str, Any]) -> str:
+        """Returns the content address of a request: the SHA-256 of its canonical JSON serialization."""
+        serialized = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+    def get(self, namespace: str, key: str) -> Optional[str]:
+        return self.namespace(namespace).get(key)
+
+    def set(self, namespace: str, key: str, value: str) -> None:
+        self.namespace(namespace).set(key, value)
+
+    def invalidate(self, namespace: str) -> None:
+        """Removes every response of `namespace`."""
+        self.namespace(namespace).clear()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Returns the DiskCache stats of every namespace opened by this process."""
+        with self._lock:
+            namespaces = dict(self._namespaces)
+        return {name: disk_cache.stats() for name, disk_cache in namespaces.items()}
+
+
+llm_response_cache = LLMResponseCache()
+
+
+def serialize_input(model_input: Any) -> Any:
+    """Returns the JSON-serializable form of a model input that request keys are computed from."""
+    if isinstance(model_input, list) and all(isinstance(message, BaseMessage) for message in model_input):
+        serialized = messages_to_dict(model_input)
+        # Message ids are random (LangGraph gives new messages a uuid) and the response metadata holds timings:
+        # neither is sent to the model, and both would make every request unique.
+        for message in serialized:
+            message["data"].pop("id", None)
+            message["data"].pop("response_metadata", None)
+        return serialized
+    return str(model_input)
+
+
+def dump_message(message: BaseMessage) -> str:
+    """Serializes a message to JSON, to store it; load_message() restores it."""
+    return json.dumps(message_to_dict(message))
+
+
+def load_message(value: str) -> BaseMessage:
+    return messages_from_dict([json.loads(value)])[0]
+
+
+def _input_messages(model_input: Any) -> List[BaseMessage]:
+    if hasattr(model_input, "to_messages"):
+        return model_input.to_messages()
+    return convert_to_messages([model_input] if isinstance(model_input, str) else model_input)
+
+
+def _hit_events(output: Any) -> Tuple[Optional[ChatGenerationChunk], LLMResult]:
+    """Returns the token and the result a cached response is replayed as: its whole text at once."""
+    if not isinstance(output, BaseMessage):
+        # A structured output: no message to stream.
+        return None, LLMResult(generations=[[]])
+    text = output.text()
+    chunk = ChatGenerationChunk(message=AIMessageChunk(content=output.content, id=output.id)) if text else None
+    return chunk, LLMResult(generations=[[ChatGeneration(message=output)]])
+
+
+def structured_codec(schema) -> Tuple[Callable[[Any], str], Callable[[str], Any]]:
+    """Returns how to store and restore the outputs of with_structured_output(schema)."""
+    if isinstance(schema, type) and issubclass(schema, BaseModel):
+        return (lambda output: output.model_dump_json()), schema.model_validate_json
+    return json.dumps, json.loads
+
+
+def schema_description(schema) -> Any:
+    """Returns the JSON-serializable description of an output schema that request keys include."""
+    if isinstance(schema, type) and issubclass(schema, BaseModel):
+        return {"name": schema.__name__, "schema": schema.model_json_schema()}
+    return schema
+
+
+class _CachedRunnable:
+    """A runnable of a chat model (the model itself, its bound tools or its structured output) answered through the cache."""
+
+    def __init__(self, runnable, cache: LLMResponseCache, namespace: str, request: Dict[str, Any],
+                 dump: Callable[[Any], str], load: Callable[[str], Any], cacheable: bool):
+        self.runnable = runnable
+        self.cache = cache
+        self.cache_namespace = namespace
+        self.request = request
+        self.dump = dump
+        self.load = load
+        self.cacheable = cacheable
+
+    def _key(self, model_input: Any, kwargs: Dict[str, Any]) -> str:
+        return self.cache.key({**self.request, "input": serialize_input(model_input), "kwargs": kwargs})
+
+    def _hit_start_args(self, model_input: Any) -> Tuple[dict, List[List[BaseMessage]], dict]:
+        serialized = {"name": self.request["model_class"]}
+        return serialized, [_input_messages(model_input)], {**self.request["params"], CACHE_HIT_PARAM: True}
+
+    def _replay_hit(self, model_input: Any, config, output: Any) -> None:
+        """
+        Reports a cache hit to the callbacks of the run as a model run (with CACHE_HIT_PARAM in its invocation params),
+        so that metering and LangGraph's "messages" stream see it; the cached text comes as a single token.
+        """
+        serialized, messages, invocation_params = self._hit_start_args(model_input)
+        callback_manager = get_callback_manager_for_config(ensure_config(config))
+        run_manager = callback_manager.on_chat_model_start(serialized, messages, invocation_params=invocation_params)[0]
+        chunk, result = _hit_events(output)
+        if chunk is not None:
+            run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+        run_manager.on_llm_end(result)
+
+    async def _areplay_hit(self, model_input: Any, config, output: Any) -> None:
+        """Async version of _replay_hit()."""
+        serialized, messages, invocation_params = self._hit_start_args(model_input)
+        callback_manager = get_async_callback_manager_for_config(ensure_config(config))
+        run_manager = (await callback_manager.on_chat_model_start(serialized, messages,
+                                                                  invocation_params=invocation_params))[0]
+        chunk, result = _hit_events(output)
+        if chunk is not None:
+            await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+        await run_manager.on_llm_end(result)
+
+    def invoke(self, model_input, config=None, **kwargs):
+        if not self.cacheable:
+            return self.runnable.invoke(model_input, config, **kwargs)
+        key = self._key(model_input, kwargs)
+        cached = self.cache.get(self.cache_namespace, key)
+        if cached is not None:
+            output = self.load(cached)
+            self._replay_hit(model_input, config, output)
+            return output
+        output = self.runnable.invoke(model_input, config, **kwargs)
+        self.cache.set(self.cache_namespace, key, self.dump(output))
+        return output
+
+    async def ainvoke(self, model_input, config=None, **kwargs):
+        """Async version of invoke(); the cache lookups are local and stay synchronous."""
+        if not self.cacheable:
+            return await self.runnable.ainvoke(model_input, config, **kwargs)
+        key = self._key(model_input, kwargs)
+        cached = self.cache.get(self.cache_namespace, key)
+        if cached is not None:
+            output = self.load(cached)
+            await self._areplay_hit(model_input, config, output)
+            return output
+        output = await self.runnable.ainvoke(model_input, config, **kwargs)
+        self.cache.set(self.cache_namespace, key, self.dump(output))
+        return output
+
+    def __getattr__(self, name):
+        # Anything else (stream, batch, ...) goes to the wrapped runnable, uncached.
+        if name == "runnable":
+            raise AttributeError(name)
+        return getattr(self.runnable, name)
+
+
+class CachedChatModel(_CachedRunnable):
+    """
+    Chat model wrapper answering temperature-0 calls from an LLMResponseCache.
+
+    invoke()/ainvoke() of the model, of bind_tools() and of with_structured_output() are cached,
+    the tools and the output schema being part of the key; structured outputs are stored as JSON
+    and rebuilt into their schema. Calls at another temperature always go to the model.
+    A hit is still reported to the callbacks of the run as a model run, see _replay_hit().
+    """
+
+    def __init__(self, model, cache: Optional[LLMResponseCache] = None, namespace: str = "default"):
+        """
+        Args:
+            model: Wrapped chat model.
+            cache: Response cache, by default the shared llm_response_cache.
+            namespace: Cache namespace of the responses, invalidated with cache.invalidate(namespace).
+        """
+        params = dict(getattr(model, "_identifying_params", None) or {})
+        request = {"model_class": type(model).__name__, "params": params}
+        super().__init__(model, cache or llm_response_cache, namespace, request, dump_message, load_message,
+                         cacheable=params.get("temperature") == 0)
+        self.model = model
+
+    def bind_tools(self, tools, **kwargs) -> _CachedRunnable:
+        request = {**self.request, "tools": [convert_to_openai_tool(tool) for tool in tools], "bind_kwargs": kwargs}
+        return _CachedRunnable(self.model.bind_tools(tools, **kwargs), self.cache, self.cache_namespace, request,
+                               dump_message, load_message, self.cacheable)
+
+    def with_structured_output(self, schema, **kwargs) -> _CachedRunnable:
+        dump, load = structured_codec(schema)
+        request = {**self.request, "schema": schema_description(schema), "structured_kwargs": kwargs}
+        return _CachedRunnable(self.model.with_structured_output(schema, **kwargs), self.cache, self.cache_namespace,
+                               request, dump, load, self.cacheable and not kwargs.get("include_raw"))
@@ -0,0 +1,434 @@
+import asyncio
+import heapq
+import itertools
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables.config import get_config_list, get_executor_for_config
+from langchain_core.runnables.utils import gather_with_concurrency
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+# Priority classes, served in this order: interactive searches first, background summaries last.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BACKGROUND = 2
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_NORMAL: "normal", PRIORITY_BACKGROUND: "background"}
+
+# Quotas of gemini-2.0-flash on the first paid tier, overridden by the GEMINI_RPM and GEMINI_TPM environment
+# variables (the free tier allows GEMINI_RPM=15 and GEMINI_TPM=1000000).
+DEFAULT_RPM = 2000
+DEFAULT_TPM = 4_000_000
+MAX_RETRIES = 5
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+CHARS_PER_TOKEN = 4
+# Output tokens reserved for a request whose model has no max_output_tokens, until its usage is known.
+OUTPUT_TOKENS_ESTIMATE = 512
+# How often a request waiting behind others checks whether it is its turn.
+POLL_INTERVAL_SECONDS = 0.05
+QUEUE_WAIT_SAMPLES = 1000
+RATE_LIMIT_MARKERS = ("429", "resource_exhausted", "resource exhausted", "rate limit", "quota")
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Tells whether `error` is a quota or overload error of the API (HTTP 429 or 503), worth retrying later."""
+    if getattr(error, "code", None) in (429, 503) or getattr(error, "status_code", None) in (429, 503):
+        return True
+    if type(error).__name__ in ("ResourceExhausted", "TooManyRequests", "ServiceUnavailable"):
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in RATE_LIMIT_MARKERS)
+
+
+class TokenBucket:
+    """Bucket of `capacity` units refilled continuously at `capacity` per `period` seconds. Not thread-safe."""
+
+    def __init__(self, capacity: float, period: float = 60.0):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Returns the seconds until `amount` units are available, 0 if they are."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float, now: float) -> None:
+        # The level may go below 0: a debt paid back by the next refills.
+        self._refill(now)
+        self.level -= amount
+
+    def drain(self, now: float) -> None:
+        self._refill(now)
+        self.level = min(self.level, 0.0)
+
+
+class LLMScheduler:
+    """
+    Process-wide admission control of the chat model requests: token buckets enforce the requests per minute
+    and the tokens per minute, and the waiting requests are served by priority class, first come first served
+    within a class. A rate-limited request (429) drains the request bucket, so that every caller slows down,
+    and is retried with exponential backoff and full jitter. The queue waits are kept per class.
+    Thread-safe, and usable from threads and event loops at the same time.
+    """
+
+    def __init__(self, rpm: float = DEFAULT_RPM, tpm: float = DEFAULT_TPM, max_retries: int = MAX_RETRIES,
+                 backoff_base: float = BACKOFF_BASE_SECONDS, backoff_max: float = BACKOFF_MAX_SECONDS,
+                 seed: Optional[int] = None):
+        """
+        Args:
+            rpm: Maximum number of requests per minute.
+            tpm: Maximum number of tokens (input and output) per minute.
+            max_retries: Number of retries of a rate-limited request.
+            backoff_base: Backoff ceiling of the first retry, in seconds, doubled at each retry.
+            backoff_max: Maximum backoff ceiling, in seconds.
+            seed: Seed of the jitter, for reproducible runs.
+        """
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._requests = TokenBucket(rpm)
+        self._tokens = TokenBucket(tpm)
+        self._queue: List[Tuple[int, int]] = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._rng = random.Random(seed)
+        self._metrics: Dict[int, Dict[str, float]] = {}
+        self._waits: Dict[int, Deque[float]] = {}
+
+    def _class_metrics(self, priority: int) -> Dict[str, float]:
+        if priority not in self._metrics:
+            self._metrics[priority] = {"requests": 0, "queue_wait_s": 0.0, "max_queue_wait_s": 0.0,
+                                       "rate_limited": 0, "retries": 0}
+            self._waits[priority] = deque(maxlen=QUEUE_WAIT_SAMPLES)
+        return self._metrics[priority]
+
+    def _try_acquire(self, ticket: Tuple[int, int], tokens: float, start: float) -> float:
+        """Admits `ticket` if it is first in line and the buckets allow it; otherwise returns the seconds to wait."""
+        if self._queue[0] != ticket:
+            return POLL_INTERVAL_SECONDS
+        now = time.monotonic()
+        delay = max(self._requests.wait_time(1, now), self._tokens.wait_time(tokens, now))
+        if delay > 0:
+            return delay
+        self._requests.take(1, now)
+        self._tokens.take(tokens, now)
+        heapq.heappop(self._queue)
+
+        waited = now - start
+        metrics = self._class_metrics(ticket[0])
+        metrics["requests"] += 1
+        metrics["queue_wait_s"] += waited
+        metrics["max_queue_wait_s"] = max(metrics["max_queue_wait_s"], waited)
+        self._waits[ticket[0]].append(waited)
+        self._condition.notify_all()
+        return 0.0
+
+    def _leave(self, ticket: Tuple[int, int]) -> None:
+        if ticket in self._queue:
+            self._queue.remove(ticket)
+            heapq.heapify(self._queue)
+            self._condition.notify_all()
+
+    def acquire(self, tokens: float, priority: int = PRIORITY_NORMAL) -> None:
+        """Blocks until a request of `tokens` tokens may be sent."""
+        ticket = (priority, next(self._sequence))
+        start = time.monotonic()
+        with self._condition:
+            heapq.heappush(self._queue, ticket)
+            try:
+                while True:
+                    delay = self._try_acquire(ticket, tokens, start)
+                    if delay == 0:
+                        return
+                    self._condition.wait(delay)
+            except BaseException:
+                self._leave(ticket)
+                raise
+
+    async def aacquire(self, tokens: float, priority: int = PRIORITY_NORMAL) -> None:
+        """Async version of acquire(), waiting without blocking the event loop."""
+        ticket = (priority, next(self._sequence))
+        start = time.monotonic()
+        with self._condition:
+            heapq.heappush(self._queue, ticket)
+        try:
+            while True:
+                with self._condition:
+                    delay = self._try_acquire(ticket, tokens, start)
+                if delay == 0:
+                    return
+                await asyncio.sleep(delay)
+        except BaseException:
+            with self._condition:
+                self._leave(ticket)
+            raise
+
+    def settle(self, estimated_tokens: float, used_tokens: Optional[float]) -> None:
+        """Charges the tokens a request really used instead of its estimate, once known."""
+        if used_tokens is None:
+            return
+        with self._condition:
+            self._tokens.take(used_tokens - estimated_tokens, time.monotonic())
+
+    def _rate_limited(self, priority: int) -> None:
+        with self._condition:
+            self._requests.drain(time.monotonic())
+            metrics = self._class_metrics(priority)
+            metrics["rate_limited"] += 1
+            metrics["retries"] += 1
+
+    def backoff(self, attempt: int) -> float:
+        """Returns the delay before retry number `attempt` (from 0): full jitter under an exponential ceiling."""
+        return self._rng.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _should_retry(self, error: Exception, attempt: int, priority: int) -> Optional[float]:
+        if attempt >= self.max_retries or not is_rate_limit_error(error):
+            return None
+        self._rate_limited(priority)
+        delay = self.backoff(attempt)
+        print(f"--- LLM request rate limited ({type(error).__name__}), retry {attempt + 1}/{self.max_retries} "
+              f"in {delay:.1f}s ---")
+        return delay
+
+    def call(self, request: Callable[[], Any], tokens: float, priority: int = PRIORITY_NORMAL,
+             used_tokens: Callable[[Any], Optional[float]] = lambda output: None) -> Any:
+        """
+        Sends `request()` when the quotas and the requests of higher priority allow it, retrying it when rate limited.
+
+        Args:
+            request: Sends the request and returns its output.
+            tokens: Estimated tokens of the request, input and output.
+            priority: Priority class, PRIORITY_INTERACTIVE first.
+            used_tokens: Returns the tokens really used according to the output, None if unknown.
+        """
+        for attempt in itertools.count():
+            self.acquire(tokens, priority)
+            try:
+                output = request()
+            except Exception as e:
+                delay = self._should_retry(e, attempt, priority)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            self.settle(tokens, used_tokens(output))
+            return output
+
+    async def acall(self, request: Callable[[], Awaitable[Any]], tokens: float, priority: int = PRIORITY_NORMAL,
+                    used_tokens: Callable[[Any], Optional[float]] = lambda output: None) -> Any:
+        """Async version of call(); `request` returns an awaitable."""
+        for attempt in itertools.count():
+            await self.aacquire(tokens, priority)
+            try:
+                output = await request()
+            except Exception as e:
+                delay = self._should_retry(e, attempt, priority)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            self.settle(tokens, used_tokens(output))
+            return output
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the queue-wait metrics of each priority class and the current queue length."""
+        with self._condition:
+            classes = {}
+            for priority, metrics in sorted(self._metrics.items()):
+                waits = sorted(self._waits[priority])
+                requests = metrics["requests"]
+                classes[PRIORITY_NAMES.get(priority, str(priority))] = {
+                    "requests": requests,
+                    "mean_queue_wait_s": round(metrics["queue_wait_s"] / requests, 4) if requests else 0.0,
+                    "p95_queue_wait_s": round(waits[math.ceil(0.95 * len(waits)) - 1], 4) if waits else 0.0,
+                    "max_queue_wait_s": round(metrics["max_queue_wait_s"], 4),
+                    "rate_limited": metrics["rate_limited"],
+                    "retries": metrics["retries"],
+                }
+            return {"rpm": self.rpm, "tpm": self.tpm, "queued": len(self._queue), "classes": classes}
+
+
+_llm_scheduler: Optional[LLMScheduler] = None
+_llm_scheduler_lock = threading.Lock()
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """
+    Returns the scheduler shared by every chat model of the process, creating it on first use.
+    Its quotas are the GEMINI_RPM and GEMINI_TPM environment variables, DEFAULT_RPM and DEFAULT_TPM if unset:
+    set them to the quotas of your API key (e.g. GEMINI_RPM=15 on the free tier), or call configure_llm_scheduler().
+    """
+    global _llm_scheduler
+    with _llm_scheduler_lock:
+        if _llm_scheduler is None:
+            _llm_scheduler = LLMScheduler(rpm=float(os.getenv("GEMINI_RPM", DEFAULT_RPM)),
+                                          tpm=float(os.getenv("GEMINI_TPM", DEFAULT_TPM)))
+            print(f"--- LLM scheduler: {_llm_scheduler.rpm:g} requests and {_llm_scheduler.tpm:g} tokens per minute "
+                  f"(GEMINI_RPM, GEMINI_TPM) ---")
+        return _llm_scheduler
+
+
+def configure_llm_scheduler(**kwargs) -> LLMScheduler:
+    """Replaces the shared scheduler by one built with `kwargs` (see LLMScheduler) and returns it."""
+    global _llm_scheduler
+    with _llm_scheduler_lock:
+        _llm_scheduler = LLMScheduler(**kwargs)
+        return _llm_scheduler
+
+
+def estimate_tokens(model_input: Any, extra_chars: int = 0) -> int:
+    """Rough token count of a model input (about 4 characters per token)."""
+    if isinstance(model_input, list):
+        chars = sum(len(str(message.content)) if isinstance(message, BaseMessage) else len(str(message))
+                    for message in model_input)
+    else:
+        chars = len(str(model_input))
+    return (chars + extra_chars) // CHARS_PER_TOKEN
+
+
+def _used_tokens(output: Any) -> Optional[float]:
+    usage = getattr(output, "usage_metadata", None)
+    return usage.get("total_tokens") if usage else None
+
+
+class _ScheduledRunnable:
+    """A runnable of a chat model (the model itself, its bound tools or its structured output) sent through the scheduler."""
+
+    def __init__(self, runnable, scheduler: Optional[LLMScheduler], priority: int, output_tokens: int,
+                 extra_chars: int = 0):
+        self.runnable = runnable
+        self._scheduler = scheduler
+        self.priority = priority
+        self.output_tokens = output_tokens
+        self.extra_chars = extra_chars
+
+    @property
+    def scheduler(self) -> LLMScheduler:
+        # Resolved at call time, so that configure_llm_scheduler() also applies to the existing models.
+        return self._scheduler or get_llm_scheduler()
+
+    def _tokens(self, model_input: Any) -> int:
+        return estimate_tokens(model_input, self.extra_chars) + self.output_tokens
+
+    def invoke(self, model_input, config=None, **kwargs):
+        return self.scheduler.call(lambda: self.runnable.invoke(model_input, config, **kwargs),
+                                   self._tokens(model_input), self.priority, _used_tokens)
+
+    async def ainvoke(self, model_input, config=None, **kwargs):
+        return await self.scheduler.acall(lambda: self.runnable.ainvoke(model_input, config, **kwargs),
+                                          self._tokens(model_input), self.priority, _used_tokens)
+
+    def stream(self, model_input, config=None, **kwargs):
+        """Streams once admitted; a stream is not retried, since its first chunks are already delivered."""
+        scheduler = self.scheduler
+        tokens = self._tokens(model_input)
+        scheduler.acquire(tokens, self.priority)
+        used_tokens = None
+        try:
+            for chunk in self.runnable.stream(model_input, config, **kwargs):
+                used_tokens = _used_tokens(chunk) or used_tokens
+                yield chunk
+        finally:
+            # Also when the consumer stops early or the stream fails, with the usage reported so far.
+            scheduler.settle(tokens, used_tokens)
+
+    async def astream(self, model_input, config=None, **kwargs):
+        """Async version of stream()."""
+        scheduler = self.scheduler
+        tokens = self._tokens(model_input)
+        await scheduler.aacquire(tokens, self.priority)
+        used_tokens = None
+        try:
+            async for chunk in self.runnable.astream(model_input, config, **kwargs):
+                used_tokens = _used_tokens(chunk) or used_tokens
+                yield chunk
+        finally:
+            scheduler.settle(tokens, used_tokens)
+
+    def batch(self, inputs, config=None, *, return_exceptions: bool = False, **kwargs):
+        """Sends every input as its own scheduled request, in parallel up to the max_concurrency of the config."""
+        if not inputs:
+            return []
+        configs = get_config_list(config, len(inputs))
+
+        def invoke(model_input, config):
+            try:
+                return self.invoke(model_input, config, **kwargs)
+            except Exception as e:
+                if return_exceptions:
+                    return e
+                raise
+        with get_executor_for_config(configs[0]) as executor:
+            return list(executor.map(invoke, inputs, configs))
+
+    async def abatch(self, inputs, config=None, *, return_exceptions: bool = False, **kwargs):
+        """Async version of batch()."""
+        if not inputs:
+            return []
+        configs = get_config_list(config, len(inputs))
+
+        async def ainvoke(model_input, config):
+            try:
+                return await self.ainvoke(model_input, config, **kwargs)
+            except Exception as e:
+                if return_exceptions:
+                    return e
+                raise
+        return await gather_with_concurrency(configs[0].get("max_concurrency"),
+                                             *(ainvoke(model_input, config) for model_input, config in zip(inputs, configs)))
+
+    def __getattr__(self, name):
+        # Anything else (with_config, transform, ...) goes to the wrapped runnable, unscheduled.
+        if name == "runnable":
+            raise AttributeError(name)
+        return getattr(self.runnable, name)
+
+
+class ScheduledChatModel(_ScheduledRunnable):
+    """
+    Chat model wrapper sending its requests through an LLMScheduler, in a priority class.
+
+    invoke()/ainvoke()/stream()/astream()/batch()/abatch() of the model, of bind_tools() and of with_structured_output() are scheduled;
+    a request reserves its estimated input tokens plus the model's max_output_tokens, then is charged
+    its real usage when the response reports it.
+    """
+
+    def __init__(self, model, scheduler: Optional[LLMScheduler] = None, priority: int = PRIORITY_NORMAL):
+        """
+        Args:
+            model: Wrapped chat model.
+            scheduler: Scheduler of the requests, by default the shared one of get_llm_scheduler().
+            priority: Priority class of the requests, e.g. PRIORITY_INTERACTIVE or PRIORITY_BACKGROUND.
+        """
+        output_tokens = getattr(model, "max_output_tokens", None) or OUTPUT_TOKENS_ESTIMATE
+        super().__init__(model, scheduler, priority, output_tokens)
+        self.model = model
+
+    def with_priority(self, priority: int) -> "ScheduledChatModel":
+        """Returns the same model in another priority class."""
+        return ScheduledChatModel(self.model, self._scheduler, priority)
+
+    def bind_tools(self, tools, **kwargs) -> _ScheduledRunnable:
+        tool_chars = len(json.dumps([convert_to_openai_tool(tool) for tool in tools]))
+        return _ScheduledRunnable(self.model.bind_tools(tools, **kwargs), self._scheduler, self.priority,
+                                  self.output_tokens, tool_chars)
+
+    def with_structured_output(self, schema, **kwargs) -> _ScheduledRunnable:
+        return _ScheduledRunnable(self.model.with_structured_output(schema, **kwargs), self._scheduler, self.priority,
+                                  self.output_tokens, len(json.dumps(convert_to_openai_tool(schema))))
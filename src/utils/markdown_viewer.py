@@ -1,23 +1,31 @@
 import tkinter as tk
 from tkinter import scrolledtext, font, simpledialog, messagebox
 import re
+import time
+
+# Minimum delay between two renderings of a streamed text, which is redrawn entirely each time.
+RENDER_INTERVAL_SECONDS = 0.1
 
 class MarkdownViewerApp:
     """
     Tkinter application for displaying Markdown text in a basic way
     and allowing validation or sending a remark.
     """
-    def __init__(self, markdown_text, agent_name = "Agent"):
+    def __init__(self, markdown_text, agent_name = "Agent", streaming = False):
         """
         Initialize the application.
 
         Args:
-            root: The main Tkinter window (tk.Tk()).
             markdown_text: The string containing the Markdown text.
+            agent_name: Name of the agent shown above the text.
+            streaming: If True, the window opens right away and the text arrives with append_text();
+                the Save button is enabled by finish().
         """
         self.root = tk.Tk()
         self.markdown_text = markdown_text
         self.remark_sent = None
+        self.closed = False
+        self._last_render = 0.0
 
         self.root.title("Markdown Viewer and Validation")
         self.root.geometry("1400x800")
@@ -98,6 +106,10 @@ class MarkdownViewerApp:
             width=20
         )
         self.save_button.pack(side=tk.TOP, pady=10)
+        if streaming:
+            self.save_button.config(state=tk.DISABLED)
+            self.root.protocol("WM_DELETE_WINDOW", self.close)
+            self.root.update()
 
     def configure_tags(self):
         """Configure Tkinter tags to simulate Markdown formatting."""
@@ -185,6 +197,31 @@ class MarkdownViewerApp:
         apply_tag_around_markers(r"(?<![\*_])(?:\*|_)(.+?)(?:\*|_)(?![\*_])", "italic")
 
 
+    def append_text(self, chunk):
+        """Appends a streamed chunk to the Markdown text and refreshes the window, without blocking."""
+        self.markdown_text += chunk
+        if self.closed:
+            return
+        now = time.monotonic()
+        if now - self._last_render >= RENDER_INTERVAL_SECONDS:
+            self.display_markdown(self.markdown_text)
+            self._last_render = now
+        self.root.update()
+
+    def finish(self, markdown_text=None):
+        """Displays the complete text (by default the streamed one) and enables the Save button."""
+        if markdown_text is not None:
+            self.markdown_text = markdown_text
+        if self.closed:
+            return
+        self.display_markdown(self.markdown_text)
+        self.save_button.config(state=tk.NORMAL)
+
+    def close(self):
+        """Closes the window; a closed window ignores the chunks still streamed to it."""
+        self.closed = True
+        self.root.destroy()
+
     def save_text(self):
         """Action when the 'Save' button is clicked."""
         remark_text = self.text_remark.get("1.0", tk.END).strip()
@@ -197,7 +234,8 @@ class MarkdownViewerApp:
         self.root.destroy()
 
     def get_remark(self):
-        self.root.mainloop()
+        if not self.closed:
+            self.root.mainloop()
         return self.remark_sent
 
 if __name__ == "__main__":
@@ -0,0 +1,99 @@
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from src.utils.hedging import HedgedChatModel
+from src.utils.llm_cache import CachedChatModel
+from src.utils.llm_scheduler import PRIORITY_NORMAL, ScheduledChatModel
+
+DEFAULT_MODEL = "gemini-2.0-flash"
+
+_chat_models: Dict[Tuple, ChatGoogleGenerativeAI] = {}
+_scheduled_chat_models: Dict[Tuple, ScheduledChatModel] = {}
+_cached_chat_models: Dict[Tuple, CachedChatModel] = {}
+_hedged_chat_models: Dict[Tuple, HedgedChatModel] = {}
+_chat_models_lock = threading.Lock()
+_env_loaded = False
+
+
+def _load_env() -> None:
+    global _env_loaded
+    if not _env_loaded:
+        load_dotenv()
+        _env_loaded = True
+
+
+def get_chat_model(model: str = DEFAULT_MODEL, temperature: float = 0, max_output_tokens: Optional[int] = None,
+                   cache_namespace: Optional[str] = None, priority: Optional[int] = PRIORITY_NORMAL,
+                   hedge: bool = False, **kwargs):
+    """
+    Returns the process-wide chat model of a configuration, creating it on first use.
+    The .env file is loaded once, and every caller of the same configuration shares one client,
+    so its credentials and connections are set up once and stay warm. The clients are thread-safe.
+
+    Args:
+        model: Gemini model name.
+        temperature: Sampling temperature.
+        max_output_tokens: Maximum number of tokens of a response, None for the model default.
+        cache_namespace: If set, the shared client is wrapped in a CachedChatModel answering the temperature-0
+            calls from the shared llm_response_cache, in this namespace.
+        priority: Priority class of the requests in the shared LLMScheduler (e.g. PRIORITY_INTERACTIVE),
+            which enforces the RPM and TPM quotas of all the clients; None to send them unscheduled.
+        hedge: If True, the scheduled client is wrapped in a HedgedChatModel, with one HedgePolicy per configuration:
+            slow requests are duplicated within a budget, and the calls honour the run deadline of with_deadline().
+        kwargs: Other arguments given to ChatGoogleGenerativeAI; their values must be hashable.
+    """
+    key = (model, temperature, max_output_tokens, tuple(sorted(kwargs.items())))
+    if cache_namespace is not None:
+        # Cache hits are answered before the scheduler and do not use the quotas.
+        chat_model = get_chat_model(model, temperature, max_output_tokens, priority=priority, hedge=hedge, **kwargs)
+        with _chat_models_lock:
+            cached_chat_model = _cached_chat_models.get((key, cache_namespace, priority, hedge))
+            if cached_chat_model is None:
+                cached_chat_model = CachedChatModel(chat_model, namespace=cache_namespace)
+                _cached_chat_models[(key, cache_namespace, priority, hedge)] = cached_chat_model
+            return cached_chat_model
+
+    if hedge:
+        # The duplicates go through the scheduler too, so that they count against the quotas.
+        chat_model = get_chat_model(model, temperature, max_output_tokens, priority=priority, **kwargs)
+        with _chat_models_lock:
+            hedged_chat_model = _hedged_chat_models.get((key, priority))
+            if hedged_chat_model is None:
+                hedged_chat_model = HedgedChatModel(chat_model)
+                _hedged_chat_models[(key, priority)] = hedged_chat_model
+            return hedged_chat_model
+
+    if priority is not None:
+        chat_model = get_chat_model(model, temperature, max_output_tokens, priority=None, **kwargs)
+        with _chat_models_lock:
+            scheduled_chat_model = _scheduled_chat_models.get((key, priority))
+            if scheduled_chat_model is None:
+                scheduled_chat_model = ScheduledChatModel(chat_model, priority=priority)
+                _scheduled_chat_models[(key, priority)] = scheduled_chat_model
+            return scheduled_chat_model
+
+    with _chat_models_lock:
+        chat_model = _chat_models.get(key)
+        if chat_model is None:
+            _load_env()
+            if not os.getenv("GOOGLE_API_KEY"):
+                print("Error: The GOOGLE_API_KEY environment variable is not defined.")
+            if max_output_tokens is not None:
+                kwargs["max_output_tokens"] = max_output_tokens
+            chat_model = ChatGoogleGenerativeAI(model=model, temperature=temperature,
+                                                google_api_key=os.getenv("GOOGLE_API_KEY"), **kwargs)
+            _chat_models[key] = chat_model
+        return chat_model
+
+
+def clear_chat_models() -> None:
+    """Forgets the shared chat models, e.g. after the credentials changed; the next calls build new ones."""
+    with _chat_models_lock:
+        _chat_models.clear()
+        _scheduled_chat_models.clear()
+        _cached_chat_models.clear()
+        _hedged_chat_models.clear()
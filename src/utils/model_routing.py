@@ -0,0 +1,306 @@
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, NamedTuple, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables.config import ensure_config, merge_configs
+
+from src.utils.llm_cache import CACHE_HIT_PARAM
+from src.utils.llm_scheduler import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, PRIORITY_NORMAL
+from src.utils.model_registry import get_chat_model
+
+# Node types, each sent to the model profile it is routed to.
+ROUTE_ARCHITECT = "architect"
+ROUTE_REVIEWER = "reviewer"
+ROUTE_GDPR = "gdpr"
+ROUTE_SECURITY = "security"
+ROUTE_DECOMPOSER = "decomposer"
+ROUTE_RESEARCHER = "researcher"
+ROUTE_SUMMARY = "summary"
+ROUTES = (ROUTE_ARCHITECT, ROUTE_REVIEWER, ROUTE_GDPR, ROUTE_SECURITY, ROUTE_DECOMPOSER, ROUTE_RESEARCHER, ROUTE_SUMMARY)
+
+# A search holds up the agent waiting for it, and a summary holds up nobody.
+ROUTE_PRIORITIES = {ROUTE_DECOMPOSER: PRIORITY_INTERACTIVE, ROUTE_RESEARCHER: PRIORITY_INTERACTIVE,
+                    ROUTE_SUMMARY: PRIORITY_BACKGROUND}
+LATENCY_SAMPLES = 1000
+
+
+class ModelProfile(NamedTuple):
+    model: str
+    max_output_tokens: Optional[int] = None
+    temperature: float = 0
+    # Prices in USD per million tokens, for the cost counters.
+    input_cost_per_mtok: float = 0.0
+    output_cost_per_mtok: float = 0.0
+
+
+DEFAULT_PROFILES = {
+    "strong": ModelProfile("gemini-2.0-flash", 4000, input_cost_per_mtok=0.10, output_cost_per_mtok=0.40),
+    "fast": ModelProfile("gemini-2.0-flash-lite", 2048, input_cost_per_mtok=0.075, output_cost_per_mtok=0.30),
+    "brief": ModelProfile("gemini-2.0-flash-lite", 512, input_cost_per_mtok=0.075, output_cost_per_mtok=0.30),
+}
+# Manifests and research answers get the strong model; reviews, decompositions and summaries, which are
+# closer to classification, the cheaper and faster one. Overridden by the MODEL_ROUTES environment
+# variable, e.g. MODEL_ROUTES="reviewer=strong,summary=fast", or by configure_model_routing().
+DEFAULT_ROUTES = {
+    ROUTE_ARCHITECT: "strong",
+    ROUTE_GDPR: "strong",
+    ROUTE_SECURITY: "strong",
+    ROUTE_RESEARCHER: "strong",
+    ROUTE_REVIEWER: "fast",
+    ROUTE_DECOMPOSER: "fast",
+    ROUTE_SUMMARY: "brief",
+}
+
+_profiles: Dict[str, ModelProfile] = dict(DEFAULT_PROFILES)
+_routes: Optional[Dict[str, str]] = None
+_routed_models: Dict[Tuple, "RoutedChatModel"] = {}
+_route_metrics: Dict[str, "RouteMetrics"] = {}
+_routing_lock = threading.Lock()
+
+
+def _env_routes() -> Dict[str, str]:
+    routes = {}
+    for item in os.getenv("MODEL_ROUTES", "").split(","):
+        if "=" in item:
+            route, profile = item.split("=", 1)
+            routes[route.strip()] = profile.strip()
+    return routes
+
+
+def route_profile(route: str) -> Tuple[str, ModelProfile]:
+    """Returns the name and the profile of the model `route` is sent to."""
+    global _routes
+    if route not in ROUTES:
+        raise ValueError(f"Unknown route: {route}")
+    with _routing_lock:
+        if _routes is None:
+            _routes = {**DEFAULT_ROUTES, **_env_routes()}
+        name = _routes[route]
+        if name not in _profiles:
+            raise ValueError(f"Route {route} goes to the unknown model profile {name}")
+        return name, _profiles[name]
+
+
+def configure_model_routing(routes: Optional[Dict[str, str]] = None,
+                            profiles: Optional[Dict[str, ModelProfile]] = None) -> None:
+    """
+    Changes the routing; the models returned by get_routed_model() afterwards follow it.
+
+    Args:
+        routes: Profile name of some routes, e.g. {"reviewer": "strong"}; the others keep theirs.
+        profiles: Profiles added or replaced, by name.
+    """
+    global _routes
+    with _routing_lock:
+        _profiles.update(profiles or {})
+        _routes = {**DEFAULT_ROUTES, **_env_routes(), **(_routes or {}), **(routes or {})}
+        _routed_models.clear()
+
+
+class RouteMetrics:
+    """
+    Calls, errors, latencies, tokens and cost of the model calls of a route. Thread-safe.
+    The responses served by the response cache are only counted in `cache_hits`: they cost nothing
+    and their latency is not the model's.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cost_usd = 0.0
+        self.models = set()
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self._lock = threading.Lock()
+
+    def record(self, profile: ModelProfile, latency: float, input_tokens: int, output_tokens: int) -> None:
+        with self._lock:
+            self.calls += 1
+            self.models.add(profile.model)
+            self.latencies.append(latency)
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+            self.cost_usd += (input_tokens * profile.input_cost_per_mtok
+                              + output_tokens * profile.output_cost_per_mtok) / 1_000_000
+
+    def record_error(self) -> None:
+        with self._lock:
+            self.errors += 1
+
+    def record_cache_hit(self) -> None:
+        with self._lock:
+            self.cache_hits += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            ordered = sorted(self.latencies)
+            return {
+                "models": sorted(self.models),
+                "calls": self.calls,
+                "errors": self.errors,
+                "cache_hits": self.cache_hits,
+                "mean_latency_s": round(sum(ordered) / len(ordered), 3) if ordered else 0.0,
+                "p95_latency_s": round(ordered[max(0, math.ceil(len(ordered) * 0.95) - 1)], 3) if ordered else 0.0,
+                "input_tokens": self.input_tokens,
+                "output_tokens": self.output_tokens,
+                "cost_usd": round(self.cost_usd, 6),
+            }
+
+
+def route_metrics(route: str) -> RouteMetrics:
+    with _routing_lock:
+        metrics = _route_metrics.get(route)
+        if metrics is None:
+            metrics = _route_metrics[route] = RouteMetrics()
+        return metrics
+
+
+def route_stats() -> Dict[str, Dict[str, Any]]:
+    """Returns the counters of every route called so far, to tune the routing."""
+    with _routing_lock:
+        metrics = dict(_route_metrics)
+    return {route: route_metric.stats() for route, route_metric in metrics.items()}
+
+
+def reset_route_stats() -> None:
+    with _routing_lock:
+        _route_metrics.clear()
+        # The routed models hold their metrics, so they are rebuilt with the new ones.
+        _routed_models.clear()
+
+
+class _RouteCallback(BaseCallbackHandler):
+    """Records in the metrics of a route the latency and the token usage of each model call, and the cache hits."""
+
+    def __init__(self, metrics: RouteMetrics, profile: ModelProfile):
+        self.metrics = metrics
+        self.profile = profile
+        self._starts = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id, invocation_params: Optional[dict]) -> None:
+        cache_hit = bool((invocation_params or {}).get(CACHE_HIT_PARAM))
+        with self._lock:
+            self._starts[run_id] = (time.perf_counter(), cache_hit)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, invocation_params=None, **kwargs):
+        self._start(run_id, invocation_params)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, invocation_params=None, **kwargs):
+        self._start(run_id, invocation_params)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        end = time.perf_counter()
+        with self._lock:
+            start, cache_hit = self._starts.pop(run_id, (None, False))
+        if start is None:
+            return
+        if cache_hit:
+            self.metrics.record_cache_hit()
+            return
+        input_tokens = output_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+        self.metrics.record(self.profile, end - start, input_tokens, output_tokens)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._starts.pop(run_id, None)
+        self.metrics.record_error()
+
+
+class _RoutedRunnable:
+    """A runnable of a routed chat model (the model itself, its bound tools or its structured output), metered."""
+
+    def __init__(self, runnable, callback: _RouteCallback):
+        self.runnable = runnable
+        self.callback = callback
+
+    def _config(self, config):
+        # Added to the callbacks of the run, so that the LangGraph ones (streaming, tracing) still see the call.
+        return merge_configs(ensure_config(config), {"callbacks": [self.callback]})
+
+    def invoke(self, model_input, config=None, **kwargs):
+        return self.runnable.invoke(model_input, self._config(config), **kwargs)
+
+    async def ainvoke(self, model_input, config=None, **kwargs):
+        return await self.runnable.ainvoke(model_input, self._config(config), **kwargs)
+
+    def stream(self, model_input, config=None, **kwargs):
+        yield from self.runnable.stream(model_input, self._config(config), **kwargs)
+
+    def __getattr__(self, name):
+        # Anything else (batch, astream, ...) goes to the wrapped runnable, unmetered.
+        if name == "runnable":
+            raise AttributeError(name)
+        return getattr(self.runnable, name)
+
+
+class RoutedChatModel(_RoutedRunnable):
+    """
+    Chat model of a route, counting the latency, tokens and cost of its calls, including those of its
+    bind_tools() and with_structured_output() runnables, in route_stats(); the response cache hits are counted apart.
+    """
+
+    def __init__(self, model, route: str, profile: ModelProfile):
+        """
+        Args:
+            model: Wrapped chat model, of the profile of the route.
+            route: Route of the model, e.g. ROUTE_REVIEWER.
+            profile: Profile of the model, which prices its tokens.
+        """
+        super().__init__(model, _RouteCallback(route_metrics(route), profile))
+        self.model = model
+        self.route = route
+        self.profile = profile
+
+    def bind_tools(self, tools, **kwargs) -> _RoutedRunnable:
+        return _RoutedRunnable(self.model.bind_tools(tools, **kwargs), self.callback)
+
+    def with_structured_output(self, schema, **kwargs) -> _RoutedRunnable:
+        return _RoutedRunnable(self.model.with_structured_output(schema, **kwargs), self.callback)
+
+
+def _response_cache_enabled() -> bool:
+    return os.getenv("LLM_CACHE", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def get_routed_model(route: str, cache_namespace: Optional[str] = None, cache: bool = True,
+                     hedge: bool = True) -> RoutedChatModel:
+    """
+    Returns the process-wide chat model of a node type: the shared client of get_chat_model() for the profile
+    the route is sent to, in the priority class of the route, metered in route_stats().
+    Its temperature-0 calls are answered from the response cache, unless `cache` is False or the LLM_CACHE
+    environment variable is 0, and the other calls are hedged and honour the run deadline (see get_chat_model()).
+
+    Args:
+        route: Node type, one of ROUTES.
+        cache_namespace: Namespace of the cached responses, by default the route.
+        cache: If False, every call goes to the model.
+        hedge: If False, the calls are neither hedged nor bound by the run deadline.
+    """
+    profile_name, profile = route_profile(route)
+    if cache and _response_cache_enabled():
+        cache_namespace = cache_namespace or route
+    else:
+        cache_namespace = None
+    key = (route, profile_name, cache_namespace, hedge)
+    with _routing_lock:
+        routed_model = _routed_models.get(key)
+    if routed_model is None:
+        chat_model = get_chat_model(profile.model, profile.temperature, profile.max_output_tokens,
+                                    cache_namespace=cache_namespace,
+                                    priority=ROUTE_PRIORITIES.get(route, PRIORITY_NORMAL), hedge=hedge)
+        routed_model = RoutedChatModel(chat_model, route, profile)
+        with _routing_lock:
+            routed_model = _routed_models.setdefault(key, routed_model)
+    return routed_model
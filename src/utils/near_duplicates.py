@@ -0,0 +1,91 @@
+import re
+import threading
+from typing import List, Optional, Tuple
+
+import xxhash
+
+SHINGLE_SIZE = 3
+MAX_HAMMING_DISTANCE = 3
+# Shorter paragraphs (titles, menu entries, ...) are too short for a meaningful fingerprint and are always kept.
+MIN_PARAGRAPH_CHARS = 80
+
+
+def simhash(text: str, shingle_size: int = SHINGLE_SIZE) -> int:
+    """Returns the 64-bit SimHash of the word shingles of `text`."""
+    words = re.findall(r"\w+", text.casefold())
+    shingles = [" ".join(words[i:i + shingle_size]) for i in range(max(1, len(words) - shingle_size + 1))]
+    weights = [0] * 64
+    for shingle in shingles:
+        value = xxhash.xxh64_intdigest(shingle)
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class NearDuplicateFilter:
+    """
+    Removes paragraphs that are near-duplicates of a paragraph already seen by this filter.
+
+    Every line of the filtered texts is a paragraph, fingerprinted with a SimHash of its word shingles;
+    two paragraphs whose fingerprints differ by at most `max_distance` bits are duplicates.
+    Meant to live as long as one query, so that mirrored or syndicated pages are collapsed. Thread-safe.
+    """
+
+    def __init__(self, max_distance: int = MAX_HAMMING_DISTANCE, min_paragraph_chars: int = MIN_PARAGRAPH_CHARS):
+        self.max_distance = max_distance
+        self.min_paragraph_chars = min_paragraph_chars
+        self.saved_chars = 0
+        self._fingerprints: List[int] = []
+        self._lock = threading.Lock()
+
+    def _is_duplicate(self, fingerprint: int, batch: List[int] = ()) -> bool:
+        return any(hamming_distance(fingerprint, seen) <= self.max_distance
+                   for seen in (*self._fingerprints, *batch))
+
+    def check(self, text: str, batch: Optional[List[int]] = None) -> Tuple[str, int]:
+        """
+        Returns `text` without the paragraphs that duplicate a remembered paragraph, or a paragraph of `batch`,
+        and the number of characters removed. The fingerprints of the kept paragraphs are added to `batch`,
+        not remembered: call remember() with the text that is finally used.
+        """
+        batch = batch if batch is not None else []
+        kept = []
+        removed_chars = 0
+        with self._lock:
+            for paragraph in text.splitlines():
+                if len(paragraph) < self.min_paragraph_chars:
+                    kept.append(paragraph)
+                    continue
+                fingerprint = simhash(paragraph)
+                if self._is_duplicate(fingerprint, batch):
+                    removed_chars += len(paragraph) + 1
+                    continue
+                batch.append(fingerprint)
+                kept.append(paragraph)
+            self.saved_chars += removed_chars
+        return "\n".join(kept), removed_chars
+
+    def remember(self, text: str) -> None:
+        """Remembers the paragraphs of `text`, so that later texts repeating them are filtered."""
+        with self._lock:
+            for paragraph in text.splitlines():
+                if len(paragraph) < self.min_paragraph_chars:
+                    continue
+                fingerprint = simhash(paragraph)
+                if not self._is_duplicate(fingerprint):
+                    self._fingerprints.append(fingerprint)
+
+    def filter(self, text: str) -> Tuple[str, int]:
+        """Returns `text` without its near-duplicate paragraphs, and the number of characters removed; remembers the rest."""
+        text, removed_chars = self.check(text)
+        self.remember(text)
+        return text, removed_chars
+
+    def reset(self) -> None:
+        with self._lock:
+            self._fingerprints.clear()
+            self.saved_chars = 0
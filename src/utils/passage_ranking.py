@@ -0,0 +1,113 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+PASSAGE_TARGET_CHARS = 600
+OMISSION_MARKER = "[...]"
+
+
+def tokenize(text: str) -> List[str]:
+    return re.findall(r"\w+", text.casefold())
+
+
+def split_passages(text: str, target_chars: int = PASSAGE_TARGET_CHARS) -> List[str]:
+    """
+    Splits `text` into passages of about `target_chars` characters.
+    Consecutive short lines are grouped, and lines longer than the target are split at sentence ends
+    (sentences longer than the target are cut).
+    """
+    pieces = []
+    for line in text.splitlines():
+        line = line.strip()
+        if len(line) <= target_chars:
+            if line:
+                pieces.append(line)
+            continue
+        sentences = []
+        for sentence in re.split(r"(?<=[.!?])\s+", line):
+            sentences.extend(sentence[i:i + target_chars] for i in range(0, len(sentence), target_chars))
+        current = ""
+        for sentence in sentences:
+            if current and len(current) + len(sentence) + 1 > target_chars:
+                pieces.append(current)
+                current = ""
+            current = f"{current} {sentence}" if current else sentence
+        if current:
+            pieces.append(current)
+
+    passages = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 1 > target_chars:
+            passages.append(current)
+            current = ""
+        current = f"{current}\n{piece}" if current else piece
+    if current:
+        passages.append(current)
+    return passages
+
+
+def bm25_scores(passages: List[str], query: str, k1: float = 1.5, b: float = 0.75) -> List[float]:
+    """Returns the Okapi BM25 score of every passage against `query`, the passages being the corpus."""
+    tokenized = [tokenize(passage) for passage in passages]
+    if not tokenized:
+        return []
+    average_length = sum(len(tokens) for tokens in tokenized) / len(tokenized) or 1.0
+    document_frequency = Counter(term for tokens in tokenized for term in set(tokens))
+    query_terms = set(tokenize(query))
+    idf = {
+        term: math.log(1 + (len(tokenized) - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+        for term in query_terms
+    }
+
+    scores = []
+    for tokens in tokenized:
+        term_frequency = Counter(tokens)
+        score = 0.0
+        for term in query_terms:
+            frequency = term_frequency.get(term, 0)
+            if frequency:
+                score += idf[term] * frequency * (k1 + 1) / (frequency + k1 * (1 - b + b * len(tokens) / average_length))
+        scores.append(score)
+    return scores
+
+
+def select_passages(contents: Dict[str, str], query: str, budget_chars: int) -> Tuple[Dict[str, str], int]:
+    """
+    Keeps the passages of `contents` (text per URL) that best match `query` within `budget_chars`.
+
+    Passages of all pages are ranked together with BM25 and packed greedily, best first.
+    The kept passages of a page stay in their original order, gaps being marked with "[...]".
+    Returns the selected text per URL (pages without any kept passage are left out)
+    and the number of characters omitted.
+    """
+    candidates = [(url, passage) for url, text in contents.items() for passage in split_passages(text)]
+    scores = bm25_scores([passage for _, passage in candidates], query)
+    # Ties, including an empty query, keep the reading order, so this degrades to head truncation.
+    ranking = sorted(range(len(candidates)), key=lambda i: -scores[i])
+
+    kept = set()
+    used = 0
+    for i in ranking:
+        length = len(candidates[i][1]) + len(OMISSION_MARKER) + 2
+        if used + length > budget_chars:
+            continue
+        kept.add(i)
+        used += length
+
+    selected = {}
+    for url in contents:
+        parts = []
+        for i, (candidate_url, passage) in enumerate(candidates):
+            if candidate_url != url:
+                continue
+            if i in kept:
+                parts.append(passage)
+            elif not parts or parts[-1] != OMISSION_MARKER:
+                parts.append(OMISSION_MARKER)
+        if any(part != OMISSION_MARKER for part in parts):
+            selected[url] = "\n".join(parts)
+
+    omitted_chars = sum(len(text) for text in contents.values()) - sum(len(candidates[i][1]) for i in kept)
+    return selected, omitted_chars
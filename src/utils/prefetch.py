@@ -0,0 +1,124 @@
+import asyncio
+import atexit
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Union
+
+MAX_PREFETCH_WORKERS = 6
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Returns the process-wide thread pool of the sync prefetches, creating it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_PREFETCH_WORKERS, thread_name_prefix="prefetch")
+        return _executor
+
+
+@atexit.register
+def _shutdown_executor() -> None:
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+
+
+class Prefetcher:
+    """
+    Speculative background fetches of single URLs, started before anyone asks for them.
+
+    `fetch(url)` is expected to leave its result where the real request will find it (a cache);
+    the prefetcher only tracks the fetches in flight so that they can be awaited or cancelled.
+    Sync fetches run on a shared thread pool, where cancel() only stops those still queued;
+    async fetches are tasks on the running event loop and are cancelled wherever they are.
+    Thread-safe.
+    """
+
+    def __init__(self, fetch: Callable[[str], object], afetch: Callable[[str], Awaitable[object]]):
+        """
+        Args:
+            fetch: Fetches a URL, in a pool thread.
+            afetch: Async version of `fetch`.
+        """
+        self.fetch = fetch
+        self.afetch = afetch
+        self.started = 0
+        self.used = 0
+        self.cancelled = 0
+        self._fetches: Dict[str, Union[Future, asyncio.Task]] = {}
+        self._lock = threading.Lock()
+
+    def _run(self, url: str) -> None:
+        try:
+            self.fetch(url)
+        except Exception as e:
+            print(f"Prefetch of {url} failed: {e}")
+
+    async def _arun(self, url: str) -> None:
+        try:
+            await self.afetch(url)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Prefetch of {url} failed: {e}")
+
+    def start(self, urls: Iterable[str]) -> List[str]:
+        """Starts fetching the `urls` not fetched yet, in the background, and returns them."""
+        with self._lock:
+            new_urls = [url for url in dict.fromkeys(urls) if url not in self._fetches]
+            for url in new_urls:
+                self._fetches[url] = _get_executor().submit(self._run, url)
+            self.started += len(new_urls)
+        return new_urls
+
+    def astart(self, urls: Iterable[str]) -> List[str]:
+        """Async version of start(), to call from the event loop: the fetches are tasks of the running loop."""
+        with self._lock:
+            new_urls = [url for url in dict.fromkeys(urls) if url not in self._fetches]
+            for url in new_urls:
+                self._fetches[url] = asyncio.get_running_loop().create_task(self._arun(url))
+            self.started += len(new_urls)
+        return new_urls
+
+    def _claim(self, urls: Iterable[str]) -> list:
+        with self._lock:
+            fetches = [self._fetches[url] for url in dict.fromkeys(urls)
+                       if url in self._fetches and not self._fetches[url].cancelled()]
+            self.used += len(fetches)
+        return fetches
+
+    def wait(self, urls: Iterable[str], timeout: Optional[float] = None) -> None:
+        """Waits for the prefetches of `urls`, if any, so their results can be reused instead of fetched again."""
+        fetches = self._claim(urls)
+        if fetches:
+            wait(fetches, timeout=timeout)
+
+    async def await_urls(self, urls: Iterable[str], timeout: Optional[float] = None) -> None:
+        """Async version of wait()."""
+        fetches = self._claim(urls)
+        if fetches:
+            await asyncio.wait(fetches, timeout=timeout)
+
+    def cancel(self, urls: Iterable[str]) -> int:
+        """Cancels the prefetches of `urls` that have not finished and returns how many were stopped."""
+        with self._lock:
+            cancelled = 0
+            for url in dict.fromkeys(urls):
+                fetch = self._fetches.get(url)
+                if fetch is not None and not fetch.done() and fetch.cancel():
+                    cancelled += 1
+            self.cancelled += cancelled
+            return cancelled
+
+    def cancel_all(self) -> int:
+        """Cancels every prefetch that has not finished."""
+        with self._lock:
+            urls = list(self._fetches)
+        return self.cancel(urls)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"started": self.started, "used": self.used, "cancelled": self.cancelled}
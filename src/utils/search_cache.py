@@ -0,0 +1,103 @@
+import re
+import threading
+import unicodedata
+from typing import Awaitable, Callable, Dict, Optional
+
+from cachetools import TTLCache
+
+from src.utils.disk_cache import DiskCache
+
+
+def normalize_query(query: str) -> str:
+    """
+    Returns a normalized form of a search query so that trivially different queries share the same cache key.
+    Unicode is NFKC-normalized and casefolded, punctuation is dropped (except `+` and `#`, as in "C++" or "C#")
+    and whitespace is collapsed.
+    """
+    query = unicodedata.normalize("NFKC", query).casefold()
+    query = re.sub(r"[^\w\s+#]", " ", query)
+    return " ".join(query.split())
+
+
+class SearchResultCache:
+    """
+    Cache of search results keyed by normalized query.
+
+    Results are kept in a bounded in-memory TTL cache, optionally backed by a DiskCache
+    so that they survive restarts and are shared between processes. Thread-safe.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 3600, disk_cache: Optional[DiskCache] = None):
+        """
+        Args:
+            max_entries: Maximum number of results kept in memory.
+            ttl_seconds: Lifetime of an in-memory result.
+            disk_cache: Optional persistent backing store, with its own TTL and size cap.
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_cache = disk_cache
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = TTLCache(maxsize=max_entries, ttl=ttl_seconds)
+        self._lock = threading.Lock()
+
+    def get(self, query: str) -> Optional[str]:
+        """Returns the cached result of `query`, or None."""
+        key = normalize_query(query)
+        with self._lock:
+            result = self._memory.get(key)
+            if result is not None:
+                self.memory_hits += 1
+                return result
+
+        result = self.disk_cache.get(key) if self.disk_cache is not None else None
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.disk_hits += 1
+                self._memory[key] = result
+        return result
+
+    def set(self, query: str, result: str) -> None:
+        key = normalize_query(query)
+        with self._lock:
+            self._memory[key] = result
+        if self.disk_cache is not None:
+            self.disk_cache.set(key, result)
+
+    def get_or_search(self, query: str, search: Callable[[str], str]) -> str:
+        """Returns the cached result of `query`, or calls `search(query)` and caches its result."""
+        result = self.get(query)
+        if result is None:
+            result = search(query)
+            self.set(query, result)
+        return result
+
+    async def aget_or_search(self, query: str, asearch: Callable[[str], Awaitable[str]]) -> str:
+        """Async version of get_or_search(); the cache lookups are local and stay synchronous."""
+        result = self.get(query)
+        if result is None:
+            result = await asearch(query)
+            self.set(query, result)
+        return result
+
+    def clear(self) -> None:
+        """Empties the in-memory cache; the disk cache, if any, is left untouched."""
+        with self._lock:
+            self._memory.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Returns hit/miss counters and the current number of in-memory entries."""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            hits = self.memory_hits + self.disk_hits
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "entries": len(self._memory),
+            }
@@ -0,0 +1,50 @@
+import re
+from typing import List, NamedTuple, Tuple
+
+from src.utils.url_utils import canonicalize_url
+
+# One result of DuckDuckGoSearchResults: "snippet: ..., title: ..., link: ...", results joined by ", ".
+RESULT_PATTERN = re.compile(
+    r"snippet:\s*(?P<snippet>.*?),\s*title:\s*(?P<title>.*?),\s*link:\s*(?P<link>https?://[^\s,]+)",
+    re.DOTALL,
+)
+
+
+class SearchResult(NamedTuple):
+    title: str
+    url: str
+    snippet: str
+
+
+def parse_search_results(raw_results: str) -> List[SearchResult]:
+    """
+    Parses the raw output of DuckDuckGoSearchResults into records, without duplicate URLs.
+    URLs are cleaned (tracking parameters, fragment, trailing slash) but keep their scheme, so they can still be fetched.
+    """
+    results = {}
+    for match in RESULT_PATTERN.finditer(raw_results):
+        url = canonicalize_url(match.group("link"), fold_scheme=False)
+        key = canonicalize_url(url)
+        if key not in results:
+            results[key] = SearchResult(match.group("title").strip(), url, " ".join(match.group("snippet").split()))
+    return list(results.values())
+
+
+def format_search_result(result: SearchResult) -> str:
+    return f"{result.title}\n{result.url}\n{result.snippet}"
+
+
+def format_search_results(results: List[SearchResult], max_chars: int) -> Tuple[str, int]:
+    """
+    Renders the results one block per result, separated by blank lines, keeping whole results within `max_chars`.
+    Returns the text and the number of results left out.
+    """
+    blocks = []
+    length = 0
+    for result in results:
+        block = format_search_result(result)
+        if blocks and length + len(block) + 2 > max_chars:
+            break
+        blocks.append(block)
+        length += len(block) + 2
+    return "\n\n".join(blocks), len(results) - len(blocks)
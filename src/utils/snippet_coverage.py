@@ -0,0 +1,47 @@
+import re
+from typing import Dict, Iterable, List
+
+from src.utils.passage_ranking import tokenize
+
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being between both but by can
+could did do does doing down during each few for from further had has have having how i if in into is it its itself
+just me more most my no nor not now of off on once only or other our out over own same should so some such than that
+the their them then there these they this those through to too under until up very was we were what when where which
+while who whom why will with would you your
+""".split())
+
+
+def content_terms(text: str) -> List[str]:
+    """Returns the distinct words of `text` that carry meaning (no stopword, no single character)."""
+    return list(dict.fromkeys(term for term in tokenize(text) if len(term) > 1 and term not in STOPWORDS))
+
+
+def split_snippets(search_results: str) -> List[str]:
+    """
+    Splits search results into one text per result: raw DuckDuckGo results ("snippet: ..., title: ..., link: ...")
+    or results rendered by format_search_results(), one block per result.
+    """
+    if re.search(r"\bsnippet:", search_results):
+        snippets = re.split(r"\bsnippet:\s*", search_results)
+    else:
+        snippets = re.split(r"\n\s*\n", search_results)
+    return [snippet.strip() for snippet in snippets if snippet.strip()]
+
+
+def term_coverage(question: str, text: str) -> float:
+    """Returns the fraction of the content terms of `question` that appear in `text`."""
+    terms = content_terms(question)
+    if not terms:
+        return 0.0
+    text_terms = set(tokenize(text))
+    return sum(1 for term in terms if term in text_terms) / len(terms)
+
+
+def snippet_coverage(questions: Iterable[str], snippets: List[str]) -> Dict[str, float]:
+    """
+    Returns how well the search snippets cover every question: the best term coverage of the question
+    by a single snippet. A question whose terms are only scattered over several results is not covered.
+    """
+    return {question: max((term_coverage(question, snippet) for snippet in snippets), default=0.0)
+            for question in questions}
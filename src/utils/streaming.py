@@ -0,0 +1,108 @@
+import sys
+from typing import Any, Callable, Iterable, NamedTuple, Optional, TextIO, Tuple
+
+from langchain_core.messages import AIMessageChunk, BaseMessage
+
+from src.constants import BLUE, RESET
+
+# Nodes whose model tokens are streamed by default: the authors and the reviewers of the workflow.
+STREAMED_NODES = ("architect_node", "GDPR_node", "security_node", "review_node", "global_reviewer_node")
+
+
+class TokenEvent(NamedTuple):
+    # Path of the node generating the token, e.g. "architect_node/review_node" in a subgraph.
+    node: str
+    text: str
+    # Id of the message being generated, the same for all its tokens.
+    message_id: Optional[str]
+
+
+def node_path(metadata: Optional[dict]) -> str:
+    """Returns the path of the graph node a run belongs to, e.g. "architect_node/review_node" in a subgraph."""
+    checkpoint_ns = (metadata or {}).get("langgraph_checkpoint_ns", "")
+    return "/".join(part.split(":")[0] for part in checkpoint_ns.split("|") if part)
+
+
+def chunk_text(chunk: BaseMessage) -> str:
+    """Returns the text of a message chunk, with the argument fragments of its tool calls (structured outputs)."""
+    if isinstance(chunk.content, str):
+        text = chunk.content
+    else:
+        text = "".join(part if isinstance(part, str) else part.get("text", "") for part in chunk.content)
+    for tool_call_chunk in getattr(chunk, "tool_call_chunks", None) or []:
+        text += tool_call_chunk.get("args") or ""
+    return text
+
+
+def _token_event(data: Tuple[BaseMessage, dict], nodes: Optional[Iterable[str]]) -> Optional[TokenEvent]:
+    chunk, metadata = data
+    # Only the chunks of a generation; the whole messages returned by the nodes are in the final state.
+    if not isinstance(chunk, AIMessageChunk):
+        return None
+    path = node_path(metadata)
+    if nodes is not None and path.split("/")[-1] not in nodes:
+        return None
+    text = chunk_text(chunk)
+    return TokenEvent(path, text, chunk.id) if text else None
+
+
+def stream_graph(graph, state: dict, on_token: Callable[[TokenEvent], Any], config=None,
+                 nodes: Optional[Iterable[str]] = STREAMED_NODES) -> dict:
+    """
+    Runs a compiled graph like invoke(), calling `on_token` with every token of the chat models of `nodes`
+    (subgraphs included) as soon as it is generated, through LangGraph's message streaming.
+
+    Args:
+        graph: Compiled graph.
+        state: Input state.
+        on_token: Called with a TokenEvent per token, in the thread running the graph.
+        config: Run config.
+        nodes: Names of the nodes to stream, None for every node.
+
+    Returns:
+        The final state, with whole messages.
+    """
+    nodes = set(nodes) if nodes is not None else None
+    final_state = None
+    for namespace, mode, data in graph.stream(state, config, stream_mode=["messages", "values"], subgraphs=True):
+        if mode == "values":
+            if not namespace:
+                final_state = data
+        else:
+            event = _token_event(data, nodes)
+            if event is not None:
+                on_token(event)
+    return final_state
+
+
+async def astream_graph(graph, state: dict, on_token: Callable[[TokenEvent], Any], config=None,
+                        nodes: Optional[Iterable[str]] = STREAMED_NODES) -> dict:
+    """Async version of stream_graph(); `on_token` may be a coroutine function."""
+    nodes = set(nodes) if nodes is not None else None
+    final_state = None
+    async for namespace, mode, data in graph.astream(state, config, stream_mode=["messages", "values"], subgraphs=True):
+        if mode == "values":
+            if not namespace:
+                final_state = data
+        else:
+            event = _token_event(data, nodes)
+            if event is not None:
+                result = on_token(event)
+                if hasattr(result, "__await__"):
+                    await result
+    return final_state
+
+
+class TokenPrinter:
+    """on_token callback writing the tokens to the terminal, under a header each time another message starts."""
+
+    def __init__(self, file: TextIO = sys.stdout):
+        self.file = file
+        self._current: Optional[Tuple[str, Optional[str]]] = None
+
+    def __call__(self, event: TokenEvent) -> None:
+        if (event.node, event.message_id) != self._current:
+            self._current = (event.node, event.message_id)
+            self.file.write(f"\n{BLUE}>>> {event.node}{RESET}\n")
+        self.file.write(event.text)
+        self.file.flush()
@@ -0,0 +1,46 @@
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+# Query parameters that only track the visitor and never change the page.
+TRACKING_PARAMS = frozenset({
+    "fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid", "_ga", "_gl", "ref_src", "srsltid",
+})
+TRACKING_PARAM_PREFIXES = ("utm_",)
+
+
+def _is_tracking_param(name: str) -> bool:
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PARAM_PREFIXES)
+
+
+def canonicalize_url(url: str, fold_scheme: bool = True) -> str:
+    """
+    Returns a canonical form of `url` so that equivalent URLs share the same cache key.
+    The scheme and host are lowercased, the default port, the fragment, the tracking parameters
+    (utm_*, gclid, fbclid, ...) and the trailing slash of the path are dropped, and the remaining
+    query parameters are sorted. With `fold_scheme`, http is folded into https.
+    """
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+    if not parts.scheme or not parts.netloc:
+        return url
+
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    netloc = host if port is None or DEFAULT_PORTS.get(scheme) == port else f"{host}:{port}"
+    if parts.username:
+        netloc = f"{parts.username}@{netloc}"
+    if fold_scheme and scheme == "http":
+        scheme = "https"
+
+    path = parts.path.rstrip("/") or "/"
+    params = [(name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True) if not _is_tracking_param(name)]
+    query = urlencode(sorted(params))
+    return urlunsplit((scheme, netloc, path, query, ""))
@@ -1,22 +1,24 @@
 from typing import List
 from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
-from dotenv import load_dotenv
-import os
 from src.constants import YELLOW, RESET, BLUE, RED, GREEN
 from src.utils.custom_messages import ArchitectMessage, GDPRMessage, ReviewerMessage, SecurityMessage
+from src.utils.model_routing import ROUTE_SUMMARY, get_routed_model
 
 def add_note(existing_notes: List[int], new_note: int) -> List[int]:
     if not existing_notes :
         return [new_note]
     return existing_notes + [new_note]
 
-def summarize_messages(messages: List[BaseMessage]) -> str:
-    load_dotenv()
-        
+def summarize_messages(messages: List[BaseMessage], model=None) -> str:
+    """
+    Summarizes the agent and reviewer messages, with `model` or by default the model of the summary route,
+    whose requests are scheduled in the background class.
+    """
+    if model is None:
+        model = get_routed_model(ROUTE_SUMMARY)
+
     print(f"{BLUE}messages : {messages}{RESET}")
     messages_to_summarize = ""
-    model = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0, max_output_tokens=512, google_api_key=os.getenv("GOOGLE_API_KEY"))
     for message in messages:
         if isinstance(message, ArchitectMessage):
             author = "Architect"
@@ -0,0 +1,329 @@
+import asyncio
+import atexit
+import codecs
+import importlib.util
+import re
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncGenerator, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+MAX_PAGE_BYTES = 2 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+# The text of the partial page is estimated each time its size doubles from here, so the
+# cumulative cost stays under twice the cost of estimating the final prefix.
+FIRST_ESTIMATE_BYTES = 64 * 1024
+# The estimate counts the characters outside tags, scripts and styles, which overestimates the text
+# the extraction keeps (menus, footers): the download stops once it reaches this multiple of the target.
+TEXT_ESTIMATE_MARGIN = 2
+# A block still open at the end of the partial page runs to its end.
+_NON_TEXT_RE = re.compile(r"<(script|style|noscript|svg|template)\b.*?(?:</\1\s*>|\Z)|<!--.*?(?:-->|\Z)", re.S | re.I)
+_TAG_RE = re.compile(r"<[^>]*>")
+_SPACES_RE = re.compile(r"\s+")
+CONNECT_TIMEOUT_SECONDS = 5
+REQUEST_TIMEOUT_SECONDS = 15
+MAX_CONNECTIONS = 20
+MAX_CONNECTIONS_PER_HOST = 4
+KEEPALIVE_EXPIRY_SECONDS = 60
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.5",
+    "Accept-Language": "en-US,en;q=0.5",
+}
+
+
+class HttpClient:
+    """
+    Long-lived HTTP client shared by every scrape of the process.
+
+    Connections are kept alive and reused, HTTP/2 is negotiated when the `h2` package is installed,
+    and requests are limited to `max_connections` in total and `max_connections_per_host` per host.
+    The underlying httpx client is created on first use and is thread-safe. Async callers get
+    an httpx.AsyncClient per event loop, since an async connection pool is bound to its loop;
+    it is closed when the loop shuts down (asyncio.run() does), or by aclose().
+    """
+
+    def __init__(self, max_connections: int = MAX_CONNECTIONS, max_connections_per_host: int = MAX_CONNECTIONS_PER_HOST,
+                 connect_timeout: float = CONNECT_TIMEOUT_SECONDS, timeout: float = REQUEST_TIMEOUT_SECONDS,
+                 http2: bool = True):
+        """
+        Args:
+            max_connections: Maximum number of open connections, all hosts included.
+            max_connections_per_host: Maximum number of concurrent requests to the same host.
+            connect_timeout: Timeout to open a connection, in seconds.
+            timeout: Timeout of every read, write and wait for a pooled connection, in seconds.
+            http2: Use HTTP/2 with the servers that support it (needs the `h2` package).
+        """
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        if http2 and not self.http2:
+            print("Warning: The h2 package is not installed, the scrapes fall back to HTTP/1.1.")
+        self._client: Optional[httpx.Client] = None
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        # Per loop, the async client and the async generator closing it at the shutdown of the loop.
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[httpx.AsyncClient, AsyncGenerator]]" = weakref.WeakKeyDictionary()
+        self._async_host_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+            keepalive_expiry=KEEPALIVE_EXPIRY_SECONDS
+        )
+
+    @property
+    def client(self) -> httpx.Client:
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(
+                    headers=DEFAULT_HEADERS,
+                    timeout=self.timeout,
+                    follow_redirects=True,
+                    http2=self.http2,
+                    limits=self._limits()
+                )
+            return self._client
+
+    def async_client(self) -> httpx.AsyncClient:
+        """Returns the async client of the running event loop, creating it on first use."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if loop not in self._async_clients:
+                async_client = httpx.AsyncClient(
+                    headers=DEFAULT_HEADERS,
+                    timeout=self.timeout,
+                    follow_redirects=True,
+                    http2=self.http2,
+                    limits=self._limits()
+                )
+                self._async_clients[loop] = (async_client, _closed_at_loop_shutdown(async_client))
+            return self._async_clients[loop][0]
+
+    def host_slot(self, url: str) -> threading.BoundedSemaphore:
+        """Returns the semaphore bounding the concurrent requests to the host of `url`."""
+        host = (urlsplit(url).hostname or "").lower()
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.max_connections_per_host)
+            return self._host_slots[host]
+
+    def async_host_slot(self, url: str) -> asyncio.Semaphore:
+        """Async version of host_slot(), for the running event loop."""
+        host = (urlsplit(url).hostname or "").lower()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            host_slots = self._async_host_slots.setdefault(loop, {})
+            if host not in host_slots:
+                host_slots[host] = asyncio.Semaphore(self.max_connections_per_host)
+            return host_slots[host]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+            self._client = None
+
+    async def aclose(self) -> None:
+        """Closes the async client of the running event loop."""
+        with self._lock:
+            entry = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if entry is not None:
+            await entry[1].aclose()
+
+
+def _closed_at_loop_shutdown(async_client: httpx.AsyncClient) -> AsyncGenerator:
+    """
+    Returns an async generator, started and suspended, whose exit closes `async_client`. The running loop
+    tracks it like any async generator, so loop.shutdown_asyncgens(), run by asyncio.run() before the loop
+    closes, closes the client on that loop. The caller keeps a reference, the loop only has a weak one.
+    """
+    async def close_on_exit():
+        try:
+            yield
+        finally:
+            await async_client.aclose()
+
+    closer = close_on_exit()
+    # Runs it up to the yield without awaiting: the loop's firstiter hook registers it on the first step.
+    try:
+        closer.asend(None).send(None)
+    except StopIteration:
+        pass
+    return closer
+
+
+_http_client: Optional[HttpClient] = None
+_http_client_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    """Returns the HTTP client shared by the search subsystem, creating it on first use."""
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = HttpClient()
+        return _http_client
+
+
+def configure_http_client(**kwargs) -> HttpClient:
+    """Replaces the shared HTTP client by one built with `kwargs` (see HttpClient) and returns it."""
+    global _http_client
+    with _http_client_lock:
+        if _http_client is not None:
+            _http_client.close()
+        _http_client = HttpClient(**kwargs)
+        return _http_client
+
+
+def _close_http_client() -> None:
+    if _http_client is not None:
+        _http_client.close()
+
+
+atexit.register(_close_http_client)
+
+
+class FetchedPage(NamedTuple):
+    url: str
+    html: str
+    # Text already extracted, e.g. by a stand-in or a cassette; None when the html still has to be extracted.
+    text: Optional[str]
+    truncated: bool
+
+
+def estimate_text_chars(html_content: str) -> int:
+    """Cheap estimate of the text of a page, with regular expressions instead of an HTML parse."""
+    text = _TAG_RE.sub(" ", _NON_TEXT_RE.sub(" ", html_content))
+    return len(_SPACES_RE.sub(" ", text))
+
+
+class _StreamedPage:
+    """Accumulates the streamed body of a page, and tells when the download can stop."""
+
+    def __init__(self, url: str, response: httpx.Response, max_bytes: int, min_text_chars: Optional[int]):
+        self.url = url
+        self.max_bytes = max_bytes
+        self.min_text_chars = min_text_chars
+        try:
+            self.decoder = codecs.getincrementaldecoder(response.charset_encoding or "utf-8")(errors="replace")
+        except LookupError:
+            self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.parts: List[str] = []
+        self.size = 0
+        self.next_estimate = FIRST_ESTIMATE_BYTES
+
+    def feed(self, chunk: bytes) -> Optional[FetchedPage]:
+        """Adds a chunk of the body; returns the page once the download should stop, else None."""
+        chunk = chunk[:self.max_bytes - self.size]
+        self.parts.append(self.decoder.decode(chunk))
+        self.size += len(chunk)
+        if self.size >= self.max_bytes:
+            print(f"--- Download of {self.url} capped at {self.max_bytes} bytes ---")
+            return FetchedPage(self.url, "".join(self.parts), None, True)
+        if self.min_text_chars and self.size >= self.next_estimate:
+            self.next_estimate *= 2
+            html_content = "".join(self.parts)
+            # No parse here: this runs on the event loop in afetch_page(), and the page is extracted
+            # afterwards in the extraction process pool.
+            if estimate_text_chars(html_content) >= self.min_text_chars * TEXT_ESTIMATE_MARGIN:
+                print(f"--- Download of {self.url} stopped after {self.size} bytes, enough text received ---")
+                return FetchedPage(self.url, html_content, None, True)
+        return None
+
+    def finish(self) -> FetchedPage:
+        self.parts.append(self.decoder.decode(b"", final=True))
+        return FetchedPage(self.url, "".join(self.parts), None, False)
+
+
+def _is_html(url: str, response: httpx.Response) -> bool:
+    content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type and content_type not in HTML_CONTENT_TYPES:
+        print(f"Warning: Skipping {url}, content type is {content_type}")
+        return False
+    return True
+
+
+def fetch_page(http_client: HttpClient, url: str, max_bytes: int = MAX_PAGE_BYTES,
+               min_text_chars: Optional[int] = None) -> Optional[FetchedPage]:
+    """
+    Streams the body of `url`, at most `max_bytes` of it, and returns None for non-HTML responses.
+    With `min_text_chars`, the text of the partial page is estimated as it arrives and the download
+    stops as soon as it holds comfortably more than that much text.
+    """
+    with http_client.host_slot(url), http_client.client.stream("GET", url) as response:
+        response.raise_for_status()
+        if not _is_html(url, response):
+            return None
+        page = _StreamedPage(url, response, max_bytes, min_text_chars)
+        for chunk in response.iter_bytes(CHUNK_SIZE):
+            fetched_page = page.feed(chunk)
+            if fetched_page is not None:
+                return fetched_page
+        return page.finish()
+
+
+async def afetch_page(http_client: HttpClient, url: str, max_bytes: int = MAX_PAGE_BYTES,
+                      min_text_chars: Optional[int] = None) -> Optional[FetchedPage]:
+    """Async version of fetch_page()."""
+    async with http_client.async_host_slot(url), http_client.async_client().stream("GET", url) as response:
+        response.raise_for_status()
+        if not _is_html(url, response):
+            return None
+        page = _StreamedPage(url, response, max_bytes, min_text_chars)
+        async for chunk in response.aiter_bytes(CHUNK_SIZE):
+            fetched_page = page.feed(chunk)
+            if fetched_page is not None:
+                return fetched_page
+        return page.finish()
+
+
+def fetch_pages(urls: List[str], max_bytes: int = MAX_PAGE_BYTES, min_text_chars: Optional[int] = None,
+                http_client: Optional[HttpClient] = None) -> Dict[str, FetchedPage]:
+    """
+    Fetches `urls` concurrently with `http_client`, the shared client by default.
+    URLs that failed or are not HTML are left out of the result.
+    """
+    if not urls:
+        return {}
+
+    http_client = http_client or get_http_client()
+    pages = {}
+    with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+        futures = {url: executor.submit(fetch_page, http_client, url, max_bytes, min_text_chars) for url in urls}
+        for url, future in futures.items():
+            try:
+                page = future.result()
+            except Exception as e:
+                print(f"Warning: Unable to fetch {url}: {e}")
+                continue
+            if page is not None:
+                pages[url] = page
+    return pages
+
+
+async def afetch_pages(urls: List[str], max_bytes: int = MAX_PAGE_BYTES, min_text_chars: Optional[int] = None,
+                       http_client: Optional[HttpClient] = None) -> Dict[str, FetchedPage]:
+    """Async version of fetch_pages(), the downloads are interleaved on the running event loop."""
+    if not urls:
+        return {}
+
+    http_client = http_client or get_http_client()
+    results = await asyncio.gather(
+        *(afetch_page(http_client, url, max_bytes, min_text_chars) for url in urls),
+        return_exceptions=True
+    )
+    pages = {}
+    for url, page in zip(urls, results):
+        if isinstance(page, Exception):
+            print(f"Warning: Unable to fetch {url}: {page}")
+        elif page is not None:
+            pages[url] = page
+    return pages
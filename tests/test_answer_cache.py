@@ -0,0 +1,26 @@
+from src.utils.answer_cache import AnswerCache
+
+
+def test_exact_and_approximate_hits():
+    cache = AnswerCache()
+    cache.set("What are the GDPR fines in France?", "Up to 4% of the turnover.", ["https://example.com"])
+    assert cache.get("what are the gdpr fines in france").similarity == 1.0
+    assert cache.get("What are the GDPR fines in Spain?") is None
+    approximate = AnswerCache(similarity_threshold=0.8)
+    approximate.set("What are the GDPR fines in France?", "Up to 4% of the turnover.", [])
+    assert approximate.get("What are GDPR fines in France").similarity < 1.0
+
+
+def test_numbers_must_match():
+    cache = AnswerCache(similarity_threshold=0.5)
+    cache.set("GDPR fines issued in 2023", "answer", [])
+    assert cache.get("GDPR fines issued in 2024") is None
+    assert cache.get("GDPR fine issued in 2023") is not None
+
+
+def test_namespaces_are_separate():
+    cache = AnswerCache()
+    cache.set("GDPR fines", "answer of agent a", [], namespace="a")
+    assert cache.get("GDPR fines", namespace="b") is None
+    assert cache.get("GDPR fines", namespace="a").answer == "answer of agent a"
+    assert cache.stats()["entries"] == 1
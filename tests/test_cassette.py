@@ -0,0 +1,61 @@
+import os
+
+import pytest
+from langchain_core.language_models import FakeListChatModel
+
+from src.agents import search_agent
+from src.utils.cassette import RECORD, REPLAY, Cassette, CassetteMiss, ReplayedError
+
+
+def test_record_then_replay(tmp_path):
+    path = str(tmp_path / "run.cassette")
+    recording = Cassette(path, mode=RECORD)
+    assert recording.call("search", "gdpr", lambda: "first") == "first"
+    assert recording.call("search", "gdpr", lambda: "second") == "second"
+
+    def fail():
+        raise ValueError("offline")
+    with pytest.raises(ValueError):
+        recording.call("fetch", "https://example.com", fail)
+    recording.save()
+
+    replay = Cassette(path, mode=REPLAY, time_scale=0)
+    assert [replay.call("search", "gdpr", None) for _ in range(3)] == ["first", "second", "second"]
+    with pytest.raises(ReplayedError, match="ValueError: offline"):
+        replay.call("fetch", "https://example.com", None)
+    with pytest.raises(CassetteMiss):
+        replay.call("search", "unknown", None)
+    assert replay.stats()["misses"] == 1
+
+
+def test_chat_model_round_trip(tmp_path):
+    path = str(tmp_path / "run.cassette")
+    recording = Cassette(path, mode=RECORD)
+    model = recording.chat_model(FakeListChatModel(responses=["Hello", "World"]))
+    assert model.invoke("Hi").content == "Hello"
+    assert model.invoke("Bye").content == "World"
+    recording.save()
+
+    replayed = Cassette(path, mode=REPLAY, time_scale=0).chat_model()
+    assert replayed.invoke("Bye").content == "World"
+    assert replayed.invoke("Hi").content == "Hello"
+
+
+def test_use_cassette_restores_the_search_agent(tmp_path, monkeypatch):
+    saved = search_agent.duckduckgo_tool, search_agent.fetch_pages, search_agent.afetch_pages, search_agent.scrape_cache
+    path = str(tmp_path / "run.cassette")
+    with search_agent.use_cassette(Cassette(path, mode=RECORD)):
+        scrape_cache_path = search_agent.scrape_cache.path
+        assert search_agent.fetch_pages is not saved[1]
+    assert (search_agent.duckduckgo_tool, search_agent.fetch_pages, search_agent.afetch_pages,
+            search_agent.scrape_cache) == saved
+    assert not os.path.exists(os.path.dirname(scrape_cache_path))
+    assert os.path.exists(path)
+
+    def broken_wrap(fetch, cassette):
+        raise RuntimeError("broken")
+    monkeypatch.setattr(search_agent, "cassette_fetch_pages", broken_wrap)
+    with pytest.raises(RuntimeError):
+        with search_agent.use_cassette(Cassette(path, mode=REPLAY)):
+            pass
+    assert search_agent.duckduckgo_tool is saved[0]
@@ -0,0 +1,37 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from benchmarks import concurrent_search_agent as benchmark
+from src.agents import search_agent
+from src.agents.search_agent import SearchAgent
+
+QUERIES = 20
+LATENCY = 0.005
+
+
+@pytest.fixture(params=[False, True], ids=["sequential", "parallel-sub-questions"])
+def agent(monkeypatch, request):
+    # The stand-ins replace module globals: register them with monkeypatch so that they are restored.
+    for name in ("duckduckgo_tool", "scrape_cache", "fetch_pages", "afetch_pages"):
+        monkeypatch.setattr(search_agent, name, getattr(search_agent, name))
+    benchmark.install_stand_ins(LATENCY)
+    # With parallel sub-questions, the sub-researchers of a query share its budget.
+    return SearchAgent(benchmark.ScriptedResearchModel(LATENCY), parallel_sub_questions=request.param,
+                       search_cache=None, answer_cache=None)
+
+
+def test_threads_get_their_own_scraper_budget(agent):
+    queries = [f"query-{i}" for i in range(QUERIES)]
+    with ThreadPoolExecutor(max_workers=QUERIES) as executor:
+        responses = list(executor.map(agent.run, queries))
+    assert benchmark.check(responses) == 0
+
+
+def test_tasks_get_their_own_scraper_budget(agent):
+    queries = [f"query-{i}" for i in range(QUERIES)]
+
+    async def run_all():
+        return await asyncio.gather(*(agent.arun(query) for query in queries))
+    assert benchmark.check(asyncio.run(run_all())) == 0
@@ -0,0 +1,48 @@
+import time
+
+from src.utils.disk_cache import DiskCache
+
+
+def test_round_trip_and_namespaces(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = DiskCache(path, namespace="a")
+    other = DiskCache(path, namespace="b")
+    cache.set("key", "value")
+    assert cache.get("key") == "value"
+    assert other.get("key") is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_no_file_until_first_use(tmp_path):
+    path = tmp_path / "nested" / "cache.sqlite"
+    cache = DiskCache(str(path))
+    assert not path.parent.exists()
+    cache.set("key", "value")
+    assert path.exists()
+
+
+def test_expired_entries_are_misses(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path / "cache.sqlite"), ttl_seconds=10)
+    cache.set("key", "value")
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 11)
+    assert cache.get("key") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: clock[0])
+    cache = DiskCache(str(tmp_path / "cache.sqlite"), ttl_seconds=None, compression_level=1)
+    for key in ("a", "b", "c"):
+        cache.set(key, key * 100)
+        clock[0] += 1
+    entry_size = cache.stats()["size_bytes"] // 3
+    cache.get("a")
+    clock[0] += 1
+
+    cache.max_bytes = 3 * entry_size
+    cache.set("d", "d" * 100)
+    assert cache.get("b") is None
+    assert cache.get_many(["a", "c", "d"]).keys() == {"a", "c", "d"}
+    assert cache.evictions == 1
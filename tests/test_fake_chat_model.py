@@ -0,0 +1,59 @@
+import asyncio
+import time
+from typing import List, Literal, Optional
+
+from langchain_core.messages import AIMessage, HumanMessage
+from pydantic import BaseModel
+
+from src.utils.fake_chat_model import FakeChatModel, example_value, fixed_latency, lognormal_latency
+
+
+class Review(BaseModel):
+    decision: Literal["approved", "rejected"]
+    note: int
+    comments: List[str]
+    owner: Optional[str] = None
+
+
+def test_default_response_and_usage():
+    response = FakeChatModel(output_tokens=12).invoke([HumanMessage("x" * 400)])
+    assert len(response.content.split()) == 12
+    assert response.usage_metadata == {"input_tokens": 100, "output_tokens": 12, "total_tokens": 112}
+
+
+def test_scripted_responses():
+    def responder(messages, tools, tool_choice):
+        return "Scripted" if messages[-1].content == "script me" else None
+
+    model = FakeChatModel(responder=responder, output_tokens=3)
+    assert model.invoke([HumanMessage("script me")]).content == "Scripted"
+    assert model.invoke([HumanMessage("other")]).content == "lorem ipsum dolor"
+
+
+def test_structured_output_gets_example_values():
+    review = FakeChatModel(example_integer=42).with_structured_output(Review).invoke([HumanMessage("Review")])
+    assert review.decision == "approved" and review.note == 42 and len(review.comments) == 1
+    assert example_value({"type": "object", "properties": {"flag": {"type": "boolean"}}}) == {"flag": True}
+
+
+def test_latency_and_stats():
+    model = FakeChatModel(latency=fixed_latency(0.1), output_tokens=4)
+    start = time.perf_counter()
+    asyncio.run(model.ainvoke([HumanMessage("Retention?")]))
+    assert time.perf_counter() - start >= 0.1
+    assert model.stats() == {"calls": 1, "wait_seconds": 0.1}
+    assert lognormal_latency(0.0)() == 0.0
+
+
+def test_stream_one_chunk_per_word_then_tool_calls():
+    def responder(messages, tools, tool_choice):
+        return AIMessage(content="Looking it up", tool_calls=[{"name": "lookup", "args": {"article": "17"}, "id": "call-1"}])
+
+    chunks = list(FakeChatModel(responder=responder).stream([HumanMessage("Erasure?")]))
+    assert [chunk.content for chunk in chunks[:3]] == ["Looking", " it", " up"]
+    message = chunks[0]
+    for chunk in chunks[1:]:
+        message += chunk
+    assert message.content == "Looking it up"
+    assert message.tool_calls[0]["args"] == {"article": "17"}
+    assert message.usage_metadata["output_tokens"] == 5
@@ -0,0 +1,66 @@
+import pytest
+from langchain_core.messages import HumanMessage
+
+from benchmarks import concurrent_search_agent
+from benchmarks.offline_graphs import offline_search_pool, research_responder
+from src.agents import search_agent
+from src.agents.GDPR_agent import GDPR_agent
+from src.global_workflow import Global_graph
+from src.inputs import INPUT_ARCHI
+from src.utils.fake_chat_model import FakeChatModel
+from src.utils.hedging import DeadlineExceeded
+
+INITIAL_STATE = {"messages": [HumanMessage(content=INPUT_ARCHI)], "iteration": 0}
+
+
+class TimingOutReviewer:
+    """Reviewer model whose reviews after the first `reviews` ones miss the run deadline."""
+
+    def __init__(self, model, reviews: int):
+        self.model = model
+        self.reviews = reviews
+
+    def with_structured_output(self, schema):
+        structured = self.model.with_structured_output(schema)
+        reviewer = self
+
+        class StructuredReviewer:
+            def invoke(self, messages):
+                if reviewer.reviews <= 0:
+                    raise DeadlineExceeded("Model call still running at the run deadline")
+                reviewer.reviews -= 1
+                return structured.invoke(messages)
+        return StructuredReviewer()
+
+
+@pytest.fixture
+def global_graph(monkeypatch):
+    for name in ("duckduckgo_tool", "scrape_cache", "fetch_pages", "afetch_pages"):
+        monkeypatch.setattr(search_agent, name, getattr(search_agent, name))
+    concurrent_search_agent.install_stand_ins(0.0)
+    model = FakeChatModel(responder=research_responder, output_tokens=20)
+    graph = Global_graph(model, summary_model=model)
+    graph.gdpr_agent = GDPR_agent(model, search_agent_pool=offline_search_pool(model))
+    return graph
+
+
+def test_run_without_deadline(global_graph):
+    result = global_graph.invoke(INITIAL_STATE)
+    assert not result.get("timed_out")
+    assert result["note"] and result["architecture_manifest"] and result["gdpr_manifest"]
+
+
+def test_missed_review_keeps_the_last_note(global_graph):
+    global_graph.reviewer_model = TimingOutReviewer(global_graph.reviewer_model, reviews=1)
+    result = global_graph.invoke(INITIAL_STATE)
+    assert result["timed_out"]
+    assert result["note"] == [80]
+    assert result["iteration"] == 2
+    assert "deadline" in result["global_review_comment"]
+    assert result["architecture_manifest"] and result["gdpr_manifest"]
+
+
+def test_deadline_before_any_manifest_raises(global_graph):
+    global_graph.deadline_s = 0
+    with pytest.raises(DeadlineExceeded):
+        global_graph.invoke(INITIAL_STATE)
@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+import pytest
+
+from src.utils.fake_chat_model import FakeChatModel
+from src.utils.hedging import (MAX_HEDGE_CREDIT, MIN_LATENCY_SAMPLES, DeadlineExceeded, HedgedChatModel, HedgePolicy,
+                               check_deadline, remaining_time, with_deadline)
+
+
+def straggler_model(first_latency: float) -> FakeChatModel:
+    """A model whose first call takes `first_latency` seconds and the next ones none."""
+    latencies = iter([first_latency])
+    return FakeChatModel(latency=lambda: next(latencies, 0.0), output_tokens=3)
+
+
+def test_hedges_stay_within_the_budget():
+    policy = HedgePolicy(max_hedge_ratio=0.25)
+    hedges = 0
+    for _ in range(100):
+        policy.start_request()
+        hedges += policy.try_hedge()
+    assert hedges == 25
+    assert policy.stats()["hedge_ratio"] == 0.25
+
+
+def test_credit_is_capped():
+    policy = HedgePolicy(max_hedge_ratio=1.0)
+    for _ in range(100):
+        policy.start_request()
+    assert sum(policy.try_hedge() for _ in range(100)) == MAX_HEDGE_CREDIT
+
+
+def test_no_hedge_without_budget():
+    policy = HedgePolicy(max_hedge_ratio=0.0)
+    policy.start_request()
+    assert not policy.try_hedge()
+
+
+def test_delay_is_the_latency_percentile():
+    policy = HedgePolicy(percentile=90, initial_delay=5.0)
+    assert policy.delay() == 5.0
+    for latency in range(1, MIN_LATENCY_SAMPLES + 1):
+        policy.record(float(latency))
+    assert policy.delay() == 0.9 * MIN_LATENCY_SAMPLES
+
+
+def test_deadline():
+    assert remaining_time({}) is None
+    assert check_deadline({}) is None
+    assert 0 < remaining_time(with_deadline(10)) <= 10
+    with pytest.raises(DeadlineExceeded):
+        check_deadline(with_deadline(-1))
+
+
+def test_hedge_answers_a_straggler():
+    model = HedgedChatModel(straggler_model(2.0), HedgePolicy(max_hedge_ratio=1.0, initial_delay=0.05))
+    start = time.monotonic()
+    assert model.invoke("Hi").content
+    assert time.monotonic() - start < 1.0
+    assert model.policy.stats()["hedge_wins"] == 1
+
+
+def test_async_hedge_answers_a_straggler():
+    model = HedgedChatModel(straggler_model(2.0), HedgePolicy(max_hedge_ratio=1.0, initial_delay=0.05))
+
+    async def run():
+        start = time.monotonic()
+        await model.ainvoke("Hi")
+        return time.monotonic() - start
+    assert asyncio.run(run()) < 1.0
+    assert model.policy.stats()["hedge_wins"] == 1
+
+
+def test_calls_fail_fast_at_the_deadline():
+    model = HedgedChatModel(straggler_model(2.0), HedgePolicy(max_hedge_ratio=0.0))
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        model.invoke("Hi", with_deadline(0.1))
+    assert time.monotonic() - start < 1.0
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(model.ainvoke("Hi", with_deadline(-1)))
+    assert model.policy.stats()["deadline_exceeded"] == 1
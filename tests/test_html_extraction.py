@@ -0,0 +1,70 @@
+import asyncio
+import threading
+from pathlib import Path
+
+import pytest
+
+from src.utils import html_extraction
+from src.utils.html_extraction import aextract_many, available_parsers, default_parser, extract_many, extract_text
+
+FIXTURES = Path(__file__).parent.parent / "benchmarks" / "fixtures" / "html"
+
+PAGE = """
+<html><head><style>p { color: red }</style></head><body>
+<nav><p>Home</p></nav>
+<article>
+  <h1>Data retention</h1>
+  <p>Personal data is kept <b>no longer</b> than necessary.</p>
+  <script>tracking()</script>
+  <ul><li>Erase on request</li></ul>
+</article>
+<footer><p>Copyright</p></footer>
+</body></html>
+"""
+
+
+def test_extract_text_keeps_the_main_content():
+    text = extract_text(PAGE)
+    assert text.splitlines()[0] == "Data retention"
+    assert "Personal data is kept no longer than necessary." in text
+    assert "Erase on request" in text
+    assert not any(word in text for word in ("Home", "tracking", "Copyright", "color"))
+    assert extract_text("") == ""
+
+
+def test_pool_and_calling_thread_agree(monkeypatch):
+    pages = {f"https://example.com/{i}": PAGE.replace("Data retention", f"Page {i}") for i in range(6)}
+    in_thread = extract_many(pages)
+    monkeypatch.setattr(html_extraction, "MIN_POOL_BATCH_BYTES", 0)
+    monkeypatch.setattr(html_extraction, "MAX_EXTRACTION_WORKERS", 2)
+    try:
+        assert extract_many(pages) == in_thread
+    finally:
+        html_extraction._reset_pool()
+    assert list(in_thread) == list(pages)
+    assert in_thread["https://example.com/5"].startswith("Page 5")
+
+
+@pytest.mark.parametrize("fixture", sorted(FIXTURES.glob("*.html")), ids=lambda path: path.name)
+def test_parsers_agree(fixture):
+    html_content = fixture.read_text(encoding="utf-8")
+    texts = {parser: extract_text(html_content, parser) for parser in available_parsers()}
+    assert texts[default_parser()]
+    assert len(set(texts.values())) == 1, texts
+
+
+def test_async_small_batch_leaves_the_event_loop(monkeypatch):
+    threads = []
+
+    def recording_extract_text(html_content, parser=None):
+        threads.append(threading.get_ident())
+        return extract_text(html_content, parser)
+
+    monkeypatch.setattr(html_extraction, "extract_text", recording_extract_text)
+
+    async def main():
+        return threading.get_ident(), await aextract_many({"https://example.com": PAGE})
+
+    loop_thread, texts = asyncio.run(main())
+    assert texts == {"https://example.com": extract_text(PAGE)}
+    assert threads and loop_thread not in threads
@@ -0,0 +1,105 @@
+import asyncio
+from typing import List
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import tool
+from pydantic import BaseModel
+
+from src.utils.fake_chat_model import FakeChatModel
+from src.utils.llm_cache import CACHE_HIT_PARAM, CachedChatModel, LLMResponseCache
+
+
+class Verdict(BaseModel):
+    compliant: bool
+    reasons: List[str]
+
+
+@tool
+def lookup(article: str) -> str:
+    """Looks up an article of the GDPR."""
+    return article
+
+
+class CountingModel(FakeChatModel):
+    calls: int = 0
+
+    def _respond(self, messages, tools, tool_choice):
+        self.calls += 1
+        return super()._respond(messages, tools, tool_choice)
+
+
+class Recorder(BaseCallbackHandler):
+    def __init__(self):
+        self.starts = []
+        self.tokens = []
+        self.ends = 0
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self.starts.append(kwargs.get("invocation_params", {}).get(CACHE_HIT_PARAM, False))
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        self.tokens.append(token)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self.ends += 1
+
+
+def cached_model(tmp_path, **kwargs):
+    model = CountingModel(**kwargs)
+    return model, CachedChatModel(model, LLMResponseCache(str(tmp_path / "llm.sqlite")), namespace="test")
+
+
+def test_messages_round_trip(tmp_path):
+    model, cached = cached_model(tmp_path, output_tokens=5)
+    first = cached.invoke([HumanMessage("Retention?")])
+    second = cached.invoke([HumanMessage("Retention?")])
+    assert model.calls == 1
+    assert second.content == first.content and isinstance(second, AIMessage)
+    cached.invoke([HumanMessage("Consent?")])
+    assert model.calls == 2
+
+
+def test_bound_tools_round_trip(tmp_path):
+    def responder(messages, tools, tool_choice):
+        return AIMessage(content="", tool_calls=[{"name": "lookup", "args": {"article": "17"}, "id": "call-1"}])
+
+    model, cached = cached_model(tmp_path, responder=responder)
+    with_tools = cached.bind_tools([lookup])
+    first = with_tools.invoke([HumanMessage("Erasure?")])
+    second = with_tools.invoke([HumanMessage("Erasure?")])
+    assert model.calls == 1
+    assert second.tool_calls == first.tool_calls == [
+        {"name": "lookup", "args": {"article": "17"}, "id": "call-1", "type": "tool_call"}
+    ]
+    # Without the tools, it is another request.
+    cached.invoke([HumanMessage("Erasure?")])
+    assert model.calls == 2
+
+
+def test_structured_output_round_trip(tmp_path):
+    model, cached = cached_model(tmp_path)
+    structured = cached.with_structured_output(Verdict)
+    first = structured.invoke([HumanMessage("Compliant?")])
+    second = asyncio.run(structured.ainvoke([HumanMessage("Compliant?")]))
+    assert model.calls == 1
+    assert isinstance(second, Verdict) and second == first
+
+
+def test_other_temperatures_are_not_cached(tmp_path):
+    model, cached = cached_model(tmp_path, temperature=0.7)
+    cached.invoke([HumanMessage("Retention?")])
+    cached.invoke([HumanMessage("Retention?")])
+    assert model.calls == 2
+
+
+def test_hits_are_reported_to_the_callbacks(tmp_path):
+    model, cached = cached_model(tmp_path, output_tokens=5)
+    recorder = Recorder()
+    first = cached.invoke([HumanMessage("Retention?")], {"callbacks": [recorder]})
+    recorder.tokens.clear()
+    asyncio.run(cached.ainvoke([HumanMessage("Retention?")], {"callbacks": [recorder]}))
+    assert recorder.starts == [False, True]
+    assert recorder.ends == 2
+    # The cached text is streamed as a single token.
+    assert recorder.tokens == [first.content]
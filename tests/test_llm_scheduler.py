@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+from langchain_core.language_models import FakeListChatModel
+
+from src.utils.fake_chat_model import FakeChatModel
+from src.utils.llm_scheduler import PRIORITY_INTERACTIVE, LLMScheduler, ScheduledChatModel, TokenBucket
+
+
+def test_token_bucket_refills_at_its_rate():
+    bucket = TokenBucket(60, period=60.0)
+    now = bucket.updated
+    assert bucket.wait_time(60, now) == 0
+    bucket.take(60, now)
+    assert bucket.wait_time(1, now) == pytest.approx(1.0)
+    assert bucket.wait_time(1, now + 0.5) == pytest.approx(0.5)
+    assert bucket.wait_time(1, now + 1) == 0
+
+
+def test_token_bucket_debt_and_drain():
+    bucket = TokenBucket(10, period=10.0)
+    now = bucket.updated
+    bucket.take(15, now)
+    assert bucket.wait_time(1, now) == pytest.approx(6.0)
+    # A request larger than the bucket waits for a full bucket, not forever.
+    assert bucket.wait_time(100, now + 15) == 0
+    bucket.drain(now + 15)
+    assert bucket.level == 0
+
+
+def test_scheduler_retries_rate_limited_requests():
+    scheduler = LLMScheduler(rpm=6000, tpm=1_000_000, backoff_base=0.001, seed=0)
+    attempts = []
+
+    def request():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RuntimeError("429 RESOURCE_EXHAUSTED")
+        return "ok"
+    assert scheduler.call(request, tokens=10, priority=PRIORITY_INTERACTIVE) == "ok"
+    stats = scheduler.stats()["classes"]["interactive"]
+    assert stats["requests"] == 3 and stats["rate_limited"] == 2
+
+
+def test_scheduler_does_not_retry_other_errors():
+    scheduler = LLMScheduler(rpm=6000, tpm=1_000_000)
+
+    def request():
+        raise ValueError("bad request")
+    with pytest.raises(ValueError):
+        scheduler.call(request, tokens=10)
+
+
+def test_batch_and_streams_are_scheduled():
+    scheduler = LLMScheduler(rpm=6000, tpm=1_000_000)
+    model = ScheduledChatModel(FakeListChatModel(responses=["ok"]), scheduler, PRIORITY_INTERACTIVE)
+    assert [message.content for message in model.batch(["a", "b", "c"])] == ["ok"] * 3
+    assert "".join(chunk.content for chunk in model.stream("d")) == "ok"
+
+    async def run():
+        outputs = await model.abatch(["e", "f"], config={"max_concurrency": 1})
+        chunks = [chunk.content async for chunk in model.astream("g")]
+        return outputs, chunks
+    outputs, chunks = asyncio.run(run())
+    assert [message.content for message in outputs] == ["ok", "ok"] and "".join(chunks) == "ok"
+    assert scheduler.stats()["classes"]["interactive"]["requests"] == 7
+
+
+def test_streams_stopped_early_are_settled(monkeypatch):
+    scheduler = LLMScheduler(rpm=6000, tpm=1_000_000)
+    settled = []
+    monkeypatch.setattr(scheduler, "settle", lambda estimated, used: settled.append(used))
+    model = ScheduledChatModel(FakeChatModel(output_tokens=10), scheduler)
+
+    stream = model.stream("Hi")
+    next(stream)
+    stream.close()
+
+    async def stop_early():
+        astream = model.astream("Hi")
+        await astream.__anext__()
+        await astream.aclose()
+    asyncio.run(stop_early())
+
+    # Settled with the usage known so far: none, since it comes with the last chunk.
+    assert settled == [None, None]
+    list(model.stream("Hi"))
+    assert settled[-1] == 10
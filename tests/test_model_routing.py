@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import HumanMessage
+from pydantic import BaseModel
+
+from src.utils.fake_chat_model import FakeChatModel
+from src.utils.llm_cache import CachedChatModel, LLMResponseCache
+from src.utils.model_routing import (
+    ROUTE_REVIEWER, ROUTE_SUMMARY, ModelProfile, RoutedChatModel, configure_model_routing, reset_route_stats,
+    route_profile, route_stats
+)
+
+PROFILE = ModelProfile("fake-model", input_cost_per_mtok=1.0, output_cost_per_mtok=2.0)
+
+
+class Note(BaseModel):
+    note: int
+
+
+@pytest.fixture(autouse=True)
+def clean_stats():
+    reset_route_stats()
+    yield
+    reset_route_stats()
+
+
+def test_calls_tokens_and_cost_per_route():
+    reviewer = RoutedChatModel(FakeChatModel(output_tokens=10), ROUTE_REVIEWER, PROFILE)
+    summary = RoutedChatModel(FakeChatModel(output_tokens=3), ROUTE_SUMMARY, PROFILE)
+    reviewer.invoke([HumanMessage("x" * 400)])
+    asyncio.run(reviewer.ainvoke([HumanMessage("x" * 400)]))
+    assert reviewer.with_structured_output(Note).invoke([HumanMessage("Note?")]).note == 80
+    summary.invoke([HumanMessage("Summary")])
+
+    stats = route_stats()
+    assert stats[ROUTE_REVIEWER]["calls"] == 3
+    assert stats[ROUTE_REVIEWER]["models"] == ["fake-model"]
+    assert stats[ROUTE_REVIEWER]["output_tokens"] == 10 + 10 + 2
+    assert stats[ROUTE_SUMMARY]["calls"] == 1
+    assert stats[ROUTE_SUMMARY]["cost_usd"] == pytest.approx((1 * 1.0 + 3 * 2.0) / 1_000_000)
+
+
+def test_errors_are_counted():
+    def responder(messages, tools, tool_choice):
+        raise RuntimeError("unavailable")
+
+    with pytest.raises(RuntimeError):
+        RoutedChatModel(FakeChatModel(responder=responder), ROUTE_REVIEWER, PROFILE).invoke("Review")
+    assert route_stats()[ROUTE_REVIEWER]["errors"] == 1
+    assert route_stats()[ROUTE_REVIEWER]["calls"] == 0
+
+
+def test_cache_hits_are_counted_apart(tmp_path):
+    cached = CachedChatModel(FakeChatModel(output_tokens=10), LLMResponseCache(str(tmp_path / "llm.sqlite")))
+    reviewer = RoutedChatModel(cached, ROUTE_REVIEWER, PROFILE)
+    for _ in range(3):
+        reviewer.invoke([HumanMessage("Review")])
+    stats = route_stats()[ROUTE_REVIEWER]
+    assert (stats["calls"], stats["cache_hits"], stats["output_tokens"]) == (1, 2, 10)
+
+
+def test_routes_follow_the_configuration(monkeypatch):
+    monkeypatch.setattr("src.utils.model_routing._routes", None)
+    monkeypatch.setattr("src.utils.model_routing._profiles", {})
+    monkeypatch.setenv("MODEL_ROUTES", "reviewer=custom")
+    configure_model_routing(profiles={"custom": PROFILE, "brief": PROFILE})
+    assert route_profile(ROUTE_REVIEWER) == ("custom", PROFILE)
+    configure_model_routing(routes={"summary": "custom"})
+    assert route_profile(ROUTE_SUMMARY) == ("custom", PROFILE)
+    with pytest.raises(ValueError):
+        route_profile("unknown")
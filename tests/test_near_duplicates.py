@@ -0,0 +1,44 @@
+from src.utils.near_duplicates import MAX_HAMMING_DISTANCE, NearDuplicateFilter, hamming_distance, simhash
+
+PARAGRAPH = ("The controller shall implement appropriate technical and organisational measures to ensure a level of "
+             "security appropriate to the risk, including the pseudonymisation and encryption of personal data, "
+             "the ability to ensure the ongoing confidentiality, integrity, availability and resilience of processing "
+             "systems and services, and a process for regularly testing, assessing and evaluating the effectiveness "
+             "of those measures.")
+
+
+def test_simhash_threshold():
+    near = PARAGRAPH.replace("The controller", "A controller")
+    unrelated = ("Seagulls gather on the harbour wall every morning while fishing boats unload their catch "
+                 "and the market opens its stalls to the first customers of the day.")
+    assert hamming_distance(simhash(PARAGRAPH), simhash(PARAGRAPH.upper().replace(",", ";"))) == 0
+    assert hamming_distance(simhash(PARAGRAPH), simhash(near)) <= MAX_HAMMING_DISTANCE
+    assert hamming_distance(simhash(PARAGRAPH), simhash(unrelated)) > MAX_HAMMING_DISTANCE
+
+
+def test_filter_collapses_near_duplicates_within_its_distance():
+    near = PARAGRAPH.replace("The controller", "A controller")
+    duplicates = NearDuplicateFilter()
+    duplicates.remember(PARAGRAPH)
+    assert duplicates.check(near)[0] == ""
+    strict = NearDuplicateFilter(max_distance=0)
+    strict.remember(PARAGRAPH)
+    assert strict.check(near)[0] == near
+
+
+def test_filter_removes_repeated_paragraphs_and_keeps_short_lines():
+    duplicates = NearDuplicateFilter()
+    assert duplicates.filter(f"Title\n{PARAGRAPH}") == (f"Title\n{PARAGRAPH}", 0)
+    text, removed = duplicates.filter(f"Title\n{PARAGRAPH}")
+    assert text == "Title"
+    assert removed == len(PARAGRAPH) + 1
+
+
+def test_check_does_not_remember():
+    duplicates = NearDuplicateFilter()
+    batch = []
+    assert duplicates.check(PARAGRAPH, batch) == (PARAGRAPH, 0)
+    assert duplicates.check(PARAGRAPH, batch)[0] == ""
+    assert duplicates.check(PARAGRAPH)[0] == PARAGRAPH
+    duplicates.remember(PARAGRAPH)
+    assert duplicates.check(PARAGRAPH)[0] == ""
@@ -0,0 +1,35 @@
+from src.utils.passage_ranking import OMISSION_MARKER, bm25_scores, select_passages, split_passages
+
+
+def test_split_passages_respects_the_target():
+    text = "\n".join(f"Line {i} " + "word " * 20 for i in range(30))
+    passages = split_passages(text, target_chars=300)
+    assert len(passages) > 1
+    assert all(len(passage) <= 300 for passage in passages)
+    assert "\n".join(passages).split() == text.split()
+
+
+def test_bm25_ranks_matching_passages_first():
+    scores = bm25_scores(["the cat sat", "GDPR data retention rules", "nothing here"], "data retention")
+    assert scores[1] > scores[0] == scores[2] == 0
+
+
+def test_select_passages_packs_the_best_passages_in_reading_order():
+    filler = "Unrelated filler sentence about the weather and the sea. " * 11
+    contents = {
+        "https://a.example": f"{filler}\nData retention periods under GDPR are limited.",
+        "https://b.example": filler,
+    }
+    selected, omitted = select_passages(contents, "GDPR data retention", budget_chars=110)
+    assert list(selected) == ["https://a.example"]
+    assert selected["https://a.example"].startswith(OMISSION_MARKER)
+    assert "Data retention periods" in selected["https://a.example"]
+    assert omitted == sum(map(len, contents.values())) - len(selected["https://a.example"].split("\n", 1)[1])
+
+
+def test_select_passages_degrades_to_head_truncation_without_query():
+    contents = {"https://a.example": "\n".join(f"Paragraph {i} " + "word " * 150 for i in range(4))}
+    selected, omitted = select_passages(contents, "", budget_chars=1500)
+    text = selected["https://a.example"]
+    assert text.startswith("Paragraph 0") and text.endswith(OMISSION_MARKER)
+    assert omitted > 0
@@ -0,0 +1,51 @@
+import asyncio
+import threading
+
+from src.utils.prefetch import Prefetcher
+
+
+def test_prefetches_start_once_and_are_reused():
+    fetched = []
+    prefetcher = Prefetcher(fetched.append, None)
+    assert prefetcher.start(["https://a.example", "https://b.example", "https://a.example"]) == [
+        "https://a.example", "https://b.example"
+    ]
+    assert prefetcher.start(["https://a.example"]) == []
+    prefetcher.wait(["https://a.example", "https://c.example"], timeout=5)
+    assert "https://a.example" in fetched
+    assert prefetcher.cancel(["https://a.example"]) == 0
+    assert prefetcher.stats() == {"started": 2, "used": 1, "cancelled": 0}
+
+
+def test_failed_prefetch_does_not_raise():
+    def fetch(url):
+        raise ValueError("unreachable")
+
+    prefetcher = Prefetcher(fetch, None)
+    prefetcher.start(["https://a.example"])
+    prefetcher.wait(["https://a.example"], timeout=5)
+
+
+def test_async_prefetches_are_cancelled_in_flight():
+    finished = []
+    started = threading.Event()
+
+    async def afetch(url):
+        if url == "https://slow.example":
+            started.set()
+            await asyncio.sleep(10)
+        finished.append(url)
+
+    async def main():
+        prefetcher = Prefetcher(None, afetch)
+        prefetcher.astart(["https://fast.example", "https://slow.example"])
+        await prefetcher.await_urls(["https://fast.example"], timeout=5)
+        await asyncio.sleep(0)
+        assert started.is_set()
+        assert prefetcher.cancel_all() == 1
+        # A cancelled prefetch is not waited for.
+        await asyncio.wait_for(prefetcher.await_urls(["https://slow.example"]), timeout=1)
+        return prefetcher.stats()
+
+    assert asyncio.run(main()) == {"started": 2, "used": 1, "cancelled": 1}
+    assert finished == ["https://fast.example"]
@@ -0,0 +1,246 @@
+import asyncio
+import threading
+import time
+import uuid
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from benchmarks import concurrent_search_agent
+from benchmarks.offline_graphs import research_responder
+from src.agents import search_agent
+from src.agents.GDPR_agent import make_search_agent_tool
+from src.agents.search_agent import (
+    MAX_WEB_SCRAPER_CALLS, SearchAgent, SearchAgentPool, get_search_agent_pool, with_run_context
+)
+from src.utils.disk_cache import DiskCache
+from src.utils.fake_chat_model import FakeChatModel
+from src.utils.hedging import remaining_time, with_deadline
+from src.utils.web_fetch import FetchedPage
+
+
+@pytest.fixture
+def fetched(monkeypatch, tmp_path):
+    """Replaces the downloads by pages built from their URL, and the scrape cache by an empty one; lists the fetched URLs."""
+    fetched_urls = []
+
+    def fake_fetch_pages(urls, **kwargs):
+        fetched_urls.extend(urls)
+        return {url: FetchedPage(url, "", f"Text of {url}", False) for url in urls}
+
+    async def fake_afetch_pages(urls, **kwargs):
+        return fake_fetch_pages(urls, **kwargs)
+    monkeypatch.setattr(search_agent, "fetch_pages", fake_fetch_pages)
+    monkeypatch.setattr(search_agent, "afetch_pages", fake_afetch_pages)
+    monkeypatch.setattr(search_agent, "scrape_cache", DiskCache(str(tmp_path / "scrape.sqlite"), namespace="test"))
+    return fetched_urls
+
+
+def test_scrape_cache_serves_equivalent_urls(fetched):
+    assert search_agent.scrape_urls(["https://example.com/page?utm_source=x"]) == {
+        "https://example.com/page?utm_source=x": "Text of https://example.com/page?utm_source=x"}
+    contents = search_agent.scrape_urls(["http://EXAMPLE.com/page/", "https://example.com/other"])
+    assert fetched == ["https://example.com/page?utm_source=x", "https://example.com/other"]
+    assert contents["http://EXAMPLE.com/page/"] == "Text of https://example.com/page?utm_source=x"
+
+
+@pytest.fixture
+def agent():
+    return SearchAgent(FakeChatModel(), search_cache=None, answer_cache=None)
+
+
+def scrape_call(*urls: str) -> dict:
+    return {"name": search_agent.web_scraper_tool.name, "args": {"urls_tuple": list(urls)}, "id": uuid.uuid4().hex}
+
+
+def tool_state(*tool_calls: dict) -> dict:
+    return {"messages": [HumanMessage(content="GDPR retention"), AIMessage(content="", tool_calls=list(tool_calls))]}
+
+
+def test_tool_calls_run_concurrently_in_order(agent, fetched, monkeypatch):
+    fetch_pages = search_agent.fetch_pages
+
+    def slow_fetch_pages(urls, **kwargs):
+        time.sleep(0.3)
+        return fetch_pages(urls, **kwargs)
+    monkeypatch.setattr(search_agent, "fetch_pages", slow_fetch_pages)
+    calls = [scrape_call(f"https://example.com/{i}") for i in range(MAX_WEB_SCRAPER_CALLS + 1)]
+
+    start = time.perf_counter()
+    messages = agent.call_tool(tool_state(*calls), with_run_context(None))["messages"]
+    assert time.perf_counter() - start < 0.3 * MAX_WEB_SCRAPER_CALLS
+    assert [message.tool_call_id for message in messages] == [call["id"] for call in calls]
+    assert all(f"Text of https://example.com/{i}" in messages[i].content for i in range(MAX_WEB_SCRAPER_CALLS))
+    # The budget is assigned in request order, whatever order the calls finish in.
+    assert "Call limit" in messages[-1].content
+
+
+def test_async_tool_calls_keep_their_order(agent, fetched):
+    calls = [scrape_call(f"https://example.com/{i}") for i in range(2)]
+    messages = asyncio.run(agent.acall_tool(tool_state(*calls), with_run_context(None)))["messages"]
+    assert [message.tool_call_id for message in messages] == [call["id"] for call in calls]
+    assert "Text of https://example.com/1" in messages[1].content
+
+
+def test_search_agent_pools_are_reused_and_bounded(monkeypatch):
+    monkeypatch.setattr(search_agent, "_search_agent_pools", type(search_agent._search_agent_pools)())
+    monkeypatch.setattr(search_agent, "MAX_SEARCH_AGENT_POOLS", 2)
+    first, second, third = FakeChatModel(), FakeChatModel(), FakeChatModel()
+    pool = get_search_agent_pool(first)
+    assert get_search_agent_pool(first) is pool
+    assert get_search_agent_pool(second) is not pool
+    get_search_agent_pool(first)
+    get_search_agent_pool(third)
+    # The least recently used pool, the one of `second`, made room for the one of `third`.
+    assert list(search_agent._search_agent_pools) == [id(first), id(third)]
+    assert get_search_agent_pool(first) is pool
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    """Installs the offline stand-ins of the search and the fetches, and returns the list of fetched URLs."""
+    for name in ("duckduckgo_tool", "scrape_cache", "fetch_pages", "afetch_pages"):
+        monkeypatch.setattr(search_agent, name, getattr(search_agent, name))
+    concurrent_search_agent.install_stand_ins(0)
+    fetched_urls = []
+    fake_fetch_pages = search_agent.fetch_pages
+
+    def recording_fetch_pages(urls, **kwargs):
+        fetched_urls.extend(urls)
+        return fake_fetch_pages(urls, **kwargs)
+    search_agent.fetch_pages = recording_fetch_pages
+    return fetched_urls
+
+
+@pytest.mark.parametrize("threshold, fast_paths", [(0.75, 1), (1.01, 0)])
+def test_snippet_fast_path(offline, threshold, fast_paths):
+    agent = SearchAgent(FakeChatModel(responder=research_responder), snippet_fast_path=True,
+                        snippet_coverage_threshold=threshold, search_cache=None, answer_cache=None)
+    assert agent.run("GDPR retention of profile pictures")
+    assert agent.snippet_fast_path_totals["fast_paths"] == fast_paths
+    # The snippets of the stand-in search repeat the query: they cover it, unless the threshold is out of reach.
+    assert bool(offline) != bool(fast_paths)
+
+
+def test_prefetched_pages_are_not_fetched_again(offline):
+    agent = SearchAgent(FakeChatModel(responder=research_responder), prefetch_top_n=3,
+                        search_cache=None, answer_cache=None)
+    assert agent.run("GDPR retention of profile pictures")
+    # The researcher scrapes the link of its search result, which the prefetch already put in the scrape cache.
+    assert len(offline) == 1
+
+
+class SameResultsSearchTool(concurrent_search_agent.FakeSearchTool):
+    """Returns the same two results whatever the query."""
+
+    def _run(self, query: str) -> str:
+        return ("snippet: Retention periods, title: Retention, link: https://gdpr.example/retention?utm_source=x, "
+                "snippet: Consent rules, title: Consent, link: https://gdpr.example/consent")
+
+    async def _arun(self, query: str) -> str:
+        return self._run(query)
+
+
+def two_searches_responder(search_results_seen: list):
+    """Each researcher searches twice then answers; the contents of its search results are recorded."""
+    def respond(messages, tools, tool_choice):
+        if tool_choice:
+            return AIMessage(content="", tool_calls=[
+                {"name": tools[0]["function"]["name"], "args": {"sub_questions": ["Retention periods", "Consent rules"]}, "id": uuid.uuid4().hex}
+            ])
+        if not any(tool["function"]["name"] == search_agent.duckduckgo_tool.name for tool in tools):
+            return None
+        searches = [message.content for message in messages if isinstance(message, ToolMessage)]
+        if len(searches) < 2:
+            return AIMessage(content="", tool_calls=[
+                {"name": search_agent.duckduckgo_tool.name, "args": {"query": "GDPR"}, "id": uuid.uuid4().hex}
+            ])
+        search_results_seen.append(searches)
+        return AIMessage(content="Answer")
+    return respond
+
+
+@pytest.mark.parametrize("parallel_sub_questions", [False, True])
+def test_search_results_are_deduplicated_per_researcher(offline, parallel_sub_questions):
+    search_agent.duckduckgo_tool = SameResultsSearchTool()
+    search_results_seen = []
+    agent = SearchAgent(FakeChatModel(responder=two_searches_responder(search_results_seen)),
+                        parallel_sub_questions=parallel_sub_questions, search_cache=None, answer_cache=None)
+    agent.run("GDPR retention and consent")
+    assert len(search_results_seen) == (2 if parallel_sub_questions else 1)
+    # Every researcher gets the results once, whatever the other researchers of the run got.
+    for first, second in search_results_seen:
+        assert "https://gdpr.example/retention" in first and "https://gdpr.example/consent" in first
+        assert "https://gdpr.example" not in second
+
+
+@pytest.fixture
+def slow_url(fetched, monkeypatch):
+    """Makes the download of https://slow.example take 1s."""
+    fetch_pages, afetch_pages = search_agent.fetch_pages, search_agent.afetch_pages
+
+    def slow_fetch_pages(urls, **kwargs):
+        if "https://slow.example" in urls:
+            time.sleep(1)
+        return fetch_pages(urls, **kwargs)
+
+    async def slow_afetch_pages(urls, **kwargs):
+        if "https://slow.example" in urls:
+            await asyncio.sleep(1)
+        return await afetch_pages(urls, **kwargs)
+    monkeypatch.setattr(search_agent, "fetch_pages", slow_fetch_pages)
+    monkeypatch.setattr(search_agent, "afetch_pages", slow_afetch_pages)
+    return "https://slow.example"
+
+
+def test_iter_scrape_urls_yields_each_url_by_its_deadline(slow_url):
+    search_agent.scrape_urls(["https://cached.example"])
+    start = time.perf_counter()
+    results = list(search_agent.iter_scrape_urls([slow_url, "https://fast.example", "https://cached.example"],
+                                                 deadline_seconds=0.3))
+    assert time.perf_counter() - start < 0.9
+    assert [(result.url, result.status) for result in results] == [
+        ("https://cached.example", "cached"), ("https://fast.example", "scraped"), (slow_url, "timed_out")
+    ]
+
+
+def test_aiter_scrape_urls_yields_each_url_by_its_deadline(slow_url):
+    async def scrape():
+        return [result async for result in search_agent.aiter_scrape_urls([slow_url, "https://fast.example"],
+                                                                          deadline_seconds=0.3)]
+
+    start = time.perf_counter()
+    results = asyncio.run(scrape())
+    assert time.perf_counter() - start < 0.9
+    assert [(result.url, result.status) for result in results] == [("https://fast.example", "scraped"), (slow_url, "timed_out")]
+
+
+def test_past_deadline_skips_the_downloads(fetched):
+    search_agent.scrape_urls(["https://cached.example"])
+    results = list(search_agent.iter_scrape_urls(["https://cached.example", "https://new.example"],
+                                                 deadline_seconds=0.3, start=time.perf_counter() - 1))
+    assert [result.status for result in results] == ["cached", "timed_out"]
+    assert fetched == ["https://cached.example"]
+
+
+def test_scrape_progress_is_sent_from_the_node_thread(agent, fetched, monkeypatch):
+    events = []
+    monkeypatch.setattr(search_agent, "stream_progress_writer",
+                        lambda: lambda event: events.append((threading.get_ident(), event["url"])))
+    calls = [scrape_call(f"https://example.com/{i}") for i in range(3)]
+    agent.call_tool(tool_state(*calls), with_run_context(None))
+    assert sorted(url for _, url in events) == [f"https://example.com/{i}" for i in range(3)]
+    assert {thread for thread, _ in events} == {threading.get_ident()}
+
+
+def test_search_tool_keeps_the_deadline_of_the_calling_run(offline):
+    remaining = []
+
+    def responder(messages, tools, tool_choice):
+        remaining.append(remaining_time())
+        return research_responder(messages, tools, tool_choice)
+
+    pool = SearchAgentPool(FakeChatModel(responder=responder), search_cache=None, answer_cache=None)
+    search_tool = make_search_agent_tool(pool)
+    search_tool.invoke({"query": "GDPR retention"}, config=with_deadline(60))
+    assert remaining and all(seconds is not None and 0 < seconds <= 60 for seconds in remaining)
@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+from src.utils.disk_cache import DiskCache
+from src.utils.search_cache import SearchResultCache, normalize_query
+
+
+def test_normalize_query():
+    assert normalize_query("  GDPR:  Data-Retention?? ") == "gdpr data retention"
+    assert normalize_query("ＧＤＰＲ Straße") == normalize_query("gdpr STRASSE")
+    assert normalize_query("C++ vs C#") == "c++ vs c#"
+
+
+def test_get_or_search_calls_the_search_once_per_normalized_query():
+    calls = []
+
+    def search(query):
+        calls.append(query)
+        return f"Results for {query}"
+
+    cache = SearchResultCache()
+    assert cache.get_or_search("GDPR retention", search) == "Results for GDPR retention"
+    assert cache.get_or_search("gdpr   retention?", search) == "Results for GDPR retention"
+    assert calls == ["GDPR retention"]
+    assert cache.stats()["memory_hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_aget_or_search():
+    calls = []
+
+    async def asearch(query):
+        calls.append(query)
+        return f"Results for {query}"
+
+    async def main():
+        cache = SearchResultCache()
+        return [await cache.aget_or_search("GDPR retention", asearch) for _ in range(2)]
+
+    assert asyncio.run(main()) == ["Results for GDPR retention"] * 2
+    assert calls == ["GDPR retention"]
+
+
+def test_memory_entries_expire_and_fall_back_to_disk(tmp_path):
+    cache = SearchResultCache(ttl_seconds=0.05, disk_cache=DiskCache(str(tmp_path / "cache.sqlite")))
+    cache.set("GDPR retention", "Results")
+    time.sleep(0.1)
+    assert cache.get("GDPR retention") == "Results"
+    assert cache.stats()["disk_hits"] == 1
+
+    memory_only = SearchResultCache(ttl_seconds=0.05)
+    memory_only.set("GDPR retention", "Results")
+    time.sleep(0.1)
+    assert memory_only.get("GDPR retention") is None
@@ -0,0 +1,21 @@
+from src.utils.snippet_coverage import content_terms, snippet_coverage, split_snippets
+
+
+def test_content_terms_drop_stopwords():
+    assert content_terms("How long can the profile pictures be kept?") == ["long", "profile", "pictures", "kept"]
+
+
+def test_split_raw_and_formatted_results():
+    raw = "snippet: First result, title: First, link: https://a.example, snippet: Second result, title: Second, link: https://b.example"
+    assert [snippet.split(",")[0] for snippet in split_snippets(raw)] == ["First result", "Second result"]
+    assert split_snippets("First\nhttps://a.example\n\nSecond\nhttps://b.example") == [
+        "First\nhttps://a.example", "Second\nhttps://b.example"
+    ]
+
+
+def test_a_question_must_be_covered_by_a_single_snippet():
+    coverage = snippet_coverage(
+        ["profile pictures retention", "consent withdrawal"],
+        ["Retention of profile pictures under the GDPR", "Consent under the GDPR", "Withdrawal of a contract"]
+    )
+    assert coverage == {"profile pictures retention": 1.0, "consent withdrawal": 0.5}
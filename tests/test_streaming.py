@@ -0,0 +1,69 @@
+import asyncio
+import operator
+from typing import Annotated, List
+
+from langchain_core.messages import AIMessageChunk, BaseMessage, HumanMessage
+from langgraph.graph import END, StateGraph
+from typing_extensions import TypedDict
+
+from src.utils.fake_chat_model import FakeChatModel
+from src.utils.llm_cache import CachedChatModel, LLMResponseCache
+from src.utils.streaming import astream_graph, chunk_text, node_path, stream_graph
+
+
+class State(TypedDict):
+    messages: Annotated[List[BaseMessage], operator.add]
+
+
+def build_graph(model):
+    def review_node(state):
+        return {"messages": [model.invoke(state["messages"])]}
+
+    def other_node(state):
+        return {"messages": [model.invoke(state["messages"][:1])]}
+
+    graph = StateGraph(State)
+    graph.add_node("other_node", other_node)
+    graph.add_node("review_node", review_node)
+    graph.set_entry_point("other_node")
+    graph.add_edge("other_node", "review_node")
+    graph.add_edge("review_node", END)
+    return graph.compile()
+
+
+def test_tokens_of_the_streamed_nodes():
+    events = []
+    final_state = stream_graph(build_graph(FakeChatModel(output_tokens=6)), {"messages": [HumanMessage("Review")]},
+                               events.append, nodes=["review_node"])
+    assert len(events) == 6
+    assert {event.node for event in events} == {"review_node"}
+    assert len({event.message_id for event in events}) == 1
+    assert "".join(event.text for event in events) == final_state["messages"][-1].content
+
+
+def test_async_tokens_with_a_coroutine_callback():
+    events = []
+
+    async def on_token(event):
+        events.append(event)
+
+    final_state = asyncio.run(astream_graph(build_graph(FakeChatModel(output_tokens=4)),
+                                            {"messages": [HumanMessage("Review")]}, on_token, nodes=None))
+    assert {event.node for event in events} == {"other_node", "review_node"}
+    assert len(final_state["messages"]) == 3
+
+
+def test_cached_responses_are_streamed(tmp_path):
+    model = CachedChatModel(FakeChatModel(output_tokens=6), LLMResponseCache(str(tmp_path / "llm.sqlite")))
+    graph = build_graph(model)
+    stream_graph(graph, {"messages": [HumanMessage("Review")]}, lambda event: None)
+    events = []
+    final_state = stream_graph(graph, {"messages": [HumanMessage("Review")]}, events.append, nodes=["review_node"])
+    assert "".join(event.text for event in events) == final_state["messages"][-1].content
+
+
+def test_chunk_text_and_node_path():
+    chunk = AIMessageChunk(content=[{"type": "text", "text": "Hello"}, " world"],
+                           tool_call_chunks=[{"name": "Review", "args": '{"note":', "id": "1", "index": 0}])
+    assert chunk_text(chunk) == 'Hello world{"note":'
+    assert node_path({"langgraph_checkpoint_ns": "architect_node:1|review_node:2"}) == "architect_node/review_node"
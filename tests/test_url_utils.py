@@ -0,0 +1,20 @@
+import pytest
+
+from src.utils.url_utils import canonicalize_url
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("HTTP://Example.COM:80/Path/", "https://example.com/Path"),
+    ("https://example.com:8443/a", "https://example.com:8443/a"),
+    ("https://example.com/a?b=2&a=1#section", "https://example.com/a?a=1&b=2"),
+    ("https://example.com/a?utm_source=x&id=3&gclid=y&FBCLID=z", "https://example.com/a?id=3"),
+    ("https://example.com", "https://example.com/"),
+    ("  https://example.com/a  ", "https://example.com/a"),
+    ("not a url", "not a url"),
+])
+def test_canonicalize_url(url, expected):
+    assert canonicalize_url(url) == expected
+
+
+def test_scheme_folding_is_optional():
+    assert canonicalize_url("http://example.com/a", fold_scheme=False) == "http://example.com/a"
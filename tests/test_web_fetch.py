@@ -0,0 +1,112 @@
+import asyncio
+import threading
+import time
+from collections import Counter
+
+import httpx
+
+from src.utils import web_fetch
+from src.utils.web_fetch import (
+    FIRST_ESTIMATE_BYTES, HttpClient, configure_http_client, estimate_text_chars, fetch_pages, get_http_client
+)
+
+PARAGRAPH = "<p>" + "Personal data shall be kept no longer than necessary. " * 20 + "</p>"
+
+
+def test_estimate_text_chars_skips_tags_scripts_and_comments():
+    html_content = "<html><script>var x = 1;</script><!-- note --><p>Hello   world</p></html>"
+    assert estimate_text_chars(html_content) == len(" Hello world ")
+    # A script still open at the end of a partial page is not text.
+    assert estimate_text_chars("<p>Hello</p><script>var x = 'not text'") == len(" Hello ")
+
+
+def mock_client(handler) -> HttpClient:
+    http_client = HttpClient(http2=False)
+    http_client._client = httpx.Client(transport=httpx.MockTransport(handler))
+    return http_client
+
+
+def test_download_stops_once_enough_text_arrived():
+    body = (PARAGRAPH * 2000).encode()
+    http_client = mock_client(lambda request: httpx.Response(200, headers={"content-type": "text/html"}, content=body))
+    page = fetch_pages(["https://a.example/long"], min_text_chars=1000, http_client=http_client)["https://a.example/long"]
+    assert page.truncated
+    assert len(page.html) < 4 * FIRST_ESTIMATE_BYTES
+
+
+def test_download_is_capped_and_non_html_skipped():
+    def handler(request):
+        if request.url.path == "/pdf":
+            return httpx.Response(200, headers={"content-type": "application/pdf"}, content=b"%PDF")
+        return httpx.Response(200, headers={"content-type": "text/html"}, content=b"<script>" + b"x" * 100_000)
+
+    pages = fetch_pages(["https://a.example/pdf", "https://a.example/page"], max_bytes=10_000,
+                        min_text_chars=1000, http_client=mock_client(handler))
+    assert list(pages) == ["https://a.example/page"]
+    assert pages["https://a.example/page"].truncated
+    assert len(pages["https://a.example/page"].html) == 10_000
+
+
+def test_short_page_is_complete():
+    http_client = mock_client(lambda request: httpx.Response(200, headers={"content-type": "text/html"}, content=PARAGRAPH.encode()))
+    page = fetch_pages(["https://a.example/short"], min_text_chars=1000, http_client=http_client)["https://a.example/short"]
+    assert not page.truncated
+    assert page.html == PARAGRAPH
+
+
+def test_requests_per_host_are_bounded():
+    lock = threading.Lock()
+    active = Counter()
+    peak = Counter()
+
+    def handler(request):
+        with lock:
+            active[request.url.host] += 1
+            peak[request.url.host] = max(peak[request.url.host], active[request.url.host])
+        time.sleep(0.05)
+        with lock:
+            active[request.url.host] -= 1
+        return httpx.Response(200, headers={"content-type": "text/html"}, content=PARAGRAPH.encode())
+
+    http_client = mock_client(handler)
+    http_client.max_connections_per_host = 2
+    urls = [f"https://{host}.example/{i}" for host in ("a", "b") for i in range(6)]
+    assert len(fetch_pages(urls, http_client=http_client)) == len(urls)
+    assert peak == {"a.example": 2, "b.example": 2}
+
+
+def test_shared_client_is_reused_and_replaced():
+    shared = get_http_client()
+    assert get_http_client() is shared
+    try:
+        replaced = configure_http_client(max_connections_per_host=2)
+        assert get_http_client() is replaced and replaced is not shared
+        assert replaced.max_connections_per_host == 2
+    finally:
+        web_fetch._http_client = shared
+
+
+def test_async_client_per_loop_closed_with_the_loop():
+    http_client = HttpClient(http2=False)
+
+    async def get_client():
+        async_client = http_client.async_client()
+        assert http_client.async_client() is async_client
+        return async_client
+
+    first = asyncio.run(get_client())
+    second = asyncio.run(get_client())
+    assert first is not second
+    assert first.is_closed and second.is_closed
+
+
+def test_aclose_closes_the_client_of_the_running_loop():
+    http_client = HttpClient(http2=False)
+
+    async def main():
+        async_client = http_client.async_client()
+        await http_client.aclose()
+        assert async_client.is_closed
+        assert http_client.async_client() is not async_client
+
+    asyncio.run(main())